@@ -1,8 +1,8 @@
 from fastapi import APIRouter
-from app.api.endpoints import rag, documents, conversations
+from app.api.endpoints import rag, documents, conversations, health
 
 api_router = APIRouter()
 api_router.include_router(rag.router, prefix="/rag", tags=["rag"])
 api_router.include_router(documents.router, prefix="/documents", tags=["documents"])
 api_router.include_router(conversations.router, prefix="/conversations", tags=["conversations"])
-
+api_router.include_router(health.router, prefix="/health", tags=["health"])
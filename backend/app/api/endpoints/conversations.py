@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException, Header
 from sqlalchemy.orm import Session
-from app.core.database import get_db, SessionLocal
+from app.core.database import run_db
 from app.services.conversation_service import ConversationService
-from app.schemas.conversation import Conversation, ConversationCreate, ConversationDetail, MessageCreate
+from app.schemas.conversation import Conversation, ConversationCreate, ConversationDetail, ConversationPage, MessageCreate, MessagePage, SearchResponse
+from app.services import search_index
+from app.services.conversation_archive import ensure_restored, restore_conversation
+from app.core.config import settings
 from app.services.rag_engine import RAGEngine
+from app.services.conversation_memory import ConversationMemory
+from app.services.llm_gateway import LLMGateway
+from app.services.message_persister import MessagePersister
+from app.services.sse_encoder import sse_stream
+from app.services.stream_buffer import start_stream, get_stream, cancel_stream
 from fastapi.responses import StreamingResponse
-from fastapi.concurrency import run_in_threadpool
-from typing import List
+from typing import Optional
 import json
 import logging
+import uuid
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
@@ -19,142 +27,276 @@ conversation_service = ConversationService()
 class ChatRequest(BaseModel):
     query: str
 
-@router.get("/", response_model=List[Conversation])
-def read_conversations(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"  # Disable buffering for Nginx/Proxies
+}
+
+# All DB work runs on the DB executor (run_db) so the event loop never blocks on SQLite
+
+def _load_conversation_page(db: Session, limit: int, before: Optional[str]) -> ConversationPage:
+    rows, has_more, next_before = conversation_service.get_conversations_page(db, limit, before)
+    return ConversationPage(
+        conversations=[Conversation.model_validate(row) for row in rows],
+        has_more=has_more,
+        next_before=next_before,
+    )
+
+@router.get("/", response_model=ConversationPage)
+async def read_conversations(
+    before: Optional[str] = None,
+    limit: Optional[int] = None
 ):
-    return conversation_service.get_conversations(db, skip=skip, limit=limit)
+    """Most recently updated conversations first, with message count and last-message preview."""
+    if limit is None:
+        limit = settings.CONVERSATION_PAGE_SIZE
+    if not 1 <= limit <= settings.MAX_CONVERSATION_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.MAX_CONVERSATION_PAGE_SIZE}")
+    try:
+        return await run_db(_load_conversation_page, limit, before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @router.post("/", response_model=Conversation)
-def create_conversation(
-    conversation: ConversationCreate,
-    db: Session = Depends(get_db)
+async def create_conversation(
+    conversation: ConversationCreate
 ):
-    return conversation_service.create_conversation(db, conversation)
+    return await run_db(conversation_service.create_conversation, conversation, write=True)
 
-@router.get("/{conversation_id}", response_model=ConversationDetail)
-def read_conversation(
-    conversation_id: str,
-    db: Session = Depends(get_db)
+@router.get("/search", response_model=SearchResponse)
+async def search_conversations(
+    q: str,
+    limit: Optional[int] = None,
+    offset: int = 0
 ):
+    """Full-text search over message contents and conversation titles, best matches first."""
+    if limit is None:
+        limit = settings.SEARCH_PAGE_SIZE
+    if not 1 <= limit <= settings.MAX_SEARCH_PAGE_SIZE or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.MAX_SEARCH_PAGE_SIZE}")
+    return await run_db(search_index.search, q, limit, offset)
+
+def _page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return settings.MESSAGE_PAGE_SIZE
+    if not 1 <= limit <= settings.MAX_MESSAGE_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.MAX_MESSAGE_PAGE_SIZE}")
+    return limit
+
+def _load_conversation_detail(db: Session, conversation_id: str, limit: int) -> Optional[ConversationDetail]:
     db_conversation = conversation_service.get_conversation(db, conversation_id)
     if db_conversation is None:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+        return None
     
-    # Ensure messages are loaded
-    messages = conversation_service.get_messages(db, conversation_id)
-    db_conversation.messages = messages
-    return db_conversation
+    # Only the latest page of messages; older pages come from /messages
+    messages, has_more = conversation_service.get_messages_page(db, conversation_id, limit)
+    return ConversationDetail(
+        id=db_conversation.id,
+        title=db_conversation.title,
+        created_at=db_conversation.created_at,
+        updated_at=db_conversation.updated_at,
+        message_count=db_conversation.message_count,
+        last_message_preview=db_conversation.last_message_preview,
+        messages=messages,
+        has_more_messages=has_more,
+    )
 
-@router.delete("/{conversation_id}")
-def delete_conversation(
+@router.get("/{conversation_id}", response_model=ConversationDetail)
+async def read_conversation(
     conversation_id: str,
-    db: Session = Depends(get_db)
+    message_limit: Optional[int] = None
 ):
-    success = conversation_service.delete_conversation(db, conversation_id)
+    # Archived conversations are restored transparently when opened
+    await ensure_restored(conversation_id)
+    conversation = await run_db(_load_conversation_detail, conversation_id, _page_size(message_limit))
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return conversation
+
+def _load_message_page(db: Session, conversation_id: str, limit: int, before: Optional[int]) -> Optional[MessagePage]:
+    if conversation_service.get_conversation(db, conversation_id) is None:
+        return None
+    messages, has_more = conversation_service.get_messages_page(db, conversation_id, limit, before_id=before)
+    return MessagePage(
+        messages=messages,
+        has_more=has_more,
+        next_before=messages[0].id if has_more and messages else None,
+    )
+
+@router.get("/{conversation_id}/messages", response_model=MessagePage)
+async def read_messages(
+    conversation_id: str,
+    before: Optional[int] = None,
+    limit: Optional[int] = None
+):
+    """Messages older than message `before` (latest page if omitted), oldest first."""
+    await ensure_restored(conversation_id)
+    page = await run_db(_load_message_page, conversation_id, _page_size(limit), before)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return page
+
+@router.delete("/{conversation_id}")
+async def delete_conversation(
+    conversation_id: str
+):
+    success = await run_db(conversation_service.delete_conversation, conversation_id, write=True)
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return {"ok": True}
 
 @router.delete("/{conversation_id}/messages/{message_id}")
-def delete_message(
+async def delete_message(
     conversation_id: str,
-    message_id: int,
-    db: Session = Depends(get_db)
+    message_id: int
 ):
-    success = conversation_service.delete_message(db, conversation_id, message_id)
+    success = await run_db(conversation_service.delete_message, conversation_id, message_id, write=True)
     if not success:
         raise HTTPException(status_code=404, detail="Message not found")
     return {"ok": True}
 
+def _load_chat_context(db: Session, conversation_id: str):
+    # The rolling summary plus the messages after it (up to the window); read before the query is queued
+    conversation = conversation_service.get_conversation(db, conversation_id)
+    chat_history = conversation_service.get_recent_history(
+        db, conversation_id, settings.CHAT_HISTORY_WINDOW, after_id=conversation.summary_message_id
+    )
+    return conversation.summary, chat_history
+
+async def _save_assistant_message(conversation_id: str, content: str, sources: list) -> int:
+    assistant_msg = MessageCreate(
+        role="assistant", 
+        content=content,
+        sources=json.dumps(sources) if sources else None
+    )
+    return await MessagePersister().save(conversation_id, assistant_msg)
+
 @router.post("/{conversation_id}/chat")
 async def chat_stream(
     conversation_id: str,
-    request: ChatRequest,
-    db: Session = Depends(get_db)
+    request: ChatRequest
 ):
     # 1. Check conversation exists
-    conversation = conversation_service.get_conversation(db, conversation_id)
+    conversation = await run_db(conversation_service.get_conversation, conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if conversation.archived_at is not None:
+        await run_db(restore_conversation, conversation_id, write=True)
+
+    # Fast backpressure: reject before saving anything if the LLM queue is full
+    if LLMGateway().is_overloaded():
+        raise HTTPException(status_code=503, detail="LLM queue is full, please retry later.", headers={"Retry-After": "5"})
 
-    # 2. Save User Message
+    # 2. Get Chat History for RAG context
+    # Only the summary and the last few messages are used, without their sources
+    summary, chat_history = await run_db(_load_chat_context, conversation_id)
+
+    # 3. Queue User Message
+    # Written behind in a batched transaction; its ID is awaited for the final event
     user_msg = MessageCreate(role="user", content=request.query)
-    db_user_msg = conversation_service.add_message(db, conversation_id, user_msg)
-    user_msg_id = db_user_msg.id
-
-    # 3. Get Chat History for RAG context
-    # Fetch all previous messages (excluding the one we just added)
-    db_messages = conversation_service.get_messages(db, conversation_id)
-    # Convert to list of dicts
-    chat_history = []
-    # We want messages BEFORE the current query.
-    # Since we just added the user message, it should be the last one (or close to last).
-    # We can just iterate and exclude the current one by ID, or just take all except the last one.
-    # Assuming get_messages returns ordered list.
-    for msg in db_messages:
-        if msg.id != user_msg_id:
-            chat_history.append({"role": msg.role, "content": msg.content})
+    user_msg_future = MessagePersister().add(conversation_id, user_msg)
 
     # 4. Stream Response
+    # Generation runs in the background and writes to a resumable buffer, so a
+    # dropped connection neither stops it nor loses the answer.
     rag_engine = RAGEngine()
+    memory = ConversationMemory(rag_engine.llm, gateway=rag_engine.llm_gateway)
+    stream_id = uuid.uuid4().hex
     
     async def generate():
         full_answer = ""
         sources = []
         is_saved = False
+        user_msg_awaited = False
         
         try:
-            async for chunk in rag_engine.astream_answer_generator(request.query, chat_history=chat_history):
+            yield {"stream_id": stream_id}
+            async for chunk in rag_engine.astream_answer_generator(
+                request.query, chat_history=chat_history, summary=summary
+            ):
                 # Accumulate answer
+                if chunk.get("replace"):
+                    # The partial answer was superseded (e.g. by the web search fallback)
+                    full_answer = ""
                 if "answer" in chunk:
                     full_answer += chunk["answer"]
                 if "sources" in chunk:
                     sources = chunk["sources"]
                 
-                yield f"data: {json.dumps(chunk)}\n\n"
+                yield chunk
             
             # 4. Save Assistant Message after stream completes
-            with SessionLocal() as session:
-                service = ConversationService()
-                assistant_msg = MessageCreate(
-                    role="assistant", 
-                    content=full_answer,
-                    sources=json.dumps(sources) if sources else None
-                )
-                saved_msg = service.add_message(session, conversation_id, assistant_msg)
-                is_saved = True
-                
-                # Send final IDs
-                yield f"data: {json.dumps({'message_id': saved_msg.id, 'user_message_id': user_msg_id})}\n\n"
+            message_id = await _save_assistant_message(conversation_id, full_answer, sources)
+            is_saved = True
+            user_msg_awaited = True
+            user_msg_id = await user_msg_future
+            # Fold turns that left the recent window into the summary, off the request path
+            memory.schedule_update(conversation_id)
+            
+            # Send final IDs (both committed by now)
+            yield {"message_id": message_id, "user_message_id": user_msg_id}
                 
         except Exception as e:
             logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield {"error": str(e)}
         finally:
-            # If not saved (e.g. aborted or error) and we have some content, save it
+            # If not saved (e.g. cancelled or error) and we have some content, save it
             if not is_saved and full_answer:
                 try:
                     logger.info("Saving partial message due to stream interruption")
-                    with SessionLocal() as session:
-                        service = ConversationService()
-                        assistant_msg = MessageCreate(
-                            role="assistant", 
-                            content=full_answer,
-                            sources=json.dumps(sources) if sources else None
-                        )
-                        service.add_message(session, conversation_id, assistant_msg)
+                    await _save_assistant_message(conversation_id, full_answer, sources)
                 except Exception as save_error:
                     logger.error(f"Failed to save partial message: {str(save_error)}")
+            # The user message is written whatever happened to the answer; wait for
+            # it here too so a failed write is reported rather than left unretrieved
+            if not user_msg_awaited:
+                try:
+                    await user_msg_future
+                except Exception as save_error:
+                    logger.error(f"Failed to save user message: {str(save_error)}")
+
+    buffer = start_stream(stream_id, generate(), conversation_id=conversation_id)
 
+    # Token chunks are coalesced into fewer SSE frames; each frame carries an event id
     return StreamingResponse(
-            generate(), 
+            sse_stream(buffer.subscribe()), 
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"  # Disable buffering for Nginx/Proxies
-            }
+            headers={**SSE_HEADERS, "X-Stream-ID": stream_id}
           )
+
+def _get_conversation_stream(conversation_id: str, stream_id: str):
+    buffer = get_stream(stream_id)
+    if buffer is None or buffer.info.get("conversation_id") != conversation_id:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    return buffer
+
+@router.get("/{conversation_id}/chat/{stream_id}/stream")
+async def resume_chat_stream(
+    conversation_id: str,
+    stream_id: str,
+    last_event_id: Optional[int] = None,
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Replay the events after Last-Event-ID (header or query), then continue live."""
+    buffer = _get_conversation_stream(conversation_id, stream_id)
+    if last_event_id is None:
+        try:
+            last_event_id = int(last_event_id_header) if last_event_id_header else 0
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    return StreamingResponse(
+            sse_stream(buffer.subscribe(last_event_id)),
+            media_type="text/event-stream",
+            headers={**SSE_HEADERS, "X-Stream-ID": stream_id}
+          )
+
+@router.delete("/{conversation_id}/chat/{stream_id}")
+async def cancel_chat_stream(
+    conversation_id: str,
+    stream_id: str
+):
+    """Stop a running generation; the partial answer is saved."""
+    _get_conversation_stream(conversation_id, stream_id)
+    return {"ok": True, "cancelled": cancel_stream(stream_id)}
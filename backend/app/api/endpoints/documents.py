@@ -1,33 +1,151 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query, status
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
 
-from app.core.database import get_db, engine
+from app.core.database import engine, run_db
 from app.models.document import DocumentModel, Base
-from app.schemas.document import Document
-from app.services.vector_store import VectorStoreService
+from app.schemas.document import (
+    Document, DocumentPage, DocumentCatalogStats, BulkDeleteRequest, BulkDeleteResponse,
+    RechunkRequest, ChunkFetchRequest, ChunkFetchResponse,
+)
+from app.services import corpus_version, document_catalog, rechunk, snapshot
+from app.services.document_service import DocumentService
+from app.services.vector_store import VectorStoreService, acorpus_write_lock
+from app.core.config import settings
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
 router = APIRouter()
 
-@router.get("/", response_model=List[Document])
-def get_documents(db: Session = Depends(get_db)):
-    """Get all documents."""
-    return db.query(DocumentModel).order_by(DocumentModel.upload_time.desc()).all()
+def _get_document(db: Session, document_id: int) -> Optional[DocumentModel]:
+    return db.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+
+def _upload_path(document: DocumentModel) -> str:
+    return DocumentService.upload_path(document.id, document.filename)
+
+def _document_files(document: DocumentModel) -> List[str]:
+    # The upload and its extracted-text cache
+    file_path = _upload_path(document)
+    return [file_path, DocumentService.extracted_text_path(file_path)]
+
+def _remove_files(file_paths: List[str]):
+    for file_path in file_paths:
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            print(f"Error deleting file: {e}")
+
+def _load_document_page(db: Session, limit: int, **kwargs) -> DocumentPage:
+    documents, has_more, next_cursor = document_catalog.get_documents_page(db, limit, **kwargs)
+    return DocumentPage(
+        documents=[Document.model_validate(d, from_attributes=True) for d in documents],
+        has_more=has_more,
+        next_cursor=next_cursor,
+    )
+
+@router.get("/", response_model=DocumentPage)
+async def get_documents(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    sort: str = "upload_time",
+    order: str = "desc",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """Document catalog with ingestion statistics, one keyset page at a time."""
+    if limit is None:
+        limit = settings.DOCUMENT_PAGE_SIZE
+    if not 1 <= limit <= settings.MAX_DOCUMENT_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.MAX_DOCUMENT_PAGE_SIZE}")
+    if sort not in document_catalog.SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(document_catalog.SORT_KEYS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    try:
+        return await run_db(
+            _load_document_page, limit,
+            status=status_filter, sort=sort, descending=(order == "desc"), cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/stats", response_model=DocumentCatalogStats)
+async def get_document_stats():
+    """Document, chunk and token totals and ingestion time over the catalog."""
+    return await run_db(document_catalog.get_catalog_stats)
+
+@router.post("/rechunk", status_code=status.HTTP_202_ACCEPTED)
+def start_rechunk(request: RechunkRequest):
+    """
+    Re-split every document from its extracted-text cache with new splitter
+    settings in the background; unchanged chunks keep their embeddings and the
+    new collection is swapped in when done. Poll GET /documents/rechunk.
+    """
+    chunk_size = request.chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = settings.CHUNK_OVERLAP if request.chunk_overlap is None else request.chunk_overlap
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise HTTPException(status_code=400, detail="chunk_overlap must be between 0 and chunk_size")
+    if not rechunk.start_job(chunk_size, chunk_overlap):
+        raise HTTPException(status_code=409, detail="A re-chunk job is already running")
+    return rechunk.job_status()
+
+@router.get("/rechunk")
+def get_rechunk_status():
+    return rechunk.job_status()
+
+@router.get("/snapshots")
+def list_snapshots():
+    return snapshot.list_snapshots()
+
+@router.post("/snapshots", status_code=status.HTTP_201_CREATED)
+async def export_snapshot():
+    """
+    Write a consistent, checksummed snapshot of the knowledge base (chunks,
+    embeddings, BM25 index, document rows, uploads) to SNAPSHOT_DIRECTORY.
+    """
+    try:
+        return await run_in_threadpool(snapshot.export_snapshot)
+    except snapshot.SnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/snapshots/{name}/import")
+async def import_snapshot(name: str):
+    """Bulk-load a snapshot into this (empty) node without any embedding calls."""
+    try:
+        return await run_in_threadpool(snapshot.import_snapshot, snapshot.snapshot_path(name))
+    except snapshot.SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/chunks", response_model=ChunkFetchResponse)
+def get_chunks(request: ChunkFetchRequest):
+    """Full text of source chunks, fetched in one batch by chunk ID."""
+    chunk_ids = list(dict.fromkeys(request.chunk_ids))
+    if len(chunk_ids) > settings.MAX_CHUNK_FETCH:
+        raise HTTPException(status_code=400, detail=f"Too many chunk IDs (max {settings.MAX_CHUNK_FETCH}).")
+
+    docs = VectorStoreService().get_chunks(chunk_ids)
+    found = {doc.metadata["chunk_id"] for doc in docs}
+    return {
+        "chunks": [
+            {"chunk_id": doc.metadata["chunk_id"], "content": doc.page_content, "metadata": doc.metadata}
+            for doc in docs
+        ],
+        "missing": [chunk_id for chunk_id in chunk_ids if chunk_id not in found],
+    }
 
 @router.get("/{document_id}/preview")
-def get_document_preview(document_id: int, db: Session = Depends(get_db)):
+async def get_document_preview(document_id: int):
     """Get document preview file."""
-    document = db.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+    document = await run_db(_get_document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Construct file path
-    file_path = os.path.join("data", "uploads", f"{document.id}_{document.filename}")
+    file_path = _upload_path(document)
     
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found on server")
@@ -45,36 +163,81 @@ def get_document_preview(document_id: int, db: Session = Depends(get_db)):
         content_disposition_type="inline"
     )
 
+def _delete_document_record(db: Session, document_id: int):
+    document = _get_document(db, document_id)
+    if document:
+        db.delete(document)
+        corpus_version.bump_version(db)
+
 @router.delete("/{document_id}")
-def delete_document(document_id: int, db: Session = Depends(get_db)):
+async def delete_document(document_id: int):
     """Delete a document by ID."""
-    document = db.query(DocumentModel).filter(DocumentModel.id == document_id).first()
+    document = await run_db(_get_document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    # 1. Delete from Vector Store
-    try:
-        vector_service = VectorStoreService()
-        vector_service.delete_documents_by_file_id(str(document_id))
-    except Exception as e:
-        print(f"Error deleting vectors: {e}")
-        # Continue to delete from DB even if vector deletion fails (to keep consistency)
-        
-    # 2. Delete file from storage
-    try:
-        file_path = os.path.join("data", "uploads", f"{document.id}_{document.filename}")
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except Exception as e:
-        print(f"Error deleting file: {e}")
-    
-    # 3. Delete from Database
-    try:
-        db.delete(document)
-        db.commit()
-    except Exception as e:
-        db.rollback()
-        print(f"Error deleting from database: {e}")
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    # Vectors and row go together under the shared corpus lock: a re-chunk
+    # reconciling meanwhile must not see one deleted without the other
+    async with acorpus_write_lock():
+        # 1. Delete from Vector Store
+        try:
+            vector_service = VectorStoreService()
+            await run_in_threadpool(vector_service.delete_documents_by_file_id, str(document_id))
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+            # Continue to delete from DB even if vector deletion fails (to keep consistency)
+
+        # 2. Delete file from storage
+        _remove_files(_document_files(document))
+
+        # 3. Delete from Database
+        try:
+            await run_db(_delete_document_record, document_id, write=True)
+        except Exception as e:
+            print(f"Error deleting from database: {e}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     
     return {"message": "Document deleted successfully"}
+
+def _get_documents(db: Session, document_ids: List[int]) -> List[DocumentModel]:
+    return db.query(DocumentModel).filter(DocumentModel.id.in_(document_ids)).all()
+
+def _delete_document_records(db: Session, document_ids: List[int]):
+    db.query(DocumentModel).filter(DocumentModel.id.in_(document_ids)).delete(synchronize_session=False)
+    corpus_version.bump_version(db)
+
+@router.post("/bulk-delete", response_model=BulkDeleteResponse)
+async def bulk_delete_documents(request: BulkDeleteRequest, background_tasks: BackgroundTasks):
+    """
+    Delete many documents at once: one Chroma delete, one BM25 update and one
+    database transaction; the uploaded files are removed after the response.
+    """
+    document_ids = list(dict.fromkeys(request.ids))
+    if len(document_ids) > settings.MAX_BULK_DELETE:
+        raise HTTPException(status_code=400, detail=f"Too many document IDs (max {settings.MAX_BULK_DELETE}).")
+    documents = await run_db(_get_documents, document_ids)
+    found = {document.id for document in documents}
+    deleted = [document_id for document_id in document_ids if document_id in found]
+    missing = [document_id for document_id in document_ids if document_id not in found]
+    if not deleted:
+        return {"deleted": [], "missing": missing}
+
+    async with acorpus_write_lock():
+        # 1. Delete from Vector Store (a failure aborts before anything else is touched)
+        try:
+            vector_service = VectorStoreService()
+            await run_in_threadpool(vector_service.delete_documents_by_file_ids, [str(i) for i in deleted])
+        except Exception as e:
+            print(f"Error deleting vectors: {e}")
+            raise HTTPException(status_code=500, detail=f"Vector store error: {str(e)}")
+
+        # 2. Delete from Database
+        try:
+            await run_db(_delete_document_records, deleted, write=True)
+        except Exception as e:
+            print(f"Error deleting from database: {e}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    # 3. Delete files from storage once the response is sent
+    background_tasks.add_task(_remove_files, [path for document in documents for path in _document_files(document)])
+    return {"deleted": deleted, "missing": missing}
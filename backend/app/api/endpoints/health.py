@@ -0,0 +1,21 @@
+from fastapi import APIRouter
+from app.services.circuit_breaker import get_breaker
+from app.services.llm_gateway import LLMGateway
+from app.services.message_persister import MessagePersister
+
+router = APIRouter()
+
+# External dependencies guarded by circuit breakers
+DEPENDENCIES = ["llm", "embedding", "web_search"]
+
+@router.get("/")
+def health():
+    """Service health with circuit breaker state per dependency."""
+    breakers = {name: get_breaker(name).snapshot() for name in DEPENDENCIES}
+    degraded = any(b["state"] != "closed" for b in breakers.values())
+    return {
+        "status": "degraded" if degraded else "ok",
+        "circuit_breakers": breakers,
+        "llm_gateway": LLMGateway().metrics(),
+        "message_persister": MessagePersister().metrics(),
+    }
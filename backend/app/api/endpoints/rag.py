@@ -1,15 +1,21 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form
 from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
 import shutil
 import os
+import time
 import uuid
 import logging
 from app.services.document_service import DocumentService
-from app.services.vector_store import VectorStoreService
+from app.services.vector_store import VectorStoreService, acorpus_write_lock
 from app.services.rag_engine import RAGEngine
-from app.core.database import get_db
+from app.services.llm_gateway import LLMGateway, LLMOverloadedError, LLMPriority
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.sse_encoder import sse_stream
+from app.services import corpus_version
+from app.core.database import run_db
+from app.core.config import settings
 from app.models.document import DocumentModel
 from pydantic import BaseModel
 
@@ -26,25 +32,45 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     answer: str
     sources: List[str]
+    skipped_stages: List[str] = []
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+
+def _create_document_record(db: Session, filename: str) -> DocumentModel:
+    db_doc = DocumentModel(
+        filename=filename,
+        status="processing",
+        file_size=0 # We'll update this later
+    )
+    db.add(db_doc)
+    db.commit()
+    db.refresh(db_doc)
+    return db_doc
+
+def _update_document_record(db: Session, document_id: int, bump_version: bool = False, **fields):
+    db.query(DocumentModel).filter(DocumentModel.id == document_id).update(fields)
+    if bump_version:
+        # Commits the update and the new corpus version in one transaction
+        corpus_version.bump_version(db)
+    else:
+        db.commit()
+
+def _save_upload(file: UploadFile, file_path: str) -> int:
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(file.file, buffer)
+    return os.path.getsize(file_path)
 
 @router.post("/upload")
 async def upload_document(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    file: UploadFile = File(...)
 ):
     """Upload a document and process it."""
     try:
         logger.info(f"Starting upload for file: {file.filename}")
         
         # 0. Create Database Record
-        db_doc = DocumentModel(
-            filename=file.filename,
-            status="processing",
-            file_size=0 # We'll update this later
-        )
-        db.add(db_doc)
-        db.commit()
-        db.refresh(db_doc)
+        db_doc = await run_db(_create_document_record, file.filename, write=True)
         
         # 1. Save file permanently
         file_ext = os.path.splitext(file.filename)[1]
@@ -56,12 +82,8 @@ async def upload_document(
         # Save with ID prefix to avoid collisions
         file_path = os.path.join(upload_dir, f"{db_doc.id}_{file.filename}")
         
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        file_size = os.path.getsize(file_path)
-        db_doc.file_size = file_size
-        db.commit()
+        file_size = await run_in_threadpool(_save_upload, file, file_path)
+        await run_db(_update_document_record, db_doc.id, file_size=file_size, write=True)
         
         logger.info(f"File saved locally at {file_path}")
             
@@ -69,7 +91,12 @@ async def upload_document(
         doc_service = DocumentService()
         logger.info("Starting document loading and splitting...")
         # Use run_in_threadpool for blocking I/O operations
-        chunks = await run_in_threadpool(doc_service.load_and_split, file_path)
+        parse_start = time.perf_counter()
+        pages = await run_in_threadpool(doc_service.load, file_path)
+        # Keep the extracted text so a re-chunk never has to parse the file again
+        await run_in_threadpool(doc_service.save_extracted_text, pages, file_path)
+        chunks = await run_in_threadpool(doc_service.split, pages)
+        parse_seconds = time.perf_counter() - parse_start
         logger.info(f"Document split into {len(chunks)} chunks")
         
         # Add file_id to metadata for all chunks
@@ -78,15 +105,30 @@ async def upload_document(
             chunk.metadata["filename"] = file.filename
         
         # 3. Store vectors
-        vector_service = VectorStoreService()
         logger.info("Starting vector storage (embedding generation)...")
-        # Use run_in_threadpool for blocking I/O operations
-        await run_in_threadpool(vector_service.add_documents, chunks)
+        embed_start = time.perf_counter()
+        # Under the shared corpus lock, so a re-chunk swap cannot drop the collection mid-write
+        async with acorpus_write_lock():
+            vector_service = VectorStoreService()
+            # Use run_in_threadpool for blocking I/O operations
+            await run_in_threadpool(vector_service.add_documents, chunks)
+        embed_seconds = time.perf_counter() - embed_start
         logger.info("Vector storage completed")
         
-        # Update DB status
-        db_doc.status = "processed"
-        db.commit()
+        # Update DB status and ingestion statistics (the catalog reads these instead of Chroma)
+        token_count = await run_in_threadpool(doc_service.count_chunk_tokens, chunks)
+        await run_db(
+            _update_document_record, db_doc.id,
+            status="processed",
+            chunk_count=len(chunks),
+            token_count=token_count,
+            page_count=len(pages),
+            parse_seconds=round(parse_seconds, 3),
+            embed_seconds=round(embed_seconds, 3),
+            # Other workers drop their BM25 index, answer cache and Chroma client on their next request
+            bump_version=True,
+            write=True,
+        )
         
         # No cleanup needed as we want to keep the file for preview
         # os.remove(file_path)
@@ -97,8 +139,7 @@ async def upload_document(
         logger.error(f"Error processing file: {str(e)}", exc_info=True)
         # Update DB status to error
         if 'db_doc' in locals():
-            db_doc.status = "error"
-            db.commit()
+            await run_db(_update_document_record, db_doc.id, status="error", write=True)
             
         # Clean up temp file if it exists and error occurred
         if 'temp_path' in locals() and os.path.exists(temp_path):
@@ -119,25 +160,75 @@ async def chat(request: ChatRequest):
         
         return ChatResponse(
             answer=result["result"],
-            sources=sources
+            sources=sources,
+            skipped_stages=result.get("skipped_stages", [])
         )
         
+    except (LLMOverloadedError, CircuitOpenError) as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/chat/stream")
 async def chat_stream(request: ChatRequest):
     """Chat with the RAG knowledge base (Streaming)."""
+    # Fast backpressure: reject before the stream starts if the LLM queue is full
+    if LLMGateway().is_overloaded():
+        raise HTTPException(status_code=503, detail="LLM queue is full, please retry later.", headers={"Retry-After": "5"})
+
     try:
         rag_engine = RAGEngine()
         
         async def generate():
-            async for chunk in rag_engine.astream_answer_generator(request.query, chat_history=request.history):
-                # Ensure we send valid JSON in SSE format
-                yield f"data: {json.dumps(chunk)}\n\n"
+            try:
+                async for chunk in rag_engine.astream_answer_generator(request.query, chat_history=request.history):
+                    yield chunk
+            except (LLMOverloadedError, CircuitOpenError) as e:
+                yield {"error": str(e)}
         
-        return StreamingResponse(generate(), media_type="text/event-stream")
+        # Token chunks are coalesced into fewer SSE frames
+        return StreamingResponse(sse_stream(generate()), media_type="text/event-stream")
         
     except Exception as e:
         logger.error(f"Error in chat stream: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Answer many questions at once (NDJSON, one line per question as it finishes).
+    Retrieval and reranking are shared across the batch; generations run at batch priority.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions provided.")
+    if len(request.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many questions (max {settings.BATCH_MAX_QUESTIONS}).",
+        )
+    if LLMGateway().is_overloaded():
+        raise HTTPException(status_code=503, detail="LLM queue is full, please retry later.", headers={"Retry-After": "5"})
+
+    rag_engine = RAGEngine(priority=LLMPriority.BATCH)
+
+    async def generate():
+        try:
+            async for result in rag_engine.abatch_answer(request.questions):
+                line = {"index": result["index"], "question": result["query"]}
+                if "error" in result:
+                    line["error"] = result["error"]
+                else:
+                    line["answer"] = result["result"]
+                    line["sources"] = [doc.page_content[:1000] + "..." for doc in result.get("source_documents", [])]
+                    line["skipped_stages"] = result.get("skipped_stages", [])
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.error(f"Error in batch chat: {str(e)}", exc_info=True)
+            yield json.dumps({"error": str(e)}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+@router.get("/llm/metrics")
+def llm_metrics():
+    """Queue depth, wait times and rate limit state of the shared LLM gateway."""
+    return LLMGateway().metrics()
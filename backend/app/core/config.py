@@ -6,7 +6,70 @@ load_dotenv()
 class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
-    CHROMA_PERSIST_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data/chroma_db")
+    CHROMA_PERSIST_DIRECTORY = os.getenv(
+        "CHROMA_PERSIST_DIRECTORY",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data/chroma_db"),
+    )
+    
+    # Database Configuration (SQLite in WAL mode)
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/sql_app.db")
+    # Pooled connections; reads run on this many DB threads, writes on a single writer thread
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+    # How long a connection waits for a lock before failing with "database is locked"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    # Page cache per connection (KiB)
+    SQLITE_CACHE_SIZE_KIB = int(os.getenv("SQLITE_CACHE_SIZE_KIB", "16384"))
+    # Chat messages are queued and committed together every interval (group commit)...
+    PERSIST_FLUSH_INTERVAL_SECONDS = float(os.getenv("PERSIST_FLUSH_INTERVAL_SECONDS", "0.05"))
+    # ...or as soon as this many are waiting
+    PERSIST_MAX_BATCH = int(os.getenv("PERSIST_MAX_BATCH", "200"))
+    # A batch that fails to commit is retried this many times, waiting
+    # PERSIST_RETRY_BACKOFF_SECONDS, then twice as long each time, before its messages are failed
+    PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "4"))
+    PERSIST_RETRY_BACKOFF_SECONDS = float(os.getenv("PERSIST_RETRY_BACKOFF_SECONDS", "0.1"))
+    
+    # Conversation History Configuration
+    # Messages loaded per chat turn (covers HISTORY_MESSAGES and REWRITE_HISTORY_MESSAGES)
+    CHAT_HISTORY_WINDOW = int(os.getenv("CHAT_HISTORY_WINDOW", "6"))
+    # Default and maximum page size of the message API
+    MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+    MAX_MESSAGE_PAGE_SIZE = int(os.getenv("MAX_MESSAGE_PAGE_SIZE", "200"))
+    # Default and maximum page size of the conversation list
+    CONVERSATION_PAGE_SIZE = int(os.getenv("CONVERSATION_PAGE_SIZE", "30"))
+    MAX_CONVERSATION_PAGE_SIZE = int(os.getenv("MAX_CONVERSATION_PAGE_SIZE", "100"))
+    # Characters of the last message stored on the conversation for the list
+    CONVERSATION_PREVIEW_CHARS = int(os.getenv("CONVERSATION_PREVIEW_CHARS", "80"))
+    
+    # Conversation Archive Configuration
+    # Conversations idle longer than this are moved to compressed files (0 disables the background job)
+    ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+    ARCHIVE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data/archive")
+    # zstd (needs the zstandard package, otherwise gzip is used) | gzip
+    ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd").lower()
+    ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+    # Conversations archived per pass
+    ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "50"))
+
+    # Conversation Search Configuration
+    # Default and maximum hits per page of GET /conversations/search
+    SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+    MAX_SEARCH_PAGE_SIZE = int(os.getenv("MAX_SEARCH_PAGE_SIZE", "100"))
+    # Characters of message text shown around the first match
+    SEARCH_SNIPPET_CHARS = int(os.getenv("SEARCH_SNIPPET_CHARS", "120"))
+    
+    # Conversation Summary Configuration
+    # Turns older than the recent window are folded into a rolling summary after each answer
+    SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() == "true"
+    # Messages always kept verbatim after the summary
+    SUMMARY_KEEP_RECENT_MESSAGES = int(os.getenv("SUMMARY_KEEP_RECENT_MESSAGES", "4"))
+    # Update once this many messages have left the recent window (batches LLM calls)
+    SUMMARY_MIN_NEW_MESSAGES = int(os.getenv("SUMMARY_MIN_NEW_MESSAGES", "2"))
+    # Messages folded in per summary call (long backlogs catch up over several calls)
+    SUMMARY_MAX_BATCH_MESSAGES = int(os.getenv("SUMMARY_MAX_BATCH_MESSAGES", "20"))
+    # Token caps for the summary and for each message fed into it
+    SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "400"))
+    SUMMARY_MESSAGE_MAX_TOKENS = int(os.getenv("SUMMARY_MESSAGE_MAX_TOKENS", "300"))
     
     # Embedding Model Configuration
     EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "text-embedding-3-small")
@@ -14,8 +77,142 @@ class Settings:
     # LLM Configuration
     LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gpt-3.5-turbo")
     
+    # LLM Gateway Configuration (shared by all RAGEngine instances in a process)
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    # Waiting requests beyond this are rejected with 503
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500"))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+    # Completion tokens reserved per call for the tokens/minute limit
+    LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "512"))
+    LLM_POOL_CONNECTIONS = int(os.getenv("LLM_POOL_CONNECTIONS", "20"))
+
+    # Request Deadline Configuration (seconds)
+    # Overall budget for one chat request, shared by all stages
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "60"))
+    REWRITE_TIMEOUT_SECONDS = float(os.getenv("REWRITE_TIMEOUT_SECONDS", "5"))
+    RERANK_TIMEOUT_SECONDS = float(os.getenv("RERANK_TIMEOUT_SECONDS", "5"))
+    WEB_SEARCH_TIMEOUT_SECONDS = float(os.getenv("WEB_SEARCH_TIMEOUT_SECONDS", "8"))
+    # Time kept free for the final generation; optional stages never use it
+    GENERATION_RESERVE_SECONDS = float(os.getenv("GENERATION_RESERVE_SECONDS", "15"))
+    # Below this much remaining time, max_tokens is capped to what fits
+    GENERATION_FULL_SECONDS = float(os.getenv("GENERATION_FULL_SECONDS", "30"))
+    GENERATION_TOKENS_PER_SECOND = float(os.getenv("GENERATION_TOKENS_PER_SECOND", "25"))
+    GENERATION_MIN_TOKENS = int(os.getenv("GENERATION_MIN_TOKENS", "64"))
+
+    # Circuit Breaker Configuration (per dependency: llm, embedding, web_search)
+    # Open when at least CIRCUIT_MIN_CALLS calls in the window fail at this rate
+    CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    CIRCUIT_WINDOW_SECONDS = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+    CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+    # How long an open circuit rejects calls before half-open probing
+    CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
+    # Recent answers kept for serving while the LLM circuit is open
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+
+    # Batch QA Configuration (POST /rag/chat/batch)
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+    # Generations of one batch running at the same time
+    BATCH_GENERATION_CONCURRENCY = int(os.getenv("BATCH_GENERATION_CONCURRENCY", "4"))
+    # Query/document pairs per cross-encoder predict call
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "64"))
+
+    # Streaming Configuration
+    # Token chunks are merged into one SSE frame for up to this long...
+    SSE_FLUSH_INTERVAL_SECONDS = float(os.getenv("SSE_FLUSH_INTERVAL_SECONDS", "0.05"))
+    # ...or until this many bytes are buffered (interval 0 sends every chunk as is)
+    SSE_FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "512"))
+    # Encoded frames waiting for a slow client before the producer is paused
+    SSE_MAX_PENDING_FRAMES = int(os.getenv("SSE_MAX_PENDING_FRAMES", "64"))
+
+    # Resumable Stream Configuration
+    # Events kept per generation for Last-Event-ID replay (older answer chunks are folded)
+    STREAM_BUFFER_MAX_EVENTS = int(os.getenv("STREAM_BUFFER_MAX_EVENTS", "2000"))
+    # Finished generations stay resumable for this long before their buffer is released
+    STREAM_RETENTION_SECONDS = float(os.getenv("STREAM_RETENTION_SECONDS", "120"))
+
+    # Sources Configuration
+    # Characters of chunk text sent and stored with each source reference
+    SOURCE_SNIPPET_CHARS = int(os.getenv("SOURCE_SNIPPET_CHARS", "160"))
+    # Chunk IDs accepted per POST /documents/chunks request
+    MAX_CHUNK_FETCH = int(os.getenv("MAX_CHUNK_FETCH", "100"))
+
+    # Document Configuration
+    # Splitter settings of new uploads; run migrations/rechunk_documents.py after changing them
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+    # Processes splitting documents in parallel during a re-chunk
+    RECHUNK_WORKERS = int(os.getenv("RECHUNK_WORKERS", "4"))
+    # Default and maximum page size of the document catalog
+    DOCUMENT_PAGE_SIZE = int(os.getenv("DOCUMENT_PAGE_SIZE", "50"))
+    MAX_DOCUMENT_PAGE_SIZE = int(os.getenv("MAX_DOCUMENT_PAGE_SIZE", "200"))
+    # Document IDs accepted per POST /documents/bulk-delete request
+    MAX_BULK_DELETE = int(os.getenv("MAX_BULK_DELETE", "1000"))
+    # Knowledge-base snapshots written by POST /documents/snapshots and migrations/kb_snapshot.py
+    SNAPSHOT_DIRECTORY = os.getenv("SNAPSHOT_DIRECTORY", "data/snapshots")
+
+    # Preforked Server Configuration (python -m app.prefork)
+    # Worker processes forked after the BM25 index, jieba and the rerank model are loaded
+    PREFORK_WORKERS = int(os.getenv("PREFORK_WORKERS", "4"))
+
     # Mock Configuration
     USE_MOCK_RAG = os.getenv("USE_MOCK_RAG", "false").lower() == "true"
+    # Characters per chunk and delay between chunks of the simulated stream
+    MOCK_STREAM_CHUNK_CHARS = int(os.getenv("MOCK_STREAM_CHUNK_CHARS", "2"))
+    MOCK_STREAM_DELAY_SECONDS = float(os.getenv("MOCK_STREAM_DELAY_SECONDS", "0.05"))
+
+    # Query Rewrite Configuration
+    # Start retrieval on the original query while the rewrite LLM call is in flight
+    SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+    # Reuse speculative results when the rewritten query is at least this similar (0-1)
+    REWRITE_SIMILARITY_THRESHOLD = float(os.getenv("REWRITE_SIMILARITY_THRESHOLD", "0.85"))
+    # Queries shorter than this are treated as follow-ups and always rewritten
+    REWRITE_MIN_QUERY_LENGTH = int(os.getenv("REWRITE_MIN_QUERY_LENGTH", "6"))
+    REWRITE_HISTORY_MESSAGES = int(os.getenv("REWRITE_HISTORY_MESSAGES", "6"))
+    REWRITE_CACHE_SIZE = int(os.getenv("REWRITE_CACHE_SIZE", "512"))
+
+    # Web Search Fallback Configuration
+    # Number of leading answer characters watched for refusal phrases
+    REFUSAL_DETECTION_CHARS = int(os.getenv("REFUSAL_DETECTION_CHARS", "60"))
+    # Start web search in parallel with generation when retrieval looks weak
+    WEB_SEARCH_PREFETCH = os.getenv("WEB_SEARCH_PREFETCH", "true").lower() == "true"
+    # Retrieval is weak when the best rerank score is below this value...
+    WEAK_RERANK_SCORE = float(os.getenv("WEAK_RERANK_SCORE", "0.0"))
+    # ...or, without a reranker, when fewer query terms than this ratio appear in the docs
+    WEAK_TERM_COVERAGE = float(os.getenv("WEAK_TERM_COVERAGE", "0.5"))
+
+    # Web Search Service Configuration
+    # duckduckgo | local (offline stand-in for tests and benchmarks)
+    WEB_SEARCH_BACKEND = os.getenv("WEB_SEARCH_BACKEND", "duckduckgo").lower()
+    # JSON list of {title, href, body} served by the local backend
+    WEB_SEARCH_LOCAL_FILE = os.getenv("WEB_SEARCH_LOCAL_FILE", "")
+    WEB_SEARCH_LOCAL_LATENCY_SECONDS = float(os.getenv("WEB_SEARCH_LOCAL_LATENCY_SECONDS", "0"))
+    # Upper bound for a single search, independent of the request deadline
+    WEB_SEARCH_HARD_TIMEOUT_SECONDS = float(os.getenv("WEB_SEARCH_HARD_TIMEOUT_SECONDS", "10"))
+    WEB_SEARCH_MAX_WORKERS = int(os.getenv("WEB_SEARCH_MAX_WORKERS", "4"))
+    WEB_SEARCH_CACHE_TTL_SECONDS = float(os.getenv("WEB_SEARCH_CACHE_TTL_SECONDS", "600"))
+    WEB_SEARCH_CACHE_SIZE = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "256"))
+
+    # Prompt Budget Configuration (tokens, counted with tiktoken)
+    MAX_PROMPT_TOKENS = int(os.getenv("MAX_PROMPT_TOKENS", "6000"))
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    HISTORY_MESSAGES = int(os.getenv("HISTORY_MESSAGES", "4"))
+    HISTORY_MESSAGE_MAX_TOKENS = int(os.getenv("HISTORY_MESSAGE_MAX_TOKENS", "500"))
+    # Chunks that would be trimmed below this size are dropped instead
+    MIN_CHUNK_TOKENS = int(os.getenv("MIN_CHUNK_TOKENS", "50"))
+
+    # Context Compression Configuration
+    # off | bm25 | embedding - extract query-relevant sentences before generation.
+    # embedding also sizes each chunk's share by its similarity to the query, from
+    # vectors already computed (no extra embedding call)
+    CONTEXT_COMPRESSION = os.getenv("CONTEXT_COMPRESSION", "off").lower()
+    # Fraction of each chunk's sentences kept at most
+    COMPRESSION_KEEP_RATIO = float(os.getenv("COMPRESSION_KEEP_RATIO", "0.4"))
+    # Sentences always kept per chunk (chunks this short are left untouched)
+    COMPRESSION_MIN_SENTENCES = int(os.getenv("COMPRESSION_MIN_SENTENCES", "2"))
+    # Recent query vectors kept from retrieval for reuse by later stages
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "256"))
     
     def is_api_key_valid(self) -> bool:
         """Check if the API Key is valid (non-empty and ASCII only)."""
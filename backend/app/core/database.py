@@ -1,23 +1,90 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+import asyncio
+import functools
 import os
 
 # Create data directory if not exists
 os.makedirs("data", exist_ok=True)
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./data/sql_app.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe in WAL mode
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KIB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def create_db_engine(url: str = SQLALCHEMY_DATABASE_URL, wal: bool = True):
+    """SQLite engine with a connection pool and, by default, WAL pragmas."""
+    db_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+    )
+    if wal:
+        event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Blocking DB work runs here instead of on the event loop. SQLite allows one
+# writer at a time, so writes are serialized on their own thread rather than
+# contending for the lock.
+_read_executor = ThreadPoolExecutor(max_workers=settings.DB_POOL_SIZE, thread_name_prefix="db-read")
+_write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+
+def create_missing_columns(bind=None):
+    """create_all skips columns added to existing tables; add missing nullable ones."""
+    bind = bind or engine
+    existing_tables = set(inspect(bind).get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+
+def create_missing_indexes(bind=None):
+    """create_all skips indexes of existing tables; add any that are missing."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind or engine, checkfirst=True)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+def _call_with_session(fn, args, kwargs):
+    with SessionLocal() as db:
+        return fn(db, *args, **kwargs)
+
+async def run_db(fn, *args, write: bool = False, **kwargs):
+    """
+    Await fn(session, *args, **kwargs) on a DB thread with its own session.
+    Returned ORM objects are detached: load what the caller needs inside fn.
+    """
+    executor = _write_executor if write else _read_executor
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(_call_with_session, fn, args, kwargs)
+    )
@@ -1,12 +1,24 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
+import atexit
 import uvicorn
-from app.core.database import Base, engine
+from app.core.database import Base, engine, create_missing_columns, create_missing_indexes, run_db
 # Import models to register them with Base
 from app.models import conversation, document 
+from app.services.search_index import create_search_index
+from app.services.conversation_service import backfill_conversation_stats
+from app.services.message_persister import MessagePersister
+from app.services import corpus_version, stream_buffer
+from app.services.conversation_archive import archive_loop
+from app.core.config import settings
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+create_missing_columns()
+create_missing_indexes()
+create_search_index(engine)
+backfill_conversation_stats(engine)
 
 from app.api.api import api_router
 
@@ -27,6 +39,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def refresh_corpus_caches(request: Request, call_next):
+    # Another worker may have ingested or deleted documents since this one built its caches
+    if request.url.path.startswith("/api/"):
+        await run_db(corpus_version.sync)
+    return await call_next(request)
+
+@app.on_event("startup")
+async def start_archive_job():
+    # Move long-inactive conversations to compressed cold storage in the background
+    # (every worker starts the loop; only the holder of the archive lease runs it)
+    if settings.ARCHIVE_AFTER_DAYS > 0:
+        app.state.archive_task = asyncio.create_task(archive_loop())
+
+@app.on_event("shutdown")
+async def drain_pending_writes():
+    archive_task = getattr(app.state, "archive_task", None)
+    if archive_task is not None:
+        archive_task.cancel()
+    # Stop generations (their partial answers are queued), then commit everything queued
+    await stream_buffer.cancel_all()
+    await MessagePersister().close()
+
+# Safety net if the process exits without a clean shutdown of the event loop
+atexit.register(MessagePersister().flush_sync)
+
 @app.get("/")
 def root():
     return {"message": "Welcome to RAG Knowledge Base API"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Index, event, inspect
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from datetime import datetime
@@ -11,9 +11,26 @@ class Conversation(Base):
     title = Column(String, default="New Chat")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Rolling summary of the turns before the recent window, and the last message it covers
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    # Denormalized for the conversation list, maintained on every message write
+    message_count = Column(Integer, default=0)
+    last_message_preview = Column(String, nullable=True)
+    # Set while the messages live in a compressed file under ARCHIVE_DIRECTORY
+    archived_at = Column(DateTime, nullable=True)
+    archive_file = Column(String, nullable=True)
 
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Covers the conversation list: keyset on (updated_at, id), no table lookups
+        Index(
+            "ix_conversations_list",
+            "updated_at", "id", "created_at", "title", "message_count", "last_message_preview",
+        ),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -25,3 +42,41 @@ class Message(Base):
     sources = Column(Text, nullable=True) # JSON string of sources
 
     conversation = relationship("Conversation", back_populates="messages")
+
+    __table_args__ = (
+        # History windows and message pages are read newest-first per conversation
+        Index("ix_messages_conversation_created", "conversation_id", "created_at"),
+    )
+
+class JobLease(Base):
+    """Time-limited claim on a background job that only one worker process may run."""
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String)
+    expires_at = Column(DateTime)
+
+
+# Full-text search sync (app/services/search_index.py). Contents are segmented
+# with jieba here rather than in SQL triggers; deletes are handled by triggers.
+@event.listens_for(Message, "after_insert")
+def _index_new_message(mapper, connection, target):
+    from app.services.search_index import index_message
+    index_message(connection, target.id, target.content)
+
+@event.listens_for(Message, "after_update")
+def _reindex_message(mapper, connection, target):
+    if inspect(target).attrs.content.history.has_changes():
+        from app.services.search_index import index_message
+        index_message(connection, target.id, target.content, new=False)
+
+@event.listens_for(Conversation, "after_insert")
+def _index_new_conversation(mapper, connection, target):
+    from app.services.search_index import index_conversation
+    index_conversation(connection, target.id, target.title)
+
+@event.listens_for(Conversation, "after_update")
+def _reindex_conversation(mapper, connection, target):
+    if inspect(target).attrs.title.history.has_changes():
+        from app.services.search_index import index_conversation
+        index_conversation(connection, target.id, target.title, new=False)
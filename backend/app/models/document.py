@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Float, Index
 from app.core.database import Base
 from datetime import datetime
 
@@ -10,3 +10,22 @@ class DocumentModel(Base):
     upload_time = Column(DateTime, default=datetime.utcnow)
     status = Column(String, default="processed") # processed, error
     file_size = Column(Integer, default=0)
+    # Ingestion statistics, recorded by the upload path (NULL for documents ingested before)
+    chunk_count = Column(Integer, nullable=True)
+    token_count = Column(Integer, nullable=True)  # tokens embedded, overlaps included
+    page_count = Column(Integer, nullable=True)
+    parse_seconds = Column(Float, nullable=True)  # loading and splitting
+    embed_seconds = Column(Float, nullable=True)
+
+    __table_args__ = (
+        # Default catalog order, without and with a status filter
+        Index("ix_documents_upload", "upload_time", "id"),
+        Index("ix_documents_status_upload", "status", "upload_time", "id"),
+    )
+
+class CorpusState(Base):
+    """Single row (id 1) holding the knowledge-base version, bumped by every ingest and delete."""
+    __tablename__ = "corpus_state"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
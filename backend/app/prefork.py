@@ -0,0 +1,169 @@
+"""
+Preforked server: load the read-only state every worker needs (BM25 index,
+jieba dictionary, rerank model, tokenizer) once in a parent process, then
+fork the workers, so they share those pages copy-on-write instead of each
+holding its own copy.
+
+The parent never opens Chroma itself (a Chroma client does not survive a
+fork); a short-lived spawned process reads the collection for the BM25
+index. gc.freeze() moves everything loaded into the permanent generation
+before forking, so the workers' garbage collector does not write to (and
+copy) those pages.
+
+Usage (from backend/, Linux):
+    python -m app.prefork [--workers 4] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import gc
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Dict
+
+import uvicorn
+
+from app.core import database
+from app.core.config import settings
+from app.main import app
+from app.services import corpus_version, vector_store
+from app.services.context_assembler import _get_encoding
+from app.services.message_persister import MessagePersister
+from app.services.rerank import RerankService
+
+logger = logging.getLogger(__name__)
+
+
+def read_collection(chroma_directory: str) -> dict:
+    """Runs in a spawned helper process: the chunks of the active Chroma collection."""
+    settings.CHROMA_PERSIST_DIRECTORY = chroma_directory
+    from app.services.vector_store import VectorStoreService
+
+    return VectorStoreService().vector_db.get()
+
+
+def preload() -> dict:
+    """Load the shared read-only state into this process; returns what was loaded."""
+    start = time.perf_counter()
+    # Version first: a change while the index is built makes the workers rebuild it
+    with database.SessionLocal() as db:
+        corpus_version.sync(db)
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        collection_data = pool.apply(read_collection, (settings.CHROMA_PERSIST_DIRECTORY,))
+    vector_store._bm25_retriever_cache = vector_store.build_bm25_retriever(collection_data)
+
+    import jieba
+
+    jieba.initialize()
+    RerankService()._load_model()
+    _get_encoding()
+    chunks = len(vector_store._bm25_retriever_cache.docs) if vector_store._bm25_retriever_cache else 0
+    return {"chunks": chunks, "rerank_model": RerankService().model is not None, "seconds": round(time.perf_counter() - start, 2)}
+
+
+def freeze_for_fork():
+    """Drop inherited connections and keep the garbage collector off the preloaded objects."""
+    database.engine.dispose()
+    gc.collect()
+    gc.freeze()
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """RSS, PSS (shared pages split between their users) and private memory of a process, in KiB."""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty", "Shared_Clean", "Shared_Dirty"):
+                    usage[key.lower()] = int(value.split()[0])
+    except FileNotFoundError:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    usage["rss"] = int(line.split()[1])
+    usage["private"] = usage.pop("private_clean", 0) + usage.pop("private_dirty", 0)
+    usage["shared"] = usage.pop("shared_clean", 0) + usage.pop("shared_dirty", 0)
+    return usage
+
+
+def _run_worker(sock: socket.socket, log_level: str):
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    gc.enable()
+    try:
+        uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[sock])
+    finally:
+        # os._exit skips atexit hooks (the parent's would run here too), so write
+        # whatever the shutdown handlers could not drain before leaving
+        try:
+            MessagePersister().flush_sync()
+        except Exception as e:
+            logger.error(f"Failed to persist queued messages at worker exit: {e}", exc_info=True)
+        logging.shutdown()
+        os._exit(0)
+
+
+def _fork_worker(sock: socket.socket, log_level: str) -> int:
+    pid = os.fork()
+    if pid == 0:
+        _run_worker(sock, log_level)
+    return pid
+
+
+def serve(host: str, port: int, workers: int, log_level: str = "info"):
+    # No collections while loading, so the preloaded objects are not scattered among garbage
+    gc.disable()
+    loaded = preload()
+    logger.info(f"Preloaded {loaded['chunks']} BM25 chunks (rerank model: {loaded['rerank_model']}) in {loaded['seconds']}s")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+
+    freeze_for_fork()
+    children = {_fork_worker(sock, log_level) for _ in range(workers)}
+    logger.info(f"Serving on http://{host}:{port} with workers {sorted(children)}")
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            # Replacement workers start from the same frozen state; a corpus change since is picked up on their first request
+            logger.warning(f"Worker {pid} exited ({status}); starting a new one.")
+            children.add(_fork_worker(sock, log_level))
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.PREFORK_WORKERS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.host, args.port, args.workers, args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -28,10 +28,51 @@ class Conversation(ConversationBase):
     id: str
     created_at: datetime
     updated_at: datetime
+    message_count: Optional[int] = 0
+    last_message_preview: Optional[str] = None
     # messages: List[Message] = [] # By default we might not want to load all messages for list view
 
     class Config:
         from_attributes = True
 
 class ConversationDetail(Conversation):
+    # Latest page of messages; older ones via GET /conversations/{id}/messages
     messages: List[Message] = []
+    has_more_messages: bool = False
+
+class MessagePage(BaseModel):
+    messages: List[Message]
+    has_more: bool
+    # Pass as ?before= to load the previous page
+    next_before: Optional[int] = None
+
+class ConversationPage(BaseModel):
+    conversations: List[Conversation]
+    has_more: bool
+    # Pass as ?before= to load the next (older) page
+    next_before: Optional[str] = None
+
+class MessageSearchHit(BaseModel):
+    message_id: int
+    conversation_id: str
+    conversation_title: Optional[str] = None
+    role: str
+    snippet: str
+    created_at: Optional[datetime] = None
+    score: float
+    # In an archived conversation: opening it restores the messages (IDs may change then)
+    archived: bool = False
+
+class ConversationSearchHit(BaseModel):
+    conversation_id: str
+    title: Optional[str] = None
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    # Segmented query words, for highlighting
+    terms: List[str]
+    # Title matches (first page only)
+    conversations: List[ConversationSearchHit]
+    messages: List[MessageSearchHit]
+    has_more: bool
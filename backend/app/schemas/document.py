@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 class DocumentBase(BaseModel):
     filename: str
@@ -13,6 +13,51 @@ class Document(DocumentBase):
     upload_time: datetime
     status: str
     file_size: int
+    chunk_count: Optional[int] = None
+    token_count: Optional[int] = None
+    page_count: Optional[int] = None
+    parse_seconds: Optional[float] = None
+    embed_seconds: Optional[float] = None
 
     class Config:
         orm_mode = True
+
+class DocumentPage(BaseModel):
+    documents: List[Document]
+    has_more: bool
+    # Pass as ?cursor= (with the same filter and sort) to load the next page
+    next_cursor: Optional[str] = None
+
+class DocumentCatalogStats(BaseModel):
+    documents: int
+    by_status: Dict[str, int]
+    chunks: int
+    tokens: int
+    pages: int
+    parse_seconds: float
+    embed_seconds: float
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class BulkDeleteResponse(BaseModel):
+    deleted: List[int]
+    # IDs that did not exist
+    missing: List[int] = []
+
+class RechunkRequest(BaseModel):
+    # Defaults to CHUNK_SIZE / CHUNK_OVERLAP
+    chunk_size: Optional[int] = None
+    chunk_overlap: Optional[int] = None
+
+class ChunkFetchRequest(BaseModel):
+    chunk_ids: List[str]
+
+class Chunk(BaseModel):
+    chunk_id: str
+    content: str
+    metadata: Dict[str, Any] = {}
+
+class ChunkFetchResponse(BaseModel):
+    chunks: List[Chunk]
+    missing: List[str] = []
@@ -0,0 +1,180 @@
+from collections import deque
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the dependency's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker over a sliding time window.
+    Opens when at least min_calls calls were made in the window and the failure
+    rate reaches the threshold; after open_seconds a limited number of probe
+    calls are let through (half-open) to decide whether to close again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = None,
+        window_seconds: float = None,
+        min_calls: int = None,
+        open_seconds: float = None,
+        half_open_probes: int = None,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold or settings.CIRCUIT_FAILURE_RATE
+        self.window_seconds = window_seconds or settings.CIRCUIT_WINDOW_SECONDS
+        self.min_calls = min_calls or settings.CIRCUIT_MIN_CALLS
+        self.open_seconds = open_seconds or settings.CIRCUIT_OPEN_SECONDS
+        self.half_open_probes = half_open_probes or settings.CIRCUIT_HALF_OPEN_PROBES
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, succeeded)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.rejected_total = 0
+
+    def _trim(self, now: float):
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _current_state(self, now: float) -> str:
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            logger.info(f"Circuit '{self.name}' half-open: probing dependency.")
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    @property
+    def is_open(self) -> bool:
+        """True if calls would currently be rejected."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == OPEN or (
+                state == HALF_OPEN and self._probes_in_flight >= self.half_open_probes
+            )
+
+    def before_call(self):
+        """Reserve permission for one call or raise CircuitOpenError."""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == OPEN or (
+                state == HALF_OPEN and self._probes_in_flight >= self.half_open_probes
+            ):
+                self.rejected_total += 1
+                raise CircuitOpenError(f"Circuit '{self.name}' is open.")
+            if state == HALF_OPEN:
+                self._probes_in_flight += 1
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._current_state(now) == HALF_OPEN:
+                logger.info(f"Circuit '{self.name}' closed: probe succeeded.")
+                self._state = CLOSED
+                self._calls.clear()
+            self._calls.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._calls.append((now, False))
+            self._trim(now)
+
+            if state == HALF_OPEN:
+                self._open(now)
+                return
+
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if (
+                state == CLOSED
+                and len(self._calls) >= self.min_calls
+                and failures / len(self._calls) >= self.failure_rate_threshold
+            ):
+                self._open(now)
+
+    def record_ignored(self):
+        """Release a reserved call that ended without a verdict on dependency health."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        logger.warning(f"Circuit '{self.name}' opened for {self.open_seconds}s.")
+
+    def call(self, func, *args, **kwargs):
+        """Run a synchronous call through the breaker."""
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._trim(now)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            return {
+                "state": state,
+                "calls_in_window": len(self._calls),
+                "failure_rate": round(failures / len(self._calls), 3) if self._calls else 0.0,
+                "rejected_total": self.rejected_total,
+                "retry_in_seconds": round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                if state == OPEN
+                else 0.0,
+            }
+
+
+# Global registry: one breaker per external dependency
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _registry_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+class BreakerEmbeddings(Embeddings):
+    """Embeddings wrapper that routes every call through a circuit breaker."""
+
+    def __init__(self, embeddings: Embeddings, breaker: CircuitBreaker):
+        self.embeddings = embeddings
+        self.breaker = breaker
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.breaker.call(self.embeddings.embed_documents, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.breaker.call(self.embeddings.embed_query, text)
@@ -0,0 +1,229 @@
+from typing import List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Global cache for the tiktoken encoding (loading it reads the BPE ranks from disk/network)
+_encoding_cache = None
+
+# Approximate per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Minimum shared prefix/suffix length for two chunks to be considered overlapping
+MIN_MERGE_OVERLAP_CHARS = 20
+
+
+def _get_encoding():
+    global _encoding_cache
+    if _encoding_cache is None:
+        try:
+            import tiktoken
+
+            try:
+                _encoding_cache = tiktoken.encoding_for_model(settings.LLM_MODEL_NAME)
+            except KeyError:
+                _encoding_cache = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # Offline or tiktoken missing: fall back to a conservative character count
+            logger.warning(f"tiktoken unavailable ({e}). Estimating tokens by characters.")
+            _encoding_cache = False
+    return _encoding_cache or None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens of text with the LLM's tokenizer."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Trim text to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    # Drop a partially decoded multi-byte character at the cut
+    return encoding.decode(tokens[:max_tokens]).rstrip("�")
+
+
+def _overlap_length(a: str, b: str) -> int:
+    """Length of the longest suffix of a that is a prefix of b."""
+    if len(a) < MIN_MERGE_OVERLAP_CHARS or len(b) < MIN_MERGE_OVERLAP_CHARS:
+        return 0
+    probe = b[:MIN_MERGE_OVERLAP_CHARS]
+    start = a.find(probe, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def _doc_key(doc: Document) -> tuple:
+    meta = doc.metadata
+    return (meta.get("file_id") or meta.get("source"), meta.get("page"))
+
+
+def _doc_score(doc: Document, rank: int) -> float:
+    # Reranker scores when available, otherwise the retrieval rank order
+    if "relevance_score" in doc.metadata:
+        return float(doc.metadata["relevance_score"])
+    return -float(rank)
+
+
+class ContextAssembler:
+    def __init__(
+        self,
+        max_prompt_tokens: Optional[int] = None,
+        history_token_budget: Optional[int] = None,
+    ):
+        self.max_prompt_tokens = max_prompt_tokens or settings.MAX_PROMPT_TOKENS
+        self.history_token_budget = (
+            history_token_budget
+            if history_token_budget is not None
+            else settings.HISTORY_TOKEN_BUDGET
+        )
+
+    @staticmethod
+    def merge_overlapping(docs: List[Document]) -> List[Document]:
+        """Merge chunks from the same file and page whose texts overlap."""
+        merged: List[Document] = []
+        for doc in docs:
+            target = None
+            for i, existing in enumerate(merged):
+                if _doc_key(existing) != _doc_key(doc) or _doc_key(doc)[0] is None:
+                    continue
+                if _overlap_length(existing.page_content, doc.page_content):
+                    target = (i, existing.page_content, doc.page_content)
+                    break
+                if _overlap_length(doc.page_content, existing.page_content):
+                    target = (i, doc.page_content, existing.page_content)
+                    break
+
+            if target is None:
+                merged.append(doc)
+                continue
+
+            i, first, second = target
+            overlap = _overlap_length(first, second)
+            metadata = dict(merged[i].metadata)
+            if "relevance_score" in doc.metadata or "relevance_score" in metadata:
+                metadata["relevance_score"] = max(
+                    float(metadata.get("relevance_score", float("-inf"))),
+                    float(doc.metadata.get("relevance_score", float("-inf"))),
+                )
+            metadata["merged_chunks"] = metadata.get("merged_chunks", 1) + 1
+            merged[i] = Document(page_content=first + second[overlap:], metadata=metadata)
+        return merged
+
+    def pack_history(
+        self, chat_history: Optional[List[dict]], budget: int, summary: Optional[str] = None
+    ) -> Tuple[List[dict], int]:
+        """
+        Keep the conversation summary (if any) and the most recent history
+        messages that fit into the budget. The summary comes first as a
+        system message.
+        """
+        if (not chat_history and not summary) or budget <= 0:
+            return [], 0
+
+        summary_msg = None
+        used = 0
+        if summary:
+            content = "此前对话摘要：\n" + truncate_to_tokens(summary, settings.SUMMARY_MAX_TOKENS)
+            tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            if tokens <= budget:
+                summary_msg = {"role": "system", "content": content}
+                used = tokens
+
+        packed = []
+        for msg in reversed((chat_history or [])[-settings.HISTORY_MESSAGES :]):
+            content = msg.get("content") or ""
+            content = truncate_to_tokens(content, settings.HISTORY_MESSAGE_MAX_TOKENS)
+            tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            if used + tokens > budget:
+                remaining = budget - used - MESSAGE_OVERHEAD_TOKENS
+                if remaining < settings.MIN_CHUNK_TOKENS:
+                    break
+                content = truncate_to_tokens(content, remaining)
+                tokens = count_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            packed.append({"role": msg.get("role"), "content": content})
+            used += tokens
+        if summary_msg is not None:
+            packed.append(summary_msg)
+        packed.reverse()
+        return packed, used
+
+    def pack_documents(self, docs: List[Document], budget: int) -> Tuple[List[Document], int]:
+        """Fill the budget with the highest-scoring chunks first, trimming the last one."""
+        ranked = sorted(
+            enumerate(self.merge_overlapping(docs)),
+            key=lambda item: _doc_score(item[1], item[0]),
+            reverse=True,
+        )
+        separator_tokens = count_tokens("\n\n")
+
+        packed = []
+        used = 0
+        for _, doc in ranked:
+            remaining = budget - used - (separator_tokens if packed else 0)
+            if remaining < settings.MIN_CHUNK_TOKENS:
+                break
+            tokens = count_tokens(doc.page_content)
+            if tokens > remaining:
+                content = truncate_to_tokens(doc.page_content, remaining)
+                doc = Document(page_content=content, metadata={**doc.metadata, "truncated": True})
+                tokens = count_tokens(content)
+            packed.append(doc)
+            used += tokens + (separator_tokens if len(packed) > 1 else 0)
+        return packed, used
+
+    def assemble(
+        self,
+        system_prompt: str,
+        user_template: str,
+        query: str,
+        docs: List[Document],
+        chat_history: Optional[List[dict]] = None,
+        summary: Optional[str] = None,
+    ) -> dict:
+        """
+        Build a prompt that fits into the token budget.
+        user_template must contain {context} and {question} placeholders.
+        Returns the packed docs, context string, trimmed history and prompt token count.
+        """
+        fixed_tokens = (
+            count_tokens(system_prompt)
+            + count_tokens(user_template.format(context="", question=query))
+            + 2 * MESSAGE_OVERHEAD_TOKENS
+        )
+        available = self.max_prompt_tokens - fixed_tokens
+
+        history, history_tokens = self.pack_history(
+            chat_history, min(self.history_token_budget, max(available, 0)), summary
+        )
+        packed_docs, context_tokens = self.pack_documents(docs, available - history_tokens)
+        context = "\n\n".join(doc.page_content for doc in packed_docs)
+
+        prompt_tokens = fixed_tokens + history_tokens + context_tokens
+        if len(packed_docs) < len(docs):
+            logger.info(
+                f"Context packed {len(packed_docs)}/{len(docs)} chunks into {prompt_tokens} tokens."
+            )
+
+        return {
+            "docs": packed_docs,
+            "context": context,
+            "history": history,
+            "prompt_tokens": prompt_tokens,
+        }
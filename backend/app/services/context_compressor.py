@@ -0,0 +1,122 @@
+from typing import List, Optional
+from langchain_core.documents import Document
+from app.core.config import settings
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+# Split after Chinese/English sentence terminators and on line breaks
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[。！？；!?;])|(?<=\.)\s+|\n+")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into non-empty sentences."""
+    return [s.strip() for s in SENTENCE_SPLIT_PATTERN.split(text) if s and s.strip()]
+
+
+def cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ContextCompressor:
+    """Extractive compression: keep only the sentences of each chunk relevant to the query."""
+
+    def __init__(self, vector_store=None, mode: Optional[str] = None):
+        # VectorStoreService holding the chunks' stored embeddings (embedding mode)
+        self.vector_store = vector_store
+        self.mode = mode or settings.CONTEXT_COMPRESSION
+
+    def _bm25_scores(self, query: str, sentences: List[str]) -> List[float]:
+        from rank_bm25 import BM25Okapi
+        from app.services.vector_store import chinese_tokenizer
+
+        corpus = [[t for t in chinese_tokenizer(s) if t.strip()] for s in sentences]
+        query_tokens = [t for t in chinese_tokenizer(query) if t.strip()]
+        if not query_tokens or not any(corpus):
+            return [0.0] * len(sentences)
+        bm25 = BM25Okapi(corpus)
+        return [float(score) for score in bm25.get_scores(query_tokens)]
+
+    def chunk_similarities(self, query: str, docs: List[Document]) -> Optional[List[float]]:
+        """
+        Query similarity of each chunk from vectors already on hand: the query's
+        from retrieval and the chunks' stored at ingest. None when any is missing;
+        sentences are never embedded per request.
+        """
+        from app.services.vector_store import cached_query_embedding
+
+        query_vector = cached_query_embedding(query)
+        chunk_ids = [doc.metadata.get("chunk_id") for doc in docs]
+        if query_vector is None or self.vector_store is None or not all(chunk_ids):
+            return None
+        try:
+            vectors = self.vector_store.get_chunk_embeddings(chunk_ids)
+        except Exception as e:
+            logger.warning(f"Reading chunk embeddings failed: {e}. Using BM25 only.")
+            return None
+        if any(chunk_id not in vectors for chunk_id in chunk_ids):
+            return None
+        return [cosine(query_vector, vectors[chunk_id]) for chunk_id in chunk_ids]
+
+    def keep_ratios(self, query: str, docs: List[Document]) -> List[float]:
+        """Fraction of sentences each chunk may keep; in embedding mode less similar chunks keep less."""
+        ratios = [settings.COMPRESSION_KEEP_RATIO] * len(docs)
+        if self.mode != "embedding":
+            return ratios
+        similarities = self.chunk_similarities(query, docs)
+        if not similarities or max(similarities) <= 0:
+            return ratios
+        best = max(similarities)
+        return [ratio * max(similarity, 0.0) / best for ratio, similarity in zip(ratios, similarities)]
+
+    def compress(self, query: str, docs: List[Document]) -> List[Document]:
+        """Return new documents containing only the most relevant sentences, in original order."""
+        if self.mode == "off" or not docs:
+            return docs
+
+        doc_sentences = [split_sentences(doc.page_content) for doc in docs]
+        all_sentences = [s for sentences in doc_sentences for s in sentences]
+        if not all_sentences:
+            return docs
+
+        # Score all sentences together so term weights reflect the whole context
+        scores = self._bm25_scores(query, all_sentences)
+
+        compressed = []
+        offset = 0
+        for doc, sentences, keep_ratio in zip(docs, doc_sentences, self.keep_ratios(query, docs)):
+            sentence_scores = scores[offset : offset + len(sentences)]
+            offset += len(sentences)
+            if len(sentences) <= settings.COMPRESSION_MIN_SENTENCES:
+                compressed.append(doc)
+                continue
+
+            keep_count = max(
+                settings.COMPRESSION_MIN_SENTENCES,
+                math.ceil(len(sentences) * keep_ratio),
+            )
+            ranked = sorted(range(len(sentences)), key=lambda i: sentence_scores[i], reverse=True)
+            # Always keep the best sentences, plus any others that match the query at all
+            keep = set(ranked[: settings.COMPRESSION_MIN_SENTENCES])
+            keep.update(i for i in ranked[:keep_count] if sentence_scores[i] > 0)
+
+            content = " ".join(sentences[i] for i in sorted(keep))
+            compressed.append(
+                Document(
+                    page_content=content,
+                    metadata={
+                        **doc.metadata,
+                        "compressed": True,
+                        "original_length": len(doc.page_content),
+                    },
+                )
+            )
+
+        before = sum(len(doc.page_content) for doc in docs)
+        after = sum(len(doc.page_content) for doc in compressed)
+        logger.info(f"Context compressed from {before} to {after} characters.")
+        return compressed
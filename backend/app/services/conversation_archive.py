@@ -0,0 +1,261 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import run_db
+from app.models.conversation import Conversation, JobLease, Message
+from app.services.search_index import archive_message_index, restore_message_index
+import asyncio
+import gzip
+import json
+import logging
+import os
+import socket
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional, gzip is used instead
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT_VERSION = 1
+_EXTENSIONS = {"zstd": ".json.zst", "gzip": ".json.gz"}
+
+
+def archive_codec() -> str:
+    return "zstd" if settings.ARCHIVE_COMPRESSION == "zstd" and zstandard is not None else "gzip"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(data: bytes, file_name: str) -> bytes:
+    if file_name.endswith(_EXTENSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError(f"{file_name} is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def archive_path(file_name: str) -> str:
+    return os.path.join(settings.ARCHIVE_DIRECTORY, file_name)
+
+
+def remove_archive(file_name: Optional[str]):
+    if not file_name:
+        return
+    try:
+        os.remove(archive_path(file_name))
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(path: str, data: bytes):
+    # The file must be complete and on disk before the messages are deleted
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def find_inactive(db: Session, cutoff: datetime, limit: int) -> List[str]:
+    """IDs of live conversations not updated since cutoff, oldest first (range scan of ix_conversations_list)."""
+    rows = (
+        db.query(Conversation.id)
+        .filter(Conversation.updated_at < cutoff, Conversation.archived_at.is_(None))
+        .order_by(Conversation.updated_at.asc())
+        .limit(limit)
+        .all()
+    )
+    return [row.id for row in rows]
+
+
+def archive_conversation(db: Session, conversation_id: str, cutoff: Optional[datetime] = None) -> Optional[dict]:
+    """
+    Move a conversation's messages into a compressed file, leaving the
+    conversation row (title, counts, preview, summary) as a stub. Its
+    messages stay searchable through the archived search index. Returns
+    sizes, or None if there was nothing to do.
+    """
+    conversation = db.get(Conversation, conversation_id)
+    if conversation is None or conversation.archived_at is not None:
+        return None
+    if cutoff is not None and conversation.updated_at and conversation.updated_at >= cutoff:
+        return None  # became active again
+    messages = (
+        db.query(Message)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_at.asc(), Message.id.asc())
+        .all()
+    )
+    if not messages:
+        return None
+
+    payload = {
+        "version": ARCHIVE_FORMAT_VERSION,
+        "conversation_id": conversation_id,
+        "messages": [
+            {
+                "id": m.id,
+                "role": m.role,
+                "content": m.content,
+                "sources": m.sources,
+                "created_at": m.created_at.isoformat() if m.created_at else None,
+            }
+            for m in messages
+        ],
+    }
+    raw = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    codec = archive_codec()
+    file_name = conversation_id + _EXTENSIONS[codec]
+    data = _compress(raw, codec)
+    _write_atomic(archive_path(file_name), data)
+
+    archive_message_index(db.connection(), conversation_id)
+    db.query(Message).filter(Message.conversation_id == conversation_id).delete(synchronize_session=False)
+    db.query(Conversation).filter(Conversation.id == conversation_id).update({
+        Conversation.archived_at: datetime.utcnow(),
+        Conversation.archive_file: file_name,
+        # Archiving is not activity: keep the list order
+        Conversation.updated_at: Conversation.updated_at,
+    }, synchronize_session=False)
+    db.commit()
+    return {
+        "conversation_id": conversation_id,
+        "messages": len(messages),
+        "bytes_raw": len(raw),
+        "bytes_archived": len(data),
+    }
+
+
+def restore_conversation(db: Session, conversation_id: str) -> bool:
+    """Load an archived conversation's messages back into SQLite; False if it was not archived."""
+    conversation = db.get(Conversation, conversation_id)
+    if conversation is None or conversation.archived_at is None:
+        return False
+    file_name = conversation.archive_file
+    with open(archive_path(file_name), "rb") as f:
+        payload = json.loads(_decompress(f.read(), file_name))
+
+    rows = payload["messages"]
+    # Message IDs are kept unless SQLite reused one meanwhile (no AUTOINCREMENT)
+    archived_ids = [row["id"] for row in rows]
+    keep_ids = not db.query(Message.id).filter(Message.id.in_(archived_ids)).first()
+    messages = [
+        Message(
+            id=row["id"] if keep_ids else None,
+            conversation_id=conversation_id,
+            role=row["role"],
+            content=row["content"],
+            sources=row["sources"],
+            created_at=datetime.fromisoformat(row["created_at"]) if row["created_at"] else None,
+        )
+        for row in rows
+    ]
+    restore_message_index(db.connection(), conversation_id)
+    db.add_all(messages)
+    db.flush()
+
+    summary_message_id = conversation.summary_message_id
+    if not keep_ids and summary_message_id is not None:
+        new_ids = {old: m.id for old, m in zip(archived_ids, messages)}
+        summary_message_id = new_ids.get(summary_message_id)
+    db.query(Conversation).filter(Conversation.id == conversation_id).update({
+        Conversation.archived_at: None,
+        Conversation.archive_file: None,
+        Conversation.summary_message_id: summary_message_id,
+        Conversation.updated_at: Conversation.updated_at,
+    }, synchronize_session=False)
+    db.commit()
+    remove_archive(file_name)
+    return True
+
+
+def _archived_at(db: Session, conversation_id: str) -> Optional[datetime]:
+    return db.query(Conversation.archived_at).filter(Conversation.id == conversation_id).scalar()
+
+
+async def ensure_restored(conversation_id: str) -> bool:
+    """Restore the conversation if it is archived; True if it was."""
+    if await run_db(_archived_at, conversation_id) is None:
+        return False
+    restored = await run_db(restore_conversation, conversation_id, write=True)
+    if restored:
+        logger.info(f"Restored archived conversation {conversation_id}.")
+    return restored
+
+
+async def archive_inactive(older_than_days: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+    """Archive up to `limit` conversations idle for longer than older_than_days."""
+    days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    conversation_ids = await run_db(find_inactive, cutoff, limit or settings.ARCHIVE_BATCH_SIZE)
+    results = []
+    for conversation_id in conversation_ids:
+        try:
+            # One short write transaction per conversation
+            result = await run_db(archive_conversation, conversation_id, cutoff, write=True)
+        except Exception as e:
+            logger.error(f"Failed to archive conversation {conversation_id}: {e}", exc_info=True)
+            continue
+        if result:
+            results.append(result)
+    return results
+
+
+def acquire_lease(db: Session, name: str, holder: str, seconds: float) -> bool:
+    """Take or renew the named lease for `seconds`; False while another holder's lease is live."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=seconds)
+    taken = db.query(JobLease).filter(
+        JobLease.name == name,
+        or_(JobLease.holder == holder, JobLease.expires_at < now),
+    ).update({JobLease.holder: holder, JobLease.expires_at: expires_at}, synchronize_session=False)
+    if not taken:
+        if db.get(JobLease, name) is not None:
+            db.rollback()
+            return False
+        db.add(JobLease(name=name, holder=holder, expires_at=expires_at))
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()  # another worker created it first
+        return False
+    return True
+
+
+def lease_holder() -> str:
+    # Evaluated per call: preforked workers share the parent's module state but not its PID
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def archive_loop():
+    """
+    Background job: archive a batch of inactive conversations every
+    ARCHIVE_INTERVAL_SECONDS. Every worker starts the loop, but only the one
+    holding the "archive" lease runs a pass; the lease outlives two intervals,
+    so another worker takes over if the holder dies.
+    """
+    while True:
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+        try:
+            if not await run_db(
+                acquire_lease, "archive", lease_holder(), 2 * settings.ARCHIVE_INTERVAL_SECONDS, write=True
+            ):
+                continue
+            archived = await archive_inactive()
+        except Exception as e:
+            logger.error(f"Archive pass failed: {e}", exc_info=True)
+            continue
+        if archived:
+            saved = sum(r["bytes_raw"] - r["bytes_archived"] for r in archived)
+            logger.info(f"Archived {len(archived)} inactive conversations ({saved / 1024:.1f} KiB compressed away).")
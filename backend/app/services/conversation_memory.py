@@ -0,0 +1,121 @@
+from typing import List, Optional, Tuple
+from langchain_core.messages import HumanMessage
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import run_db
+from app.models.conversation import Conversation, Message
+from app.services.context_assembler import truncate_to_tokens
+from app.services.llm_gateway import LLMPriority
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Conversations with a summary update in flight, and the background tasks themselves
+_updating: set = set()
+_tasks: set = set()
+
+
+def load_pending_messages(db: Session, conversation_id: str) -> Optional[Tuple[Optional[str], Optional[int], List[dict]]]:
+    """
+    Oldest messages not yet covered by the summary that have left the recent
+    window, or None when there are too few to be worth an update.
+    """
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if conversation is None:
+        return None
+
+    query = db.query(Message.id, Message.role, Message.content).filter(Message.conversation_id == conversation_id)
+    if conversation.summary_message_id is not None:
+        query = query.filter(Message.id > conversation.summary_message_id)
+    pending = query.count() - settings.SUMMARY_KEEP_RECENT_MESSAGES
+    if pending < settings.SUMMARY_MIN_NEW_MESSAGES:
+        return None
+
+    rows = query.order_by(Message.id.asc()).limit(min(pending, settings.SUMMARY_MAX_BATCH_MESSAGES)).all()
+    messages = [{"id": row.id, "role": row.role, "content": row.content} for row in rows]
+    return conversation.summary, conversation.summary_message_id, messages
+
+
+def save_summary(db: Session, conversation_id: str, summary: str, last_message_id: int, previous_message_id: Optional[int]) -> bool:
+    """Store the new summary unless another worker already advanced it."""
+    covered = (
+        Conversation.summary_message_id.is_(None)
+        if previous_message_id is None
+        else Conversation.summary_message_id == previous_message_id
+    )
+    updated = (
+        db.query(Conversation)
+        .filter(Conversation.id == conversation_id, covered)
+        .update({"summary": summary, "summary_message_id": last_message_id}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+
+class ConversationMemory:
+    """Rolling summary of a conversation, updated in the background after each answer."""
+
+    def __init__(self, llm, gateway=None):
+        self.llm = llm
+        self.gateway = gateway
+
+    @staticmethod
+    def enabled() -> bool:
+        # The mock and missing-key LLMs return canned text, not summaries
+        return settings.SUMMARY_ENABLED and not settings.USE_MOCK_RAG and settings.is_api_key_valid()
+
+    @staticmethod
+    def build_prompt(summary: Optional[str], messages: List[dict]) -> str:
+        prompt = (
+            f"请将新增对话合并进已有的对话摘要，保留用户的目标、关键事实、结论和尚未解决的问题，"
+            f"省略寒暄与重复内容。摘要不超过 {settings.SUMMARY_MAX_TOKENS} 个 token，只输出摘要。\n\n"
+            f"已有摘要：\n{summary or '（无）'}\n\n新增对话：\n"
+        )
+        for msg in messages:
+            role = "用户" if msg.get("role") == "user" else "助手"
+            content = truncate_to_tokens(msg.get("content") or "", settings.SUMMARY_MESSAGE_MAX_TOKENS)
+            prompt += f"{role}: {content}\n"
+        return prompt + "\n更新后的摘要:"
+
+    async def asummarize(self, summary: Optional[str], messages: List[dict]) -> str:
+        prompt = [HumanMessage(content=self.build_prompt(summary, messages))]
+        if self.gateway is not None:
+            # Background work: never delay interactive requests
+            response = await self.gateway.ainvoke(prompt, LLMPriority.BATCH, llm=self.llm)
+        else:
+            response = await self.llm.ainvoke(prompt)
+        content = response.content if hasattr(response, "content") else str(response)
+        return truncate_to_tokens(content.strip(), settings.SUMMARY_MAX_TOKENS)
+
+    async def update(self, conversation_id: str) -> bool:
+        """Fold one batch of pending messages into the summary; False if nothing to do."""
+        pending = await run_db(load_pending_messages, conversation_id)
+        if pending is None:
+            return False
+        summary, previous_id, messages = pending
+        new_summary = await self.asummarize(summary, messages)
+        if not new_summary:
+            return False
+        return await run_db(
+            save_summary, conversation_id, new_summary, messages[-1]["id"], previous_id, write=True
+        )
+
+    async def _run_updates(self, conversation_id: str):
+        try:
+            while await self.update(conversation_id):
+                pass
+        except Exception as e:
+            logger.warning(f"Summary update for conversation {conversation_id} failed: {e}")
+        finally:
+            _updating.discard(conversation_id)
+
+    def schedule_update(self, conversation_id: str) -> Optional[asyncio.Task]:
+        """Start a background summary update unless one is already running."""
+        if not self.enabled() or conversation_id in _updating:
+            return None
+        _updating.add(conversation_id)
+        task = asyncio.create_task(self._run_updates(conversation_id))
+        _tasks.add(task)
+        task.add_done_callback(_tasks.discard)
+        return task
@@ -1,12 +1,75 @@
 from sqlalchemy.orm import Session
 from app.models.conversation import Conversation, Message
 from app.schemas.conversation import ConversationCreate, MessageCreate
-from typing import List, Optional
+from app.core.config import settings
+from app.services.conversation_archive import remove_archive
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import sessionmaker
+from typing import List, Optional, Tuple
 import json
+import re
+
+# Columns of the conversation list; all in ix_conversations_list so the index covers the query
+LIST_COLUMNS = (
+    Conversation.id,
+    Conversation.title,
+    Conversation.created_at,
+    Conversation.updated_at,
+    Conversation.message_count,
+    Conversation.last_message_preview,
+)
+
+def make_preview(content: Optional[str]) -> Optional[str]:
+    """Single-line start of a message for the conversation list."""
+    if not content:
+        return None
+    content = re.sub(r"\s+", " ", content).strip()
+    limit = settings.CONVERSATION_PREVIEW_CHARS
+    return content[:limit] + "..." if len(content) > limit else content
+
+def encode_cursor(updated_at: "datetime", conversation_id: str) -> str:
+    return f"{updated_at.isoformat()}_{conversation_id}"
+
+def decode_cursor(cursor: str) -> Tuple["datetime", str]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors."""
+    updated_at, sep, conversation_id = cursor.partition("_")
+    if not sep or not conversation_id:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return datetime.fromisoformat(updated_at), conversation_id
+
+def backfill_conversation_stats(bind) -> int:
+    """Fill message_count/last_message_preview of conversations created before the columns existed."""
+    Session = sessionmaker(bind=bind)
+    with Session() as db:
+        ids = [row.id for row in db.query(Conversation.id).filter(Conversation.message_count.is_(None))]
+        for conversation_id in ids:
+            ConversationService.refresh_stats(db, conversation_id)
+        db.commit()
+    return len(ids)
 
 class ConversationService:
-    def get_conversations(self, db: Session, skip: int = 0, limit: int = 100) -> List[Conversation]:
-        return db.query(Conversation).order_by(Conversation.updated_at.desc()).offset(skip).limit(limit).all()
+    def get_conversations_page(
+        self, db: Session, limit: int, before: Optional[str] = None
+    ) -> Tuple[list, bool, Optional[str]]:
+        """
+        Most recently updated conversations after cursor `before`, newest first:
+        one range scan of the covering index. Returns (rows, has_more, next cursor).
+        """
+        query = db.query(*LIST_COLUMNS)
+        if before:
+            updated_at, conversation_id = decode_cursor(before)
+            query = query.filter(
+                tuple_(Conversation.updated_at, Conversation.id) < tuple_(updated_at, conversation_id)
+            )
+        rows = (
+            query.order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_before = encode_cursor(rows[-1].updated_at, rows[-1].id) if has_more else None
+        return rows, has_more, next_before
 
     def get_conversation(self, db: Session, conversation_id: str) -> Optional[Conversation]:
         return db.query(Conversation).filter(Conversation.id == conversation_id).first()
@@ -21,8 +84,10 @@ class ConversationService:
     def delete_conversation(self, db: Session, conversation_id: str) -> bool:
         db_conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
         if db_conversation:
+            archive_file = db_conversation.archive_file
             db.delete(db_conversation)
             db.commit()
+            remove_archive(archive_file)
             return True
         return False
         
@@ -55,22 +120,48 @@ class ConversationService:
         # Update conversation updated_at
         db_conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
         if db_conversation:
-            # Auto-generate title if it's the first user message and title is "New Chat"
-            if db_conversation.title == "New Chat" and message.role == "user":
-                 # Use first 30 chars of content as title
-                 new_title = message.content[:30] + "..." if len(message.content) > 30 else message.content
-                 db_conversation.title = new_title
-                 
-            db_conversation.updated_at = datetime.utcnow() # This will be handled by onupdate but manual update is good too
+            self.touch_conversation(db_conversation, message)
         
         db.commit()
         db.refresh(db_message)
         return db_message
     
+    @staticmethod
+    def touch_conversation(db_conversation: Conversation, message: MessageCreate, at: Optional["datetime"] = None):
+        """Bump updated_at and the list stats; title a new chat after its first user message."""
+        # Auto-generate title if it's the first user message and title is "New Chat"
+        if db_conversation.title == "New Chat" and message.role == "user":
+             # Use first 30 chars of content as title
+             new_title = message.content[:30] + "..." if len(message.content) > 30 else message.content
+             db_conversation.title = new_title
+             
+        db_conversation.message_count = (db_conversation.message_count or 0) + 1
+        db_conversation.last_message_preview = make_preview(message.content)
+        db_conversation.updated_at = at or datetime.utcnow() # This will be handled by onupdate but manual update is good too
+
+    @staticmethod
+    def refresh_stats(db: Session, conversation_id: str):
+        """Recount messages and re-pick the preview, e.g. after a delete; updated_at is kept."""
+        db.flush()
+        count = db.query(func.count(Message.id)).filter(Message.conversation_id == conversation_id).scalar()
+        last = (
+            db.query(Message.content)
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .first()
+        )
+        db.query(Conversation).filter(Conversation.id == conversation_id).update({
+            Conversation.message_count: count,
+            Conversation.last_message_preview: make_preview(last.content) if last else None,
+            # Assigning the column to itself keeps onupdate from reordering the list
+            Conversation.updated_at: Conversation.updated_at,
+        }, synchronize_session=False)
+
     def delete_message(self, db: Session, conversation_id: str, message_id: int) -> bool:
         db_message = db.query(Message).filter(Message.id == message_id, Message.conversation_id == conversation_id).first()
         if db_message:
             db.delete(db_message)
+            self.refresh_stats(db, conversation_id)
             db.commit()
             return True
         return False
@@ -78,4 +169,44 @@ class ConversationService:
     def get_messages(self, db: Session, conversation_id: str) -> List[Message]:
         return db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at.asc()).all()
 
+    def _before(self, query, before_id: Optional[int]):
+        # Keyset condition: strictly older than message before_id, by (created_at, id)
+        if before_id is None:
+            return query
+        cursor_time = select(Message.created_at).where(Message.id == before_id).scalar_subquery()
+        return query.filter(tuple_(Message.created_at, Message.id) < tuple_(cursor_time, before_id))
+
+    def get_recent_history(
+        self, db: Session, conversation_id: str, limit: int,
+        before_id: Optional[int] = None, after_id: Optional[int] = None
+    ) -> List[dict]:
+        """
+        Last `limit` messages as {role, content}, oldest first; sources are not loaded.
+        after_id excludes messages already covered by the conversation summary.
+        """
+        query = db.query(Message.id, Message.role, Message.content).filter(Message.conversation_id == conversation_id)
+        if after_id is not None:
+            query = query.filter(Message.id > after_id)
+        rows = (
+            self._before(query, before_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(limit)
+            .all()
+        )
+        return [{"role": row.role, "content": row.content} for row in reversed(rows)]
+
+    def get_messages_page(
+        self, db: Session, conversation_id: str, limit: int, before_id: Optional[int] = None
+    ) -> Tuple[List[Message], bool]:
+        """Up to `limit` messages older than before_id (newest page if None), oldest first."""
+        query = db.query(Message).filter(Message.conversation_id == conversation_id)
+        rows = (
+            self._before(query, before_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+        has_more = len(rows) > limit
+        return list(reversed(rows[:limit])), has_more
+
 from datetime import datetime
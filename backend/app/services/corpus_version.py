@@ -0,0 +1,57 @@
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models.document import CorpusState  # noqa: F401 - registers the corpus_state table
+from app.services import rag_engine, vector_store
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Every worker process keeps its own BM25 index, answer cache and Chroma
+# client (with the vector index in memory). The corpus version in SQLite is
+# bumped in the same transaction as each ingest or delete; a worker that sees
+# a version other than the one its caches were built at drops them (they are
+# rebuilt on next use).
+_seen_version: Optional[int] = None
+_lock = threading.Lock()
+
+
+def read_version(db: Session) -> int:
+    # Plain SQL: this runs on every API request (one primary-key lookup)
+    row = db.execute(text("SELECT version FROM corpus_state WHERE id = 1")).first()
+    return row[0] if row else 0
+
+
+def bump_version(db: Session) -> int:
+    """Increment the corpus version and commit the session's transaction with it."""
+    global _seen_version
+    db.execute(text("INSERT OR IGNORE INTO corpus_state (id, version) VALUES (1, 0)"))
+    version = db.execute(text("UPDATE corpus_state SET version = version + 1 WHERE id = 1 RETURNING version")).scalar_one()
+    db.commit()
+    with _lock:
+        # This process already updated its own caches; skip the refresh unless it missed another change
+        if _seen_version == version - 1:
+            _seen_version = version
+    return version
+
+
+def invalidate_caches():
+    # _query_embedding_cache is kept on purpose: query vectors do not depend on the corpus
+    vector_store._bm25_retriever_cache = None
+    rag_engine._answer_cache.clear()
+    vector_store.reset_chroma_clients()
+
+
+def sync(db: Session) -> bool:
+    """Drop this process's corpus caches if another process changed the corpus. Returns True if dropped."""
+    global _seen_version
+    version = read_version(db)
+    with _lock:
+        if version == _seen_version:
+            return False
+        previous, _seen_version = _seen_version, version
+    invalidate_caches()
+    if previous is not None:
+        logger.info(f"Corpus version changed ({previous} -> {version}); dropped BM25 index, answer cache and Chroma client.")
+    return True
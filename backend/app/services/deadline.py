@@ -0,0 +1,53 @@
+from typing import List, Optional
+from app.core.config import settings
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Stages with less time than this are skipped rather than started
+MIN_STAGE_SECONDS = 0.2
+
+
+class Deadline:
+    """
+    Wall-clock budget shared by every stage of one request.
+    Optional stages get a sub-budget that never eats into the time reserved
+    for the final generation; stages that cannot run are recorded as skipped.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.budget = seconds if seconds is not None else settings.REQUEST_DEADLINE_SECONDS
+        self.expires_at = time.monotonic() + self.budget
+        self.skipped: List[str] = []
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage_timeout(self, stage_seconds: float, reserve_generation: bool = True) -> float:
+        """Time an optional stage may use: its own budget, minus the generation reserve."""
+        available = self.remaining()
+        if reserve_generation:
+            available -= settings.GENERATION_RESERVE_SECONDS
+        return max(0.0, min(stage_seconds, available))
+
+    def can_run(self, stage_seconds: float, reserve_generation: bool = True) -> bool:
+        return self.stage_timeout(stage_seconds, reserve_generation) >= MIN_STAGE_SECONDS
+
+    def skip(self, stage: str):
+        if stage not in self.skipped:
+            self.skipped.append(stage)
+            logger.info(f"Deadline: skipped stage '{stage}' ({self.remaining():.1f}s left)")
+
+    def max_generation_tokens(self) -> Optional[int]:
+        """Cap on completion tokens when the remaining time cannot fit a full answer."""
+        remaining = self.remaining()
+        if remaining >= settings.GENERATION_FULL_SECONDS:
+            return None
+        return max(
+            settings.GENERATION_MIN_TOKENS,
+            int(remaining * settings.GENERATION_TOKENS_PER_SECOND),
+        )
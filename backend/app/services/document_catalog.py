@@ -0,0 +1,100 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from app.models.document import DocumentModel
+import base64
+import json
+
+# Sortable catalog columns; statistics missing on old documents sort as -1
+SORT_KEYS = {
+    "upload_time": DocumentModel.upload_time,
+    "filename": DocumentModel.filename,
+    "file_size": DocumentModel.file_size,
+    "chunk_count": func.coalesce(DocumentModel.chunk_count, -1),
+    "token_count": func.coalesce(DocumentModel.token_count, -1),
+}
+
+
+def encode_cursor(sort: str, value, document_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, document_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[object, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors or another sort."""
+    try:
+        cursor_sort, value, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if cursor_sort != sort:
+        raise ValueError("Cursor belongs to a different sort order")
+    if sort == "upload_time":
+        value = datetime.fromisoformat(value)
+    return value, int(document_id)
+
+
+def get_documents_page(
+    db: Session,
+    limit: int,
+    status: Optional[str] = None,
+    sort: str = "upload_time",
+    descending: bool = True,
+    cursor: Optional[str] = None,
+) -> Tuple[List[DocumentModel], bool, Optional[str]]:
+    """
+    One page of the catalog in (sort key, id) order after `cursor`.
+    Returns (documents, has_more, next cursor). The default order, with or
+    without a status filter, is a range scan of an index.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort: {sort}")
+    key = SORT_KEYS[sort]
+    query = db.query(DocumentModel)
+    if status:
+        query = query.filter(DocumentModel.status == status)
+    if cursor:
+        value, document_id = decode_cursor(cursor, sort)
+        position = tuple_(key, DocumentModel.id)
+        query = query.filter(position < tuple_(value, document_id) if descending else position > tuple_(value, document_id))
+    if descending:
+        query = query.order_by(key.desc(), DocumentModel.id.desc())
+    else:
+        query = query.order_by(key.asc(), DocumentModel.id.asc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        value = getattr(last, sort)
+        if value is None and sort in ("chunk_count", "token_count"):
+            value = -1
+        next_cursor = encode_cursor(sort, value, last.id)
+    return rows, has_more, next_cursor
+
+
+def get_catalog_stats(db: Session) -> dict:
+    """Totals over the whole catalog, for monitoring ingestion cost."""
+    by_status = dict(
+        db.query(DocumentModel.status, func.count(DocumentModel.id)).group_by(DocumentModel.status).all()
+    )
+    totals = db.query(
+        func.coalesce(func.sum(DocumentModel.chunk_count), 0),
+        func.coalesce(func.sum(DocumentModel.token_count), 0),
+        func.coalesce(func.sum(DocumentModel.page_count), 0),
+        func.coalesce(func.sum(DocumentModel.parse_seconds), 0.0),
+        func.coalesce(func.sum(DocumentModel.embed_seconds), 0.0),
+    ).one()
+    return {
+        "documents": sum(by_status.values()),
+        "by_status": by_status,
+        "chunks": totals[0],
+        "tokens": totals[1],
+        "pages": totals[2],
+        "parse_seconds": round(totals[3], 3),
+        "embed_seconds": round(totals[4], 3),
+    }
@@ -1,19 +1,27 @@
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List
+from typing import List, Optional
 from langchain_core.documents import Document
+from app.core.config import settings
+from app.services.context_assembler import count_tokens
+import gzip
+import json
 import os
 
 class DocumentService:
-    def __init__(self):
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None):
         self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=chunk_size or settings.CHUNK_SIZE,
+            chunk_overlap=settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
             length_function=len,
         )
 
     def load_and_split(self, file_path: str) -> List[Document]:
         """Load a file and split it into chunks."""
+        return self.split(self.load(file_path))
+
+    def load(self, file_path: str) -> List[Document]:
+        """Load a file as one Document per page (a single one for text files)."""
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"File not found: {file_path}")
             
@@ -26,6 +34,48 @@ class DocumentService:
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
             
-        documents = loader.load()
-        chunks = self.text_splitter.split_documents(documents)
-        return chunks
+        return loader.load()
+
+    def load_cached(self, file_path: str) -> List[Document]:
+        """Pages from the extracted-text cache next to the upload; parses and caches them on a miss."""
+        try:
+            return self.load_extracted_text(file_path)
+        except FileNotFoundError:
+            pages = self.load(file_path)
+            self.save_extracted_text(pages, file_path)
+            return pages
+
+    def split(self, documents: List[Document]) -> List[Document]:
+        return self.text_splitter.split_documents(documents)
+
+    @staticmethod
+    def count_chunk_tokens(chunks: List[Document]) -> int:
+        """Tokens sent to the embedding model for these chunks."""
+        return sum(count_tokens(chunk.page_content) for chunk in chunks)
+
+    @staticmethod
+    def upload_path(document_id: int, filename: str) -> str:
+        # Saved with the ID prefix to avoid collisions (relative to backend/)
+        return os.path.join("data", "uploads", f"{document_id}_{filename}")
+
+    @staticmethod
+    def extracted_text_path(file_path: str) -> str:
+        return file_path + ".pages.json.gz"
+
+    @staticmethod
+    def save_extracted_text(pages: List[Document], file_path: str):
+        """Store the parsed pages of an upload (compressed) so it can be re-split without re-parsing."""
+        data = json.dumps(
+            [{"page_content": page.page_content, "metadata": page.metadata} for page in pages],
+            ensure_ascii=False,
+        ).encode("utf-8")
+        path = DocumentService.extracted_text_path(file_path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=6))
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load_extracted_text(file_path: str) -> List[Document]:
+        with open(DocumentService.extracted_text_path(file_path), "rb") as f:
+            pages = json.loads(gzip.decompress(f.read()))
+        return [Document(page_content=page["page_content"], metadata=page["metadata"]) for page in pages]
@@ -0,0 +1,275 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import List, Optional
+from app.core.config import settings
+from app.services.circuit_breaker import get_breaker
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPriority(IntEnum):
+    """Lower value is served first."""
+
+    INTERACTIVE = 0
+    EVALUATION = 1
+    BATCH = 2
+
+
+class LLMOverloadedError(Exception):
+    """Raised when the gateway wait queue is full (mapped to HTTP 503)."""
+
+
+class TokenBucket:
+    """Continuously refilled token bucket; capacity is the per-minute limit."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be consumed (0 if available now)."""
+        self._refill()
+        # Requests larger than the bucket only need a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        """Return over-reserved tokens (a negative amount charges an under-estimate)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self.tokens
+
+
+class LLMGateway:
+    """
+    Process-wide entry point for LLM calls.
+    Shares one pooled ChatOpenAI client, enforces requests/min and tokens/min
+    limits, bounds concurrency and queues waiters by priority.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(LLMGateway, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self._llm = None
+        self.max_concurrency = settings.LLM_MAX_CONCURRENCY
+        self.max_queue = settings.LLM_MAX_QUEUE
+        self.request_bucket = TokenBucket(settings.LLM_REQUESTS_PER_MINUTE)
+        self.token_bucket = TokenBucket(settings.LLM_TOKENS_PER_MINUTE)
+
+        self._active = 0
+        self._waiters: List[tuple] = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+        # Metrics
+        self.completed_total = 0
+        self.rejected_total = 0
+        self._wait_times = deque(maxlen=1000)
+
+    @property
+    def llm(self):
+        return self.get_llm()
+
+    def get_llm(self, llm_class=None):
+        """Shared chat model (ChatOpenAI by default) backed by pooled HTTP clients."""
+        if self._llm is None:
+            import httpx
+
+            if llm_class is None:
+                from langchain_openai import ChatOpenAI as llm_class
+
+            limits = httpx.Limits(
+                max_connections=settings.LLM_POOL_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_POOL_CONNECTIONS,
+            )
+            self._llm = llm_class(
+                model_name=settings.LLM_MODEL_NAME,
+                temperature=0,
+                openai_api_key=settings.OPENAI_API_KEY,
+                openai_api_base=settings.OPENAI_API_BASE,
+                timeout=60,
+                # Report token usage on the last streamed chunk (see _reconcile_tokens)
+                stream_usage=True,
+                http_client=httpx.Client(limits=limits, timeout=60),
+                http_async_client=httpx.AsyncClient(limits=limits, timeout=60),
+            )
+        return self._llm
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, fut in self._waiters if not fut.done())
+
+    def is_overloaded(self) -> bool:
+        """True if a new request would be rejected right now."""
+        return self._active >= self.max_concurrency and self.queue_depth >= self.max_queue
+
+    async def _acquire_slot(self, priority: int):
+        if self._active < self.max_concurrency and self.queue_depth == 0:
+            self._active += 1
+            return
+
+        if self.queue_depth >= self.max_queue:
+            self.rejected_total += 1
+            raise LLMOverloadedError("LLM queue is full, please retry later.")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before cancellation: pass it on
+                self._release_slot()
+            raise
+
+    def _release_slot(self):
+        self._active -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot directly to the highest-priority waiter
+                self._active += 1
+                future.set_result(None)
+                break
+
+    async def _acquire_rate(self, estimated_tokens: int):
+        while True:
+            delay = max(
+                self.request_bucket.wait_time(1),
+                self.token_bucket.wait_time(estimated_tokens),
+            )
+            if delay <= 0:
+                self.request_bucket.consume(1)
+                self.token_bucket.consume(estimated_tokens)
+                return
+            await asyncio.sleep(delay)
+
+    @property
+    def breaker(self):
+        return get_breaker("llm")
+
+    @asynccontextmanager
+    async def slot(self, priority: int = LLMPriority.INTERACTIVE, estimated_tokens: int = 0):
+        """Hold one generation slot within the rate limits and the LLM circuit breaker."""
+        # Fail fast while the provider is known to be down (raises CircuitOpenError)
+        self.breaker.before_call()
+        enqueued_at = time.monotonic()
+        try:
+            await self._acquire_slot(priority)
+        except BaseException:
+            # Never reached the provider: don't count it for or against the circuit
+            self.breaker.record_ignored()
+            raise
+        try:
+            await self._acquire_rate(estimated_tokens + settings.LLM_COMPLETION_TOKENS_ESTIMATE)
+            self._wait_times.append(time.monotonic() - enqueued_at)
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client disconnects and deliberate aborts say nothing about provider health
+            self.breaker.record_ignored()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self.completed_total += 1
+            self._release_slot()
+
+    @staticmethod
+    def _estimate_tokens(messages) -> int:
+        from app.services.context_assembler import count_tokens
+
+        if isinstance(messages, str):
+            return count_tokens(messages)
+        return sum(count_tokens(str(getattr(m, "content", m))) for m in messages)
+
+    def _reconcile_tokens(self, prompt_estimate: int, usage: Optional[dict], completion: str):
+        """
+        Correct the tokens/min bucket once a call is done: slot() reserved the
+        prompt estimate plus LLM_COMPLETION_TOKENS_ESTIMATE. Uses the provider's
+        reported usage, else the prompt estimate plus the completion's tokens.
+        """
+        from app.services.context_assembler import count_tokens
+
+        reserved = prompt_estimate + settings.LLM_COMPLETION_TOKENS_ESTIMATE
+        if usage and usage.get("total_tokens"):
+            actual = usage["total_tokens"]
+        else:
+            actual = prompt_estimate + count_tokens(completion)
+        self.token_bucket.refund(reserved - actual)
+
+    async def ainvoke(self, messages, priority: int = LLMPriority.INTERACTIVE, llm=None):
+        llm = llm or self.llm
+        estimated = self._estimate_tokens(messages)
+        async with self.slot(priority, estimated):
+            result = await llm.ainvoke(messages)
+        content = getattr(result, "content", result)
+        self._reconcile_tokens(estimated, getattr(result, "usage_metadata", None), str(content))
+        return result
+
+    async def astream(self, messages, priority: int = LLMPriority.INTERACTIVE, llm=None):
+        """Stream chunks while holding a slot for the whole generation."""
+        llm = llm or self.llm
+        estimated = self._estimate_tokens(messages)
+        async with self.slot(priority, estimated):
+            usage, completion = None, []
+            try:
+                async for chunk in llm.astream(messages):
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    completion.append(str(getattr(chunk, "content", chunk)))
+                    yield chunk
+            finally:
+                # Also when the consumer stops early: only what was generated is charged
+                self._reconcile_tokens(estimated, usage, "".join(completion))
+
+    def metrics(self) -> dict:
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))], 4)
+
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "in_flight": self._active,
+            "max_concurrency": self.max_concurrency,
+            "completed_total": self.completed_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_p50": percentile(0.5),
+            "wait_seconds_p95": percentile(0.95),
+            "wait_seconds_max": round(waits[-1], 4) if waits else None,
+            "requests_available": round(self.request_bucket.available, 1),
+            "tokens_available": round(self.token_bucket.available, 1),
+        }
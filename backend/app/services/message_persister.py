@@ -0,0 +1,182 @@
+from collections import deque
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core import database
+from app.models.conversation import Conversation, Message
+from app.schemas.conversation import MessageCreate
+from app.services.conversation_service import ConversationService
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def write_batch(db: Session, items: List[Tuple[str, MessageCreate, datetime]]) -> List[int]:
+    """Insert messages and touch their conversations in one transaction; returns the IDs."""
+    messages = []
+    for conversation_id, message, created_at in items:
+        sources = message.sources
+        if isinstance(sources, list):
+            sources = json.dumps(sources)
+        messages.append(Message(
+            conversation_id=conversation_id,
+            role=message.role,
+            content=message.content,
+            sources=sources,
+            created_at=created_at,
+        ))
+    db.add_all(messages)
+
+    conversation_ids = {conversation_id for conversation_id, _, _ in items}
+    conversations = {
+        c.id: c for c in db.query(Conversation).filter(Conversation.id.in_(conversation_ids))
+    }
+    for conversation_id, message, created_at in items:
+        if conversation_id in conversations:
+            ConversationService.touch_conversation(conversations[conversation_id], message, created_at)
+
+    # IDs are read before the commit: nothing after it may fail, or a retry would write the batch twice
+    db.flush()
+    ids = [m.id for m in messages]
+    db.commit()
+    return ids
+
+
+class MessagePersister:
+    """
+    Write-behind queue for chat messages.
+    add() returns at once with a future for the message ID; a background task
+    writes everything queued in one transaction every
+    PERSIST_FLUSH_INTERVAL_SECONDS (or once PERSIST_MAX_BATCH items are
+    waiting). The future resolves after the commit, so an ID handed to a
+    client is always durable. A batch that fails to commit (e.g. the database
+    is locked) is retried with backoff; its futures fail only once
+    PERSIST_MAX_RETRIES retries have failed too. close() drains the queue on
+    shutdown.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MessagePersister, cls).__new__(cls)
+            cls._instance._init()
+        return cls._instance
+
+    def _init(self):
+        self._pending = deque()  # (conversation_id, message, created_at, future)
+        self._wakeup: Optional[asyncio.Event] = None  # something is queued
+        self._full: Optional[asyncio.Event] = None  # a whole batch is queued
+        self._task: Optional[asyncio.Task] = None
+        self._loop = None
+        self._closing = False
+
+        # Metrics
+        self.batches_total = 0
+        self.messages_total = 0
+        self.retries_total = 0
+        self.failed_total = 0
+
+    def _ensure_running(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    def add(self, conversation_id: str, message: MessageCreate) -> "asyncio.Future[int]":
+        """Queue a message; the returned future resolves to its ID once committed."""
+        self._ensure_running()
+        future = self._loop.create_future()
+        self._pending.append((conversation_id, message, datetime.utcnow(), future))
+        self._wakeup.set()
+        if len(self._pending) >= settings.PERSIST_MAX_BATCH:
+            self._full.set()
+        return future
+
+    async def save(self, conversation_id: str, message: MessageCreate) -> int:
+        """Queue a message and wait until it is committed."""
+        return await self.add(conversation_id, message)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            if not self._closing:
+                # Group commit: collect what arrives during the interval unless a batch is full
+                try:
+                    await asyncio.wait_for(self._full.wait(), settings.PERSIST_FLUSH_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            self._full.clear()
+            await self.flush()
+            if self._closing and not self._pending:
+                return
+
+    async def flush(self):
+        """Write everything queued so far, in batches of at most PERSIST_MAX_BATCH."""
+        while self._pending:
+            batch = [self._pending.popleft() for _ in range(min(len(self._pending), settings.PERSIST_MAX_BATCH))]
+            ids = await self._write_with_retries(batch)
+            if ids is None:
+                continue
+            self.batches_total += 1
+            self.messages_total += len(batch)
+            for item, message_id in zip(batch, ids):
+                if not item[3].done():
+                    item[3].set_result(message_id)
+
+    async def _write_with_retries(self, batch) -> Optional[List[int]]:
+        """Commit a batch, retrying with exponential backoff; fails its futures and returns None if it never commits."""
+        for attempt in range(settings.PERSIST_MAX_RETRIES + 1):
+            try:
+                return await database.run_db(write_batch, [item[:3] for item in batch], write=True)
+            except Exception as e:
+                if attempt < settings.PERSIST_MAX_RETRIES:
+                    delay = settings.PERSIST_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    logger.warning(f"Failed to persist {len(batch)} messages ({e}); retrying in {delay:.2f}s.")
+                    self.retries_total += 1
+                    await asyncio.sleep(delay)
+                    continue
+                logger.error(f"Failed to persist {len(batch)} messages after {attempt + 1} attempts: {e}", exc_info=True)
+                self.failed_total += len(batch)
+                for item in batch:
+                    if not item[3].done():
+                        item[3].set_exception(e)
+                return None
+
+    async def close(self):
+        """Write everything still queued and stop the background task."""
+        self._closing = True
+        try:
+            if self._task is not None and not self._task.done() and self._loop is asyncio.get_running_loop():
+                self._wakeup.set()
+                self._full.set()
+                await self._task
+            await self.flush()
+        finally:
+            self._closing = False
+            self._task = None
+
+    def flush_sync(self):
+        """Last-resort synchronous drain when no event loop is left (e.g. at exit)."""
+        if not self._pending:
+            return
+        batch = list(self._pending)
+        self._pending.clear()
+        with database.SessionLocal() as db:
+            write_batch(db, [item[:3] for item in batch])
+        logger.info(f"Persisted {len(batch)} queued messages at exit.")
+
+    def metrics(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches_total": self.batches_total,
+            "messages_total": self.messages_total,
+            "retries_total": self.retries_total,
+            "failed_total": self.failed_total,
+        }
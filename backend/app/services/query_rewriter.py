@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import List, Optional
+from langchain_core.messages import HumanMessage
+from app.core.config import settings
+from app.services.context_assembler import truncate_to_tokens
+import hashlib
+import jieba
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Global LRU cache of rewritten queries keyed by (history hash, query)
+_rewrite_cache: "OrderedDict[tuple, str]" = OrderedDict()
+
+# Words that usually refer back to earlier turns, so the question is not self-contained.
+# Matched against jieba tokens, so "其" does not match inside 其他 (nor "该" in 应该).
+CONTEXT_DEPENDENT_MARKERS = {
+    "它", "他", "她", "这个", "那个", "这些", "那些", "这种", "那种", "这里", "那里",
+    "上面", "上述", "前面", "刚才", "之前", "其", "该", "此", "继续", "还有", "呢",
+    "另外",
+}
+CONTEXT_DEPENDENT_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "he", "she",
+    "above", "previous", "again",
+}
+
+
+class QueryRewriter:
+    def __init__(self, llm, gateway=None, priority: int = 0):
+        self.llm = llm
+        # Optional LLMGateway used to schedule the rewrite call
+        self.gateway = gateway
+        self.priority = priority
+
+    @staticmethod
+    def needs_rewrite(query: str, chat_history: Optional[List[dict]]) -> bool:
+        """Heuristic: only rewrite when the question likely depends on the history."""
+        if not chat_history:
+            return False
+
+        text = query.strip()
+        if len(text) < settings.REWRITE_MIN_QUERY_LENGTH:
+            return True
+
+        if CONTEXT_DEPENDENT_MARKERS.intersection(jieba.lcut(text)):
+            return True
+
+        words = set(re.findall(r"[a-zA-Z]+", text.lower()))
+        return bool(words & CONTEXT_DEPENDENT_WORDS)
+
+    @staticmethod
+    def history_hash(chat_history: List[dict], summary: Optional[str] = None) -> str:
+        """Stable hash of the summary and history window used by the rewrite prompt."""
+        window = [
+            [msg.get("role"), msg.get("content", "")]
+            for msg in chat_history[-settings.REWRITE_HISTORY_MESSAGES :]
+        ]
+        payload = json.dumps([summary, window], ensure_ascii=False)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def is_equivalent(original: str, rewritten: str) -> bool:
+        """Check whether the rewritten query is close enough to reuse results of the original."""
+        a = re.sub(r"\s+", "", original).lower()
+        b = re.sub(r"\s+", "", rewritten).lower()
+        if a == b:
+            return True
+        ratio = SequenceMatcher(None, a, b).ratio()
+        return ratio >= settings.REWRITE_SIMILARITY_THRESHOLD
+
+    @staticmethod
+    def get_cached(query: str, chat_history: List[dict], summary: Optional[str] = None) -> Optional[str]:
+        key = (QueryRewriter.history_hash(chat_history, summary), query)
+        rewritten = _rewrite_cache.get(key)
+        if rewritten is not None:
+            _rewrite_cache.move_to_end(key)
+        return rewritten
+
+    @staticmethod
+    def set_cached(query: str, chat_history: List[dict], rewritten: str, summary: Optional[str] = None):
+        key = (QueryRewriter.history_hash(chat_history, summary), query)
+        _rewrite_cache[key] = rewritten
+        _rewrite_cache.move_to_end(key)
+        while len(_rewrite_cache) > settings.REWRITE_CACHE_SIZE:
+            _rewrite_cache.popitem(last=False)
+
+    @staticmethod
+    def build_prompt(query: str, chat_history: List[dict], summary: Optional[str] = None) -> str:
+        rewrite_prompt = "请根据以下对话历史，将用户的最新问题改写为一个独立的、语义完整的搜索查询。不要回答问题，只需输出改写后的查询。如果无需改写，直接输出原问题。\n\n"
+        if summary:
+            rewrite_prompt += f"此前对话摘要：\n{truncate_to_tokens(summary, settings.SUMMARY_MAX_TOKENS)}\n\n"
+        rewrite_prompt += "对话历史：\n"
+        for msg in chat_history[-settings.REWRITE_HISTORY_MESSAGES :]:
+            role = "用户" if msg.get("role") == "user" else "助手"
+            # Long answers are cut so the prompt size stays bounded
+            content = truncate_to_tokens(msg.get("content", ""), settings.HISTORY_MESSAGE_MAX_TOKENS)
+            rewrite_prompt += f"{role}: {content}\n"
+
+        rewrite_prompt += f"用户最新问题: {query}\n\n独立查询:"
+        return rewrite_prompt
+
+    async def arewrite(self, query: str, chat_history: List[dict], summary: Optional[str] = None) -> str:
+        """Rewrite the query into a standalone search query (cached)."""
+        cached = self.get_cached(query, chat_history, summary)
+        if cached is not None:
+            logger.info(f"Query rewrite cache hit: '{query}' -> '{cached}'")
+            return cached
+
+        try:
+            rewrite_msg = [HumanMessage(content=self.build_prompt(query, chat_history, summary))]
+            if self.gateway is not None:
+                rewrite_response = await self.gateway.ainvoke(
+                    rewrite_msg, self.priority, llm=self.llm
+                )
+            else:
+                rewrite_response = await self.llm.ainvoke(rewrite_msg)
+            content = (
+                rewrite_response.content
+                if hasattr(rewrite_response, "content")
+                else str(rewrite_response)
+            )
+            rewritten = content.strip() or query
+        except Exception as e:
+            logger.warning(f"Query rewriting failed: {e}. Using original query.")
+            return query
+
+        self.set_cached(query, chat_history, rewritten, summary)
+        return rewritten
@@ -4,12 +4,43 @@ from langchain.chains import RetrievalQA
 from langchain_core.documents import Document
 from app.services.vector_store import VectorStoreService
 from app.services.rerank import RerankService
+from app.services.query_rewriter import QueryRewriter
+from app.services.context_assembler import ContextAssembler, count_tokens
+from app.services.context_compressor import ContextCompressor
+from app.services.llm_gateway import LLMGateway, LLMPriority
+from app.services.deadline import Deadline, MIN_STAGE_SECONDS
+from app.services.circuit_breaker import CircuitOpenError, get_breaker
+from app.services.source_refs import to_source_ref
 from app.core.config import settings
+from collections import OrderedDict
 import asyncio
+import re
+
+# Phrases indicating the LLM could not answer from the provided context
+REFUSAL_KEYWORDS = [
+    "无法回答",
+    "没有相关信息",
+    "并未包含",
+    "不包含",
+    "无法提供",
+    "抱歉",
+    "sorry",
+]
+
+# Global LRU cache of recent answers keyed by normalized search query.
+# Used to keep serving known questions while the LLM circuit is open.
+_answer_cache: "OrderedDict[str, dict]" = OrderedDict()
+
+LLM_UNAVAILABLE_MESSAGE = "大模型服务暂时不可用，请稍后重试。"
+
+WEB_SEARCH_SYSTEM_PROMPT = "你是一个智能助手。由于本地知识库缺乏相关信息，以下内容来自网络搜索结果。请根据这些搜索结果回答用户的问题。回答要条理清晰，使用 Markdown 格式，并适当引用来源。"
 
 
 class RAGEngine:
-    def __init__(self):
+    def __init__(self, priority: int = LLMPriority.INTERACTIVE):
+        # Scheduling priority of this engine's LLM calls in the shared gateway
+        self.priority = priority
+        self.llm_gateway = LLMGateway()
         self.vector_store_service = VectorStoreService()
         self.rerank_service = RerankService()
         # Initialize LLM
@@ -22,13 +53,156 @@ class RAGEngine:
                 ]
             )
         else:
-            self.llm = ChatOpenAI(
-                model_name=settings.LLM_MODEL_NAME,
-                temperature=0,
-                openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_API_BASE,
-                timeout=60,
+            # Shared, pooled client (one per process)
+            self.llm = self.llm_gateway.get_llm(ChatOpenAI)
+        self.query_rewriter = QueryRewriter(
+            self.llm, gateway=self.llm_gateway, priority=priority
+        )
+        self.context_assembler = ContextAssembler()
+        self.context_compressor = ContextCompressor(
+            vector_store=self.vector_store_service
+        )
+
+    @staticmethod
+    def _answer_cache_key(query: str) -> str:
+        return re.sub(r"\s+", " ", query).strip().lower()
+
+    @staticmethod
+    def _get_cached_answer(query: str):
+        key = RAGEngine._answer_cache_key(query)
+        cached = _answer_cache.get(key)
+        if cached is not None:
+            _answer_cache.move_to_end(key)
+        return cached
+
+    @staticmethod
+    def _cache_answer(query: str, answer: str, docs: list):
+        if not answer:
+            return
+        key = RAGEngine._answer_cache_key(query)
+        _answer_cache[key] = {"answer": answer, "docs": docs}
+        _answer_cache.move_to_end(key)
+        while len(_answer_cache) > settings.ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+    def _cached_answer_or_raise(self, query: str, deadline: Deadline) -> dict:
+        """Answer from the cache while the LLM circuit is open, or fail fast."""
+        cached = self._get_cached_answer(query)
+        if cached is None:
+            raise CircuitOpenError(LLM_UNAVAILABLE_MESSAGE)
+        return {
+            "result": cached["answer"],
+            "source_documents": cached["docs"],
+            "skipped_stages": deadline.skipped,
+            "served_from_cache": True,
+        }
+
+    async def _aretrieve(self, retriever, query: str, deadline: Deadline, k: int = 15) -> list:
+        """Retrieve within the deadline, falling back to BM25-only if the hybrid path fails."""
+        try:
+            return await asyncio.wait_for(
+                retriever.aget_relevant_documents(query),
+                timeout=max(deadline.remaining(), MIN_STAGE_SECONDS),
+            )
+        except asyncio.TimeoutError:
+            raise
+        except Exception as e:
+            bm25_retriever = self.vector_store_service.get_bm25_retriever(k)
+            if bm25_retriever is None or bm25_retriever is retriever:
+                raise
+            print(f"Hybrid retrieval failed ({e}). Falling back to BM25-only retrieval.")
+            return await bm25_retriever.aget_relevant_documents(query)
+
+    async def _arerank(self, query: str, docs: list, deadline: Deadline, top_k: int = 4) -> list:
+        """Rerank within the deadline's rerank budget, otherwise keep retrieval order."""
+        if not deadline.can_run(settings.RERANK_TIMEOUT_SECONDS):
+            deadline.skip("rerank")
+            return docs[:top_k]
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self.rerank_service.rerank, query, docs, top_k),
+                timeout=deadline.stage_timeout(settings.RERANK_TIMEOUT_SECONDS),
             )
+        except asyncio.TimeoutError:
+            deadline.skip("rerank")
+            return docs[:top_k]
+
+    async def _aweb_search(self, query: str, deadline: Deadline) -> list:
+        """Web search within the deadline's budget ([] when skipped)."""
+        if get_breaker("web_search").is_open or not deadline.can_run(
+            settings.WEB_SEARCH_TIMEOUT_SECONDS
+        ):
+            deadline.skip("web_search")
+            return []
+        from app.services.web_search import WebSearchService
+
+        try:
+            return await asyncio.wait_for(
+                WebSearchService.asearch(query),
+                timeout=deadline.stage_timeout(settings.WEB_SEARCH_TIMEOUT_SECONDS),
+            )
+        except asyncio.TimeoutError:
+            deadline.skip("web_search")
+            return []
+
+    @staticmethod
+    def _build_sources(docs: list) -> list:
+        """Compact source references for the final SSE event (full text via /documents/chunks)."""
+        return [to_source_ref(doc) for doc in docs]
+
+    def _generation_llm(self, deadline: Deadline):
+        """LLM with max_tokens capped when the deadline cannot fit a full answer."""
+        max_tokens = deadline.max_generation_tokens()
+        if max_tokens is None:
+            return self.llm
+        deadline.skip("full_length_generation")
+        return self.llm.bind(max_tokens=max_tokens)
+
+    @staticmethod
+    def _history_messages(history: list) -> list:
+        """Convert history dicts into chat messages."""
+        from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+
+        messages = []
+        for msg in history:
+            if msg.get("role") == "system":
+                messages.append(SystemMessage(content=msg.get("content")))
+            elif msg.get("role") == "user":
+                messages.append(HumanMessage(content=msg.get("content")))
+            elif msg.get("role") == "assistant":
+                messages.append(AIMessage(content=msg.get("content")))
+        return messages
+
+    @staticmethod
+    def _is_refusal(text: str) -> bool:
+        """Check whether the (partial) answer contains a refusal phrase."""
+        lowered = text.lower()
+        return any(k in lowered for k in REFUSAL_KEYWORDS)
+
+    @staticmethod
+    def _is_weak_retrieval(query: str, docs: list) -> bool:
+        """Estimate whether the retrieved docs are unlikely to answer the query."""
+        if not docs:
+            return True
+
+        # Prefer cross-encoder scores when the reranker is enabled
+        scores = [
+            doc.metadata["relevance_score"]
+            for doc in docs
+            if "relevance_score" in doc.metadata
+        ]
+        if scores:
+            return max(scores) < settings.WEAK_RERANK_SCORE
+
+        # Otherwise fall back to query term coverage of the retrieved text
+        from app.services.vector_store import chinese_tokenizer
+
+        terms = {t.strip().lower() for t in chinese_tokenizer(query) if len(t.strip()) > 1}
+        if not terms:
+            return False
+        text = " ".join(doc.page_content for doc in docs).lower()
+        coverage = sum(1 for t in terms if t in text) / len(terms)
+        return coverage < settings.WEAK_TERM_COVERAGE
 
     def get_answer(self, query: str) -> dict:
         """Get answer from RAG pipeline (Synchronous)."""
@@ -68,17 +242,49 @@ class RAGEngine:
         result = qa_chain.invoke({"query": query})
         return result
 
-    async def aget_answer(self, query: str) -> dict:
+    async def aget_answer(self, query: str, deadline: Deadline = None) -> dict:
         """Get answer from RAG pipeline (Asynchronous)."""
+        if deadline is None:
+            deadline = Deadline()
+
         if settings.USE_MOCK_RAG:
             # Simulate network delay
             await asyncio.sleep(1)
             return self.get_answer(query)
 
         # Rerank Logic
+        # While the LLM circuit is open, answer from cache or fail fast
+        if self.llm_gateway.breaker.is_open:
+            return self._cached_answer_or_raise(query, deadline)
+
         retriever = self.vector_store_service.get_retriever(search_type="hybrid", k=15)
-        docs = await retriever.aget_relevant_documents(query)
-        docs = self.rerank_service.rerank(query, docs, top_k=4)
+        docs = await self._aretrieve(retriever, query, deadline)
+        docs = await self._arerank(query, docs, deadline)
+        return await self._aanswer_from_docs(query, docs, deadline)
+
+    async def _agenerate(self, messages: list, deadline: Deadline) -> str:
+        """One non-streaming generation through the gateway, charged for the tokens it used."""
+        result = await self.llm_gateway.ainvoke(
+            messages, self.priority, llm=self._generation_llm(deadline)
+        )
+        return result.content if hasattr(result, "content") else str(result)
+
+    async def _agenerate_from_docs(
+        self, system_prompt: str, user_template: str, query: str, docs: list, deadline: Deadline
+    ) -> tuple:
+        """Generate from the docs that fit the prompt budget; returns the text and the assembled prompt."""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        assembled = self.context_assembler.assemble(system_prompt, user_template, query, docs)
+        messages = [
+            SystemMessage(content=system_prompt),
+            HumanMessage(content=user_template.format(context=assembled["context"], question=query)),
+        ]
+        return await self._agenerate(messages, deadline), assembled
+
+    async def _aanswer_from_docs(self, query: str, docs: list, deadline: Deadline) -> dict:
+        """Generate the answer from reranked docs, with web search and general-knowledge fallbacks."""
+        from langchain_core.messages import HumanMessage
 
         is_web_search = False
         if not docs:
@@ -86,9 +292,7 @@ class RAGEngine:
                 f"No documents found in vector store for '{query}'. Falling back to Web Search..."
             )
             try:
-                from app.services.web_search import WebSearchService
-
-                docs = await WebSearchService.asearch(query)
+                docs = await self._aweb_search(query, deadline)
                 if docs:
                     is_web_search = True
             except Exception as e:
@@ -99,59 +303,35 @@ class RAGEngine:
             print(
                 f"No documents found. Falling back to General Knowledge for '{query}'..."
             )
-            from langchain_core.prompts import PromptTemplate
-
-            disclaimer_prompt = """用户问题：{question}
+            disclaimer_prompt = f"""用户问题：{query}
 未检索到专属知识库内容，请基于通用知识回答，并在回答开头和结尾分别添加以下免责声明：
 开头：【免责声明：本回答基于通用知识，非专属知识库内容，仅供参考】
 结尾：【建议你查阅官方文档或联系相关人员获取准确信息】"""
 
-            PROMPT = PromptTemplate(
-                template=disclaimer_prompt, input_variables=["question"]
-            )
-
             # Use LLM directly
-            chain = PROMPT | self.llm
-            result_content = await chain.ainvoke({"question": query})
-
-            result_text = (
-                result_content.content
-                if hasattr(result_content, "content")
-                else str(result_content)
+            result_text = await self._agenerate(
+                [HumanMessage(content=disclaimer_prompt)], deadline
             )
 
-            return {"result": result_text, "source_documents": []}
-
-        from langchain.chains.question_answering import load_qa_chain
-        from langchain_core.prompts import PromptTemplate
-
-        template = """你是一个专业的知识库助手。请根据以下提供的参考文档内容回答用户的问题。如果文档中没有相关信息，请诚实地说明无法回答，不要编造信息。
-        
-参考文档：
-{context}
-
-用户问题：{question}
+            return {
+                "result": result_text,
+                "source_documents": [],
+                "skipped_stages": deadline.skipped,
+                "prompt_tokens": count_tokens(disclaimer_prompt),
+            }
 
-回答："""
+        system_prompt = "你是一个专业的知识库助手。请根据以下提供的参考文档内容回答用户的问题。如果文档中没有相关信息，请诚实地说明无法回答，不要编造信息。"
+        user_template = "参考文档：\n{context}\n\n用户问题：{question}\n\n回答："
+        web_template = "参考搜索结果：\n{context}\n\n用户问题：{question}\n\n回答："
 
         if is_web_search:
-            template = """你是一个智能助手。由于本地知识库缺乏相关信息，以下内容来自网络搜索结果。请根据这些搜索结果回答用户的问题。回答要条理清晰，使用 Markdown 格式，并适当引用来源。
+            system_prompt, user_template = WEB_SEARCH_SYSTEM_PROMPT, web_template
 
-参考搜索结果：
-{context}
-
-用户问题：{question}
-
-回答："""
-
-        PROMPT = PromptTemplate(
-            template=template, input_variables=["context", "question"]
+        # Pack the highest-scoring chunks into the token budget
+        result_text, assembled = await self._agenerate_from_docs(
+            system_prompt, user_template, query, docs, deadline
         )
-
-        chain = load_qa_chain(self.llm, chain_type="stuff", prompt=PROMPT)
-        result = await chain.ainvoke({"input_documents": docs, "question": query})
-
-        result_text = result["output_text"]
+        docs = assembled["docs"]
 
         # Post-Verification Fallback: If LLM says it can't answer, try Web Search
         refusal_keywords = [
@@ -168,48 +348,110 @@ class RAGEngine:
                 f"LLM indicated insufficient context ('{result_text[:50]}...'). Fallback to Web Search..."
             )
             try:
-                from app.services.web_search import WebSearchService
-
-                web_docs = await WebSearchService.asearch(query)
+                web_docs = await self._aweb_search(query, deadline)
 
                 if web_docs:
                     print(
                         f"Web search found {len(web_docs)} results. Re-generating answer..."
                     )
 
-                    # Update Prompt for Web Search
-                    web_template = """你是一个智能助手。由于本地知识库缺乏相关信息，以下内容来自网络搜索结果。请根据这些搜索结果回答用户的问题。回答要条理清晰，使用 Markdown 格式，并适当引用来源。
-
-参考搜索结果：
-{context}
-
-用户问题：{question}
-
-回答："""
-                    WEB_PROMPT = PromptTemplate(
-                        template=web_template, input_variables=["context", "question"]
-                    )
-
-                    chain = load_qa_chain(
-                        self.llm, chain_type="stuff", prompt=WEB_PROMPT
-                    )
-                    result = await chain.ainvoke(
-                        {"input_documents": web_docs, "question": query}
+                    web_text, web_assembled = await self._agenerate_from_docs(
+                        WEB_SEARCH_SYSTEM_PROMPT, web_template, query, web_docs, deadline
                     )
 
+                    self._cache_answer(query, web_text, web_assembled["docs"])
                     return {
-                        "result": result["output_text"],
-                        "source_documents": web_docs,
+                        "result": web_text,
+                        "source_documents": web_assembled["docs"],
+                        "skipped_stages": deadline.skipped,
+                        "prompt_tokens": web_assembled["prompt_tokens"],
                     }
             except Exception as e:
                 print(f"Web search fallback failed: {e}")
 
-        return {"result": result_text, "source_documents": docs}
+        if not is_refusal:
+            self._cache_answer(query, result_text, docs)
+        return {
+            "result": result_text,
+            "source_documents": docs,
+            "skipped_stages": deadline.skipped,
+            "prompt_tokens": assembled["prompt_tokens"],
+        }
+
+    async def abatch_answer(self, queries: list, concurrency: int = None):
+        """
+        Answer many questions, sharing retrieval work across the batch.
+        Embeds all questions in one call, scores BM25 in one pass and reranks in
+        batched calls; generations then run concurrently and each result is
+        yielded as soon as it finishes (in completion order, tagged with its index).
+        """
+        concurrency = concurrency or settings.BATCH_GENERATION_CONCURRENCY
 
-    async def astream_answer_generator(self, query: str, chat_history: list = None):
-        """Generator for streaming answer."""
+        if settings.USE_MOCK_RAG:
+            for index, query in enumerate(queries):
+                yield {"index": index, "query": query, **self.get_answer(query)}
+            return
+
+        batch_docs = await asyncio.to_thread(
+            self.vector_store_service.batch_hybrid_search, queries, 15
+        )
+        batch_docs = await asyncio.to_thread(
+            self.rerank_service.rerank_batch, queries, batch_docs, 4
+        )
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def answer(index: int, query: str, docs: list) -> dict:
+            async with semaphore:
+                # Each generation gets its own deadline once it starts
+                deadline = Deadline()
+                try:
+                    if self.llm_gateway.breaker.is_open:
+                        result = self._cached_answer_or_raise(query, deadline)
+                    else:
+                        result = await self._aanswer_from_docs(query, docs, deadline)
+                except Exception as e:
+                    print(f"Batch question {index} failed: {e}")
+                    return {"index": index, "query": query, "error": str(e)}
+                return {"index": index, "query": query, **result}
+
+        tasks = [
+            asyncio.create_task(answer(index, query, docs))
+            for index, (query, docs) in enumerate(zip(queries, batch_docs))
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer went away: stop the remaining generations
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _web_fallback_possible(deadline: Deadline, web_search_task=None) -> bool:
+        """Whether a web search could still replace a refusal (breaker closed, time for a search and a generation)."""
+        if web_search_task is not None and web_search_task.done():
+            # The prefetched search already finished: only its results count
+            return (
+                not web_search_task.cancelled()
+                and web_search_task.exception() is None
+                and bool(web_search_task.result())
+            )
+        return not get_breaker("web_search").is_open and deadline.can_run(
+            settings.WEB_SEARCH_TIMEOUT_SECONDS
+        )
+
+    async def astream_answer_generator(
+        self, query: str, chat_history: list = None, deadline: Deadline = None, summary: str = None
+    ):
+        """
+        Generator for streaming answer.
+        summary is the conversation's rolling summary of turns before chat_history.
+        """
         if chat_history is None:
             chat_history = []
+        if deadline is None:
+            deadline = Deadline()
 
         if settings.USE_MOCK_RAG:
             # Simulate streaming in Mock mode
@@ -218,65 +460,113 @@ class RAGEngine:
             sources = result["source_documents"]
 
             # Stream characters
-            for i in range(0, len(full_answer), 2):  # Stream 2 chars at a time
-                chunk = full_answer[i : i + 2]
+            step = settings.MOCK_STREAM_CHUNK_CHARS
+            for i in range(0, len(full_answer), step):
+                chunk = full_answer[i : i + step]
                 yield {"answer": chunk}
-                await asyncio.sleep(0.05)
+                await asyncio.sleep(settings.MOCK_STREAM_DELAY_SECONDS)
 
             # Send sources at the end
-            yield {"sources": [doc.page_content for doc in sources]}
+            yield {"sources": self._build_sources(sources)}
             return
 
         # Real RAG Streaming
         import time
-        from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+        from langchain_core.messages import SystemMessage, HumanMessage
 
         start_time = time.time()
         print(f"[{start_time}] Starting RAG pipeline for query: {query}")
+        # Extra information about the run, sent to the client with the sources
+        stream_metadata = {"skipped_stages": deadline.skipped}
 
         # 1. Query Rewriting (if history exists)
+        # Use higher k for reranking (e.g. 15)
+        initial_k = 15
+        retriever = self.vector_store_service.get_retriever(
+            search_type="hybrid", k=initial_k
+        )
+
         search_query = query
-        if chat_history:
+        docs = None
+        needs_rewrite = self.query_rewriter.needs_rewrite(query, chat_history)
+        if needs_rewrite and not deadline.can_run(settings.REWRITE_TIMEOUT_SECONDS):
+            deadline.skip("rewrite")
+            needs_rewrite = False
+
+        if needs_rewrite:
             yield {"status": "正在理解上下文..."}
             print(f"[{time.time()}] rewriting query based on history...")
-            rewrite_prompt = "请根据以下对话历史，将用户的最新问题改写为一个独立的、语义完整的搜索查询。不要回答问题，只需输出改写后的查询。如果无需改写，直接输出原问题。\n\n对话历史：\n"
-            for msg in chat_history[-6:]:  # Limit history context
-                role = "用户" if msg.get("role") == "user" else "助手"
-                content = msg.get("content", "")
-                rewrite_prompt += f"{role}: {content}\n"
 
-            rewrite_prompt += f"用户最新问题: {query}\n\n独立查询:"
+            # Speculatively retrieve with the original query while the rewrite is in flight
+            speculative_task = None
+            if settings.SPECULATIVE_RETRIEVAL and not self.query_rewriter.get_cached(
+                query, chat_history, summary
+            ):
+                speculative_task = asyncio.create_task(
+                    self._aretrieve(retriever, query, deadline, k=initial_k)
+                )
 
             try:
-                rewrite_msg = [HumanMessage(content=rewrite_prompt)]
-                rewrite_response = await self.llm.ainvoke(rewrite_msg)
-                search_query = rewrite_response.content.strip()
+                search_query = await asyncio.wait_for(
+                    self.query_rewriter.arewrite(query, chat_history, summary),
+                    timeout=deadline.stage_timeout(settings.REWRITE_TIMEOUT_SECONDS),
+                )
                 print(f"[{time.time()}] Query rewritten: '{query}' -> '{search_query}'")
-            except Exception as e:
-                print(f"Query rewriting failed: {e}. Using original query.")
+            except asyncio.TimeoutError:
+                # Out of rewrite budget: the original query (and speculative results) will do
+                deadline.skip("rewrite")
+
+            if speculative_task is not None:
+                if self.query_rewriter.is_equivalent(query, search_query):
+                    try:
+                        docs = await speculative_task
+                        print(
+                            f"[{time.time()}] Using speculative retrieval results for '{query}'."
+                        )
+                    except Exception as e:
+                        print(f"Speculative retrieval failed: {e}. Retrying.")
+                else:
+                    speculative_task.cancel()
+        elif chat_history:
+            print(f"[{time.time()}] Query is self-contained. Skipping rewrite.")
+
+        # While the LLM circuit is open, serve a cached answer or fail fast
+        if self.llm_gateway.breaker.is_open:
+            cached = self._get_cached_answer(search_query)
+            if cached is None:
+                yield {"error": LLM_UNAVAILABLE_MESSAGE}
+                return
+            print(f"[{time.time()}] LLM circuit open. Serving cached answer.")
+            stream_metadata["served_from_cache"] = True
+            yield {"answer": cached["answer"]}
+            yield {
+                "sources": self._build_sources(cached["docs"]),
+                "metadata": stream_metadata,
+            }
+            return
 
         # 2. Retrieval using search_query
-        # Use higher k for reranking (e.g. 15)
-        initial_k = 15
-        retriever = self.vector_store_service.get_retriever(
-            search_type="hybrid", k=initial_k
-        )
-
         try:
-            yield {"status": "正在检索相关文档..."}
-            print(f"[{time.time()}] Starting retrieval for '{search_query}'...")
-            docs = await retriever.aget_relevant_documents(search_query)
+            if docs is None:
+                yield {"status": "正在检索相关文档..."}
+                print(f"[{time.time()}] Starting retrieval for '{search_query}'...")
+                docs = await self._aretrieve(retriever, search_query, deadline, k=initial_k)
             print(
                 f"[{time.time()}] Retrieval complete. Found {len(docs)} docs. Time taken: {time.time() - start_time:.2f}s"
             )
 
             # RERANK STEP
             if docs:
-                yield {"status": "正在筛选最佳结果..."}
+                if deadline.can_run(settings.RERANK_TIMEOUT_SECONDS):
+                    yield {"status": "正在筛选最佳结果..."}
                 print(f"[{time.time()}] Reranking {len(docs)} documents...")
-                docs = self.rerank_service.rerank(search_query, docs, top_k=4)
+                docs = await self._arerank(search_query, docs, deadline)
                 print(f"[{time.time()}] Reranking complete. Kept {len(docs)} docs.")
 
+        except asyncio.TimeoutError:
+            print(f"[{time.time()}] Retrieval exceeded the request deadline.")
+            yield {"error": "Retrieval timed out"}
+            return
         except Exception as e:
             print(f"[{time.time()}] Retrieval failed: {e}")
             yield {"error": f"Retrieval failed: {str(e)}"}
@@ -289,10 +579,8 @@ class RAGEngine:
                 f"[{time.time()}] No documents found in vector store. Falling back to Web Search..."
             )
             try:
-                from app.services.web_search import WebSearchService
-
                 yield {"status": "正在联网搜索最新信息..."}
-                docs = await WebSearchService.asearch(search_query)
+                docs = await self._aweb_search(search_query, deadline)
                 if docs:
                     is_web_search = True
                     print(f"[{time.time()}] Web search found {len(docs)} results.")
@@ -311,43 +599,70 @@ class RAGEngine:
 结尾：【建议你查阅官方文档或联系相关人员获取准确信息】"""
 
             # Use history for General Knowledge fallback too
-            messages = []
-            if chat_history:
-                # Add condensed history for context
-                for msg in chat_history[-4:]:
-                    if msg.get("role") == "user":
-                        messages.append(HumanMessage(content=msg.get("content")))
-                    elif msg.get("role") == "assistant":
-                        messages.append(AIMessage(content=msg.get("content")))
+            history, history_tokens = self.context_assembler.pack_history(
+                chat_history, settings.HISTORY_TOKEN_BUDGET, summary
+            )
+            messages = self._history_messages(history)
 
             messages.append(HumanMessage(content=disclaimer_prompt))
+            stream_metadata["prompt_tokens"] = history_tokens + count_tokens(
+                disclaimer_prompt
+            )
 
-            async for chunk in self.llm.astream(messages):
+            async for chunk in self.llm_gateway.astream(
+                messages, self.priority, llm=self._generation_llm(deadline)
+            ):
                 if chunk.content:
                     yield {"answer": chunk.content}
+                if deadline.expired():
+                    deadline.skip("generation_truncated")
+                    break
 
-            yield {"sources": []}
+            yield {"sources": [], "metadata": stream_metadata}
             return
 
-        context = "\n\n".join([doc.page_content for doc in docs])
+        # Prefetch web search in parallel when local retrieval looks weak,
+        # so a refusal can switch to the web answer without waiting for the search
+        web_search_task = None
+        if (
+            not is_web_search
+            and settings.WEB_SEARCH_PREFETCH
+            and not get_breaker("web_search").is_open
+            and deadline.can_run(settings.WEB_SEARCH_TIMEOUT_SECONDS)
+            and self._is_weak_retrieval(search_query, docs)
+        ):
+            from app.services.web_search import WebSearchService
+
+            print(f"[{time.time()}] Weak retrieval scores. Prefetching web search...")
+            web_search_task = asyncio.create_task(
+                WebSearchService.asearch(search_query)
+            )
+
+        # Optional extractive compression: keep only query-relevant sentences
+        if not is_web_search and self.context_compressor.mode != "off":
+            docs = await asyncio.to_thread(
+                self.context_compressor.compress, search_query, docs
+            )
+            stream_metadata["compression"] = self.context_compressor.mode
 
         # Manually construct prompt to control streaming
 
         system_prompt = "你是一个专业的知识库助手。请根据以下提供的参考文档内容回答用户的问题。如果文档中没有相关信息，请诚实地说明无法回答，不要编造信息。回答要条理清晰，使用 Markdown 格式。"
         if is_web_search:
-            system_prompt = "你是一个智能助手。由于本地知识库缺乏相关信息，以下内容来自网络搜索结果。请根据这些搜索结果回答用户的问题。回答要条理清晰，使用 Markdown 格式，并适当引用来源。"
+            system_prompt = WEB_SEARCH_SYSTEM_PROMPT
 
-        user_prompt = f"参考文档：\n{context}\n\n用户问题：{query}"
+        # Pack the highest-scoring chunks and recent history into the token budget
+        assembled = self.context_assembler.assemble(
+            system_prompt, "参考文档：\n{context}\n\n用户问题：{question}", query, docs, chat_history, summary
+        )
+        docs = assembled["docs"]
+        stream_metadata["prompt_tokens"] = assembled["prompt_tokens"]
+        user_prompt = f"参考文档：\n{assembled['context']}\n\n用户问题：{query}"
 
         messages = [SystemMessage(content=system_prompt)]
 
         # Add history to final generation prompt
-        if chat_history:
-            for msg in chat_history[-4:]:  # Keep last 2 turns
-                if msg.get("role") == "user":
-                    messages.append(HumanMessage(content=msg.get("content")))
-                elif msg.get("role") == "assistant":
-                    messages.append(AIMessage(content=msg.get("content")))
+        messages.extend(self._history_messages(assembled["history"]))
 
         messages.append(HumanMessage(content=user_prompt))
 
@@ -357,8 +672,14 @@ class RAGEngine:
         llm_start_time = time.time()
         first_token_received = False
         full_response = ""
+        is_refusal = False
+        # Local generation stopped early on a refusal (and its slot released)
+        paused = False
 
-        async for chunk in self.llm.astream(messages):
+        llm_stream = self.llm_gateway.astream(
+            messages, self.priority, llm=self._generation_llm(deadline)
+        )
+        async for chunk in llm_stream:
             if not first_token_received:
                 first_token_received = True
                 print(
@@ -369,78 +690,140 @@ class RAGEngine:
                 full_response += chunk.content
                 yield {"answer": chunk.content}
 
-        print(
-            f"[{time.time()}] LLM generation complete. Total time: {time.time() - start_time:.2f}s"
-        )
-
-        # Secondary Fallback: Check for Refusal in Streaming Response
-        refusal_keywords = [
-            "无法回答",
-            "没有相关信息",
-            "并未包含",
-            "不包含",
-            "无法提供",
-            "抱歉",
-            "sorry",
-        ]
-        is_refusal = any(k in full_response for k in refusal_keywords)
+                # Early refusal detection on the opening tokens
+                if (
+                    not is_web_search
+                    and not is_refusal
+                    and len(full_response) - len(chunk.content)
+                    < settings.REFUSAL_DETECTION_CHARS
+                    and self._is_refusal(full_response[: settings.REFUSAL_DETECTION_CHARS])
+                ):
+                    is_refusal = True
+                    if self._web_fallback_possible(deadline, web_search_task):
+                        paused = True
+                        print(
+                            f"[{time.time()}] Refusal detected after {len(full_response)} chars. Pausing local generation."
+                        )
+                        break
+                    # No search can replace it: finish this answer rather than generate it twice
+                    print(
+                        f"[{time.time()}] Refusal detected after {len(full_response)} chars. No web fallback possible; continuing."
+                    )
 
-        if is_refusal and not is_web_search:
+            if deadline.expired():
+                deadline.skip("generation_truncated")
+                break
+
+        if paused:
+            # Give the generation slot back while waiting for the web search;
+            # only if the search finds nothing is the local answer generated again
+            await llm_stream.aclose()
+        elif not is_refusal and not is_web_search:
+            # Secondary check for refusals that appear later in the answer
+            is_refusal = self._is_refusal(full_response)
+
+        web_docs = []
+        if (
+            is_refusal
+            and not is_web_search
+            and (
+                get_breaker("web_search").is_open
+                or not deadline.can_run(settings.WEB_SEARCH_TIMEOUT_SECONDS)
+            )
+        ):
+            # Search is down, or not enough time left for a search plus a second generation
+            deadline.skip("web_search")
+        elif is_refusal and not is_web_search:
             print(
                 f"[{time.time()}] LLM indicated refusal in stream. Triggering Web Search Fallback..."
             )
+            yield {"status": "正在联网搜索最新信息..."}
             try:
-                from app.services.web_search import WebSearchService
-
-                web_docs = await WebSearchService.asearch(query)
+                if web_search_task is None:
+                    from app.services.web_search import WebSearchService
 
-                if web_docs:
-                    print(
-                        f"[{time.time()}] Web search found {len(web_docs)} results. Re-generating answer..."
+                    web_search_task = asyncio.create_task(
+                        WebSearchService.asearch(search_query)
                     )
-                    docs = web_docs  # Update docs for sources
+                # shield() keeps the task alive on timeout; it is cancelled below
+                web_docs = await asyncio.wait_for(
+                    asyncio.shield(web_search_task),
+                    timeout=deadline.stage_timeout(settings.WEB_SEARCH_TIMEOUT_SECONDS),
+                )
+            except asyncio.TimeoutError:
+                deadline.skip("web_search")
+            except Exception as e:
+                print(f"Web search fallback failed during streaming: {e}")
 
-                    web_template = "你是一个智能助手。由于本地知识库缺乏相关信息，以下内容来自网络搜索结果。请根据这些搜索结果回答用户的问题。回答要条理清晰，使用 Markdown 格式，并适当引用来源。"
-                    web_context = "\n\n".join([doc.page_content for doc in web_docs])
-                    web_user_prompt = (
-                        f"参考搜索结果：\n{web_context}\n\n用户问题：{query}"
-                    )
+        if web_docs:
+            await llm_stream.aclose()
+            print(
+                f"[{time.time()}] Web search found {len(web_docs)} results. Replacing answer..."
+            )
 
-                    web_messages = [
-                        SystemMessage(content=web_template),
-                        HumanMessage(content=web_user_prompt),
-                    ]
+            # Tell the client to discard the partial local answer
+            yield {"replace": True, "reason": "web_search"}
+            full_response = ""
 
-                    async for chunk in self.llm.astream(web_messages):
-                        if chunk.content:
-                            yield {"answer": chunk.content}
+            assembled = self.context_assembler.assemble(
+                WEB_SEARCH_SYSTEM_PROMPT, "参考搜索结果：\n{context}\n\n用户问题：{question}", query, web_docs
+            )
+            docs = assembled["docs"]
+            stream_metadata["prompt_tokens"] = assembled["prompt_tokens"]
+            web_user_prompt = f"参考搜索结果：\n{assembled['context']}\n\n用户问题：{query}"
+
+            web_messages = [
+                SystemMessage(content=WEB_SEARCH_SYSTEM_PROMPT),
+                HumanMessage(content=web_user_prompt),
+            ]
+
+            async for chunk in self.llm_gateway.astream(
+                web_messages, self.priority, llm=self._generation_llm(deadline)
+            ):
+                if chunk.content:
+                    full_response += chunk.content
+                    yield {"answer": chunk.content}
+                if deadline.expired():
+                    deadline.skip("generation_truncated")
+                    break
+        elif deadline.expired():
+            await llm_stream.aclose()
+        elif paused:
+            # No web results: regenerate the local answer, holding back the text
+            # already sent while the new answer repeats it
+            sent, full_response = full_response, ""
+            sent_chars = len(sent)
+            async for chunk in self.llm_gateway.astream(
+                messages, self.priority, llm=self._generation_llm(deadline)
+            ):
+                if chunk.content:
+                    full_response += chunk.content
+                    if sent_chars and not (
+                        sent.startswith(full_response) or full_response.startswith(sent)
+                    ):
+                        # The new answer departs from what the client has: restart it
+                        yield {"replace": True, "reason": "regenerated"}
+                        sent, sent_chars = "", 0
+                    if len(full_response) > sent_chars:
+                        yield {"answer": full_response[sent_chars:]}
+                        sent_chars = len(full_response)
+                if deadline.expired():
+                    deadline.skip("generation_truncated")
+                    break
+
+        if web_search_task is not None:
+            web_search_task.cancel()
 
-            except Exception as e:
-                print(f"Web search fallback failed during streaming: {e}")
+        print(
+            f"[{time.time()}] LLM generation complete. Total time: {time.time() - start_time:.2f}s"
+        )
+
+        # Cache complete, non-refusal answers for serving while the LLM circuit is open
+        if (web_docs or not is_refusal) and "generation_truncated" not in deadline.skipped:
+            self._cache_answer(search_query, full_response, docs)
 
         # Send sources at the end
-        sources_list = []
-        for doc in docs:
-            if doc.metadata.get("type") == "web_search":
-                # For Web Search, provide Title and URL
-                sources_list.append(
-                    {
-                        "type": "web",
-                        "title": doc.metadata.get("title", "无标题"),
-                        "url": doc.metadata.get("source", "无链接"),
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                    }
-                )
-            else:
-                # For local documents, provide content snippet and metadata
-                sources_list.append(
-                    {
-                        "type": "file",
-                        "content": doc.page_content,
-                        "metadata": doc.metadata,
-                        "title": doc.metadata.get("filename", "未知文档"),
-                    }
-                )
+        sources_list = self._build_sources(docs)
 
-        yield {"sources": sources_list}
+        # The final event carries run metadata (prompt size, skipped stages)
+        yield {"sources": sources_list, "metadata": stream_metadata}
@@ -0,0 +1,234 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core import database
+from app.core.config import settings
+from app.models.document import DocumentModel
+from app.services import corpus_version, vector_store
+from app.services.document_service import DocumentService
+from app.services.vector_store import VectorStoreService, active_collection_name, corpus_write_lock, set_active_collection
+import logging
+import multiprocessing
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = 100
+
+# State of the background re-chunk job started from the API (one at a time per process)
+_job_lock = threading.Lock()
+_job: dict = {"state": "idle"}
+
+
+def split_document(document_id: int, filename: str, chunk_size: int, chunk_overlap: int) -> Tuple[int, int, int, List[Document]]:
+    """Worker: re-split one document from its cached text. Returns (id, pages, tokens, chunks)."""
+    service = DocumentService(chunk_size, chunk_overlap)
+    pages = service.load_cached(DocumentService.upload_path(document_id, filename))
+    chunks = service.split(pages)
+    for chunk in chunks:
+        chunk.metadata["file_id"] = str(document_id)
+        chunk.metadata["filename"] = filename
+    return document_id, len(pages), service.count_chunk_tokens(chunks), chunks
+
+
+def _split_all(documents: List[Tuple[int, str]], chunk_size: int, chunk_overlap: int, workers: int, errors: dict) -> Dict[int, tuple]:
+    results = {}
+    if workers <= 1 or len(documents) <= 1:
+        for document_id, filename in documents:
+            try:
+                _, pages, tokens, chunks = split_document(document_id, filename, chunk_size, chunk_overlap)
+                results[document_id] = (pages, tokens, chunks)
+            except Exception as e:
+                errors[document_id] = str(e)
+        return results
+
+    # Splitting is pure Python; spawn (not fork) since the server process runs threads
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            pool.submit(split_document, document_id, filename, chunk_size, chunk_overlap): document_id
+            for document_id, filename in documents
+        }
+        for future in as_completed(futures):
+            try:
+                _, pages, tokens, chunks = future.result()
+                results[futures[future]] = (pages, tokens, chunks)
+            except Exception as e:
+                errors[futures[future]] = str(e)
+    return results
+
+
+def _get_all(collection) -> dict:
+    data = collection.get(include=["documents", "metadatas", "embeddings"])
+    embeddings = data["embeddings"] if data["embeddings"] is not None else []
+    data["embeddings"] = [e.tolist() if hasattr(e, "tolist") else list(e) for e in embeddings]
+    return data
+
+
+def _add_to_collection(collection, ids: List[str], texts: List[str], metadatas: List[dict], embeddings: list, batch_size: int):
+    for i in range(0, len(ids), batch_size):
+        collection.add(
+            ids=ids[i:i + batch_size],
+            documents=texts[i:i + batch_size],
+            metadatas=metadatas[i:i + batch_size],
+            embeddings=embeddings[i:i + batch_size],
+        )
+
+
+def rechunk_documents(
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[str], None]] = None,
+) -> dict:
+    """
+    Re-split every processed document from its extracted-text cache into a new
+    Chroma collection and swap it in. Chunks whose text is unchanged keep
+    their embedding and chunk ID; only new texts are embedded. Documents added
+    or deleted while the job runs are reconciled right before the swap, under
+    the exclusive corpus lock.
+    """
+    chunk_size = chunk_size or settings.CHUNK_SIZE
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    workers = workers or settings.RECHUNK_WORKERS
+    progress = progress or logger.info
+    start = time.perf_counter()
+
+    with database.SessionLocal() as db:
+        documents = [
+            (d.id, d.filename)
+            for d in db.query(DocumentModel).filter(DocumentModel.status == "processed").order_by(DocumentModel.id)
+        ]
+
+    # 1. Re-split from the cached text, in parallel
+    errors: Dict[int, str] = {}
+    results = _split_all(documents, chunk_size, chunk_overlap, workers, errors)
+    progress(f"Split {len(results)} documents ({len(errors)} failed) in {time.perf_counter() - start:.1f}s")
+
+    # 2. Reuse embeddings (by text) and chunk IDs (by file and text) of the current collection
+    old_service = VectorStoreService()
+    old_name = old_service.collection_name
+    old = _get_all(old_service.vector_db._collection)
+    embedding_by_text = {}
+    embedding_by_id = {}
+    ids_by_file_text: Dict[tuple, List[str]] = {}
+    for chunk_id, text, meta, embedding in zip(old["ids"], old["documents"], old["metadatas"], old["embeddings"]):
+        embedding_by_text.setdefault(text, embedding)
+        embedding_by_id[chunk_id] = embedding
+        ids_by_file_text.setdefault(((meta or {}).get("file_id"), text), []).append(chunk_id)
+
+    ids, texts, metadatas, embeddings = [], [], [], []
+    for document_id in sorted(results):
+        for chunk in results[document_id][2]:
+            reusable_ids = ids_by_file_text.get((str(document_id), chunk.page_content))
+            if reusable_ids:
+                chunk_id = reusable_ids.pop(0)
+                embedding = embedding_by_id[chunk_id]
+            else:
+                chunk_id = str(uuid.uuid4())
+                embedding = embedding_by_text.get(chunk.page_content)
+            ids.append(chunk_id)
+            texts.append(chunk.page_content)
+            metadatas.append({**chunk.metadata, "chunk_id": chunk_id})
+            embeddings.append(embedding)
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    for b in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch = missing[b:b + EMBED_BATCH_SIZE]
+        for i, embedding in zip(batch, old_service.embeddings.embed_documents([texts[i] for i in batch])):
+            embeddings[i] = embedding
+    progress(f"{len(ids)} chunks: {len(ids) - len(missing)} embeddings reused, {len(missing)} embedded")
+
+    # 3. Build the new collection next to the live one
+    new_name = f"{vector_store.DEFAULT_COLLECTION_NAME}_{datetime.utcnow():%Y%m%d%H%M%S}_{uuid.uuid4().hex[:6]}"
+    new_service = VectorStoreService(collection_name=new_name)
+    client = new_service.vector_db._client
+    batch_size = client.get_max_batch_size()
+    _add_to_collection(new_service.vector_db._collection, ids, texts, metadatas, embeddings, batch_size)
+
+    # 4. Reconcile uploads and deletes that happened meanwhile, then swap.
+    # Uploads and deletes wait meanwhile: none can land in the old collection
+    # after it was read, or in the new one before it is live
+    with corpus_write_lock(exclusive=True):
+        with database.SessionLocal() as db:
+            live_ids = {str(row.id) for row in db.query(DocumentModel.id)}
+        rebuilt_ids = {str(document_id) for document_id in results}
+        current = _get_all(old_service.vector_db._collection)
+        carried = [
+            i for i, meta in enumerate(current["metadatas"])
+            if (meta or {}).get("file_id") not in rebuilt_ids and (meta or {}).get("file_id") in live_ids
+        ]
+        if carried:
+            _add_to_collection(
+                new_service.vector_db._collection,
+                [current["ids"][i] for i in carried],
+                [current["documents"][i] for i in carried],
+                [current["metadatas"][i] for i in carried],
+                [current["embeddings"][i] for i in carried],
+                batch_size,
+            )
+        deleted = sorted(rebuilt_ids - live_ids)
+        if deleted:
+            new_service.vector_db._collection.delete(where={"file_id": {"$in": deleted}})
+
+        set_active_collection(new_name)
+        corpus_version.invalidate_caches()
+        if old_name != new_name:
+            try:
+                client.delete_collection(old_name)
+            except Exception as e:
+                logger.warning(f"Could not drop old collection {old_name}: {e}")
+
+    # 5. Record the new statistics on the document rows
+    with database.SessionLocal() as db:
+        for document_id, (pages, tokens, chunks) in results.items():
+            if str(document_id) in live_ids:
+                db.query(DocumentModel).filter(DocumentModel.id == document_id).update({
+                    DocumentModel.chunk_count: len(chunks),
+                    DocumentModel.token_count: tokens,
+                    DocumentModel.page_count: pages,
+                }, synchronize_session=False)
+        corpus_version.bump_version(db)
+
+    report = {
+        "collection": new_name,
+        "chunk_size": chunk_size,
+        "chunk_overlap": chunk_overlap,
+        "documents": len(results),
+        "chunks": len(ids),
+        "reused_embeddings": len(ids) - len(missing),
+        "embedded": len(missing),
+        "carried_over_chunks": len(carried),
+        "errors": {str(k): v for k, v in errors.items()},
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    progress(f"Swapped in collection {new_name} in {report['seconds']}s")
+    return report
+
+
+def job_status() -> dict:
+    return dict(_job, active_collection=active_collection_name())
+
+
+def start_job(chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> bool:
+    """Run rechunk_documents in a background thread; False if a job is already running."""
+    with _job_lock:
+        if _job.get("state") == "running":
+            return False
+        _job.clear()
+        _job.update(state="running", started_at=datetime.utcnow().isoformat(), chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def run():
+        try:
+            report = rechunk_documents(chunk_size, chunk_overlap)
+            _job.update(state="done", report=report)
+        except Exception as e:
+            logger.error(f"Re-chunk job failed: {e}", exc_info=True)
+            _job.update(state="failed", error=str(e))
+        finally:
+            _job["finished_at"] = datetime.utcnow().isoformat()
+
+    threading.Thread(target=run, name="rechunk", daemon=True).start()
+    return True
@@ -1,5 +1,6 @@
 from typing import List
 from langchain_core.documents import Document
+from app.core.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
@@ -66,9 +67,12 @@ class RerankService:
             # Select top_k
             reranked_docs = []
             for doc, score in doc_score_pairs[:top_k]:
-                # Add score to metadata for debugging/UI
-                doc.metadata["relevance_score"] = float(score)
-                reranked_docs.append(doc)
+                # Add score to metadata for debugging/UI. Annotate a copy: retrieved
+                # documents may be shared with caches and concurrent requests
+                reranked_docs.append(Document(
+                    page_content=doc.page_content,
+                    metadata={**doc.metadata, "relevance_score": float(score)},
+                ))
             
             logger.info(f"Reranking complete. Top score: {doc_score_pairs[0][1] if doc_score_pairs else 0}")
             return reranked_docs
@@ -76,3 +80,43 @@ class RerankService:
         except Exception as e:
             logger.error(f"Reranking failed: {e}")
             return documents[:top_k]
+
+    def rerank_batch(
+        self, queries: List[str], documents_list: List[List[Document]], top_k: int = 4
+    ) -> List[List[Document]]:
+        """Rerank the documents of many queries with batched Cross-Encoder calls."""
+        self._load_model()
+
+        if not self.model:
+            return [documents[:top_k] for documents in documents_list]
+
+        try:
+            # Score every (query, doc) pair of the batch in one predict pass
+            pairs = [
+                [query, doc.page_content[:2000]]
+                for query, documents in zip(queries, documents_list)
+                for doc in documents
+            ]
+            scores = self.model.predict(pairs, batch_size=settings.RERANK_BATCH_SIZE) if pairs else []
+
+            results = []
+            offset = 0
+            for documents in documents_list:
+                doc_score_pairs = list(zip(documents, scores[offset : offset + len(documents)]))
+                offset += len(documents)
+                doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
+
+                reranked_docs = []
+                for doc, score in doc_score_pairs[:top_k]:
+                    reranked_docs.append(Document(
+                        page_content=doc.page_content,
+                        metadata={**doc.metadata, "relevance_score": float(score)},
+                    ))
+                results.append(reranked_docs)
+
+            logger.info(f"Batch reranking complete: {len(pairs)} pairs for {len(queries)} queries.")
+            return results
+
+        except Exception as e:
+            logger.error(f"Batch reranking failed: {e}")
+            return [documents[:top_k] for documents in documents_list]
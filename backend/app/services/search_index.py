@@ -0,0 +1,235 @@
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.core.config import settings
+import jieba
+import re
+import weakref
+
+# FTS5 indexes over message contents and conversation titles. Text is
+# pre-segmented with jieba so the unicode61 tokenizer sees Chinese words
+# separated by spaces. Segmentation happens in Python on the ORM write path
+# (see the listeners in app/models/conversation.py), so the schema uses no
+# custom SQL functions and the database stays usable from plain sqlite; the
+# delete triggers are plain SQL. Rowids are messages.id and conversations.rowid.
+# Messages of archived conversations leave the messages table; their index rows
+# move to archived_messages_fts (with the original text for snippets), so they
+# stay searchable until the conversation is restored or deleted.
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(content, tokenize='unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS conversations_fts USING fts5(title, tokenize='unicode61')",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS archived_messages_fts USING fts5(
+        content, message_id UNINDEXED, conversation_id UNINDEXED, role UNINDEXED,
+        created_at UNINDEXED, original UNINDEXED, tokenize='unicode61'
+    )""",
+    # Earlier versions segmented in insert/update triggers through a jieba_segment() UDF
+    "DROP TRIGGER IF EXISTS messages_fts_ai",
+    "DROP TRIGGER IF EXISTS messages_fts_au",
+    "DROP TRIGGER IF EXISTS conversations_fts_ai",
+    "DROP TRIGGER IF EXISTS conversations_fts_au",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_ad AFTER DELETE ON messages BEGIN
+        DELETE FROM messages_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS conversations_fts_ad AFTER DELETE ON conversations BEGIN
+        DELETE FROM conversations_fts WHERE rowid = old.rowid;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS archived_messages_fts_ad AFTER DELETE ON conversations BEGIN
+        DELETE FROM archived_messages_fts WHERE conversation_id = old.id;
+    END""",
+]
+
+# Engine -> whether its database has the FTS tables; checked once per engine
+_index_exists = weakref.WeakKeyDictionary()
+
+# Characters that only separate words; dropped from queries
+_PUNCTUATION = re.compile(r"^[\W_]+$")
+
+
+def segment(value: Optional[str]) -> str:
+    """Space-separated jieba search segmentation (fine and coarse words) for indexing."""
+    if not value:
+        return ""
+    return " ".join(token for token in jieba.cut_for_search(value) if token.strip())
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of a search query, without punctuation and duplicates."""
+    terms = [t.strip() for t in jieba.lcut(query or "")]
+    return list(dict.fromkeys(t for t in terms if t and not _PUNCTUATION.match(t)))
+
+
+def match_expression(terms: List[str]) -> str:
+    # Every term must appear; each is quoted so FTS5 operators in user input are literal
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def make_snippet(content: str, terms: List[str], max_chars: Optional[int] = None) -> str:
+    """Window of the original text around the first matching term."""
+    max_chars = max_chars or settings.SEARCH_SNIPPET_CHARS
+    content = re.sub(r"\s+", " ", content or "").strip()
+    lowered = content.lower()
+    positions = [p for p in (lowered.find(t.lower()) for t in terms) if p >= 0]
+    start = max(0, min(positions) - max_chars // 4) if positions else 0
+    end = min(len(content), start + max_chars)
+    start = max(0, end - max_chars)
+    return ("..." if start > 0 else "") + content[start:end] + ("..." if end < len(content) else "")
+
+
+def create_search_index(bind) -> bool:
+    """Create the FTS tables and triggers; backfill when they are new. Returns True if built."""
+    with bind.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        ).first()
+        for statement in FTS_SCHEMA:
+            conn.execute(text(statement))
+        if not exists:
+            _rebuild(conn)
+    _index_exists[bind] = True
+    return not exists
+
+
+def rebuild_search_index(bind):
+    """Re-segment and re-index every message and conversation title."""
+    with bind.begin() as conn:
+        _rebuild(conn)
+
+
+def _rebuild(conn):
+    # archived_messages_fts is left alone: those messages only exist in the archive files
+    conn.execute(text("DELETE FROM messages_fts"))
+    conn.execute(text("DELETE FROM conversations_fts"))
+    messages = conn.execute(text("SELECT id, content FROM messages")).all()
+    if messages:
+        conn.execute(
+            text("INSERT INTO messages_fts(rowid, content) VALUES (:id, :content)"),
+            [{"id": row.id, "content": segment(row.content)} for row in messages],
+        )
+    conversations = conn.execute(text("SELECT rowid, title FROM conversations")).all()
+    if conversations:
+        conn.execute(
+            text("INSERT INTO conversations_fts(rowid, title) VALUES (:rowid, :title)"),
+            [{"rowid": row.rowid, "title": segment(row.title)} for row in conversations],
+        )
+
+
+def _has_index(conn) -> bool:
+    engine = conn.engine
+    if engine not in _index_exists:
+        _index_exists[engine] = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        ).first() is not None
+    return _index_exists[engine]
+
+
+def index_message(conn, message_id: int, content: Optional[str], new: bool = True):
+    """Add (or re-index) one message inside the caller's transaction."""
+    if not _has_index(conn):
+        return
+    if not new:
+        conn.execute(text("DELETE FROM messages_fts WHERE rowid = :id"), {"id": message_id})
+    conn.execute(
+        text("INSERT INTO messages_fts(rowid, content) VALUES (:id, :content)"),
+        {"id": message_id, "content": segment(content)},
+    )
+
+
+def index_conversation(conn, conversation_id: str, title: Optional[str], new: bool = True):
+    """Add (or re-index) one conversation title inside the caller's transaction."""
+    if not _has_index(conn):
+        return
+    params = {"id": conversation_id, "title": segment(title)}
+    if not new:
+        conn.execute(text(
+            "DELETE FROM conversations_fts WHERE rowid = (SELECT rowid FROM conversations WHERE id = :id)"
+        ), params)
+    conn.execute(text(
+        "INSERT INTO conversations_fts(rowid, title) SELECT rowid, :title FROM conversations WHERE id = :id"
+    ), params)
+
+
+def archive_message_index(conn, conversation_id: str):
+    """Move a conversation's message index rows aside; call before its messages are deleted."""
+    if not _has_index(conn):
+        return
+    conn.execute(text(
+        """
+        INSERT INTO archived_messages_fts(content, message_id, conversation_id, role, created_at, original)
+        SELECT messages_fts.content, m.id, m.conversation_id, m.role, m.created_at, m.content
+        FROM messages m
+        JOIN messages_fts ON messages_fts.rowid = m.id
+        WHERE m.conversation_id = :id
+        """
+    ), {"id": conversation_id})
+
+
+def restore_message_index(conn, conversation_id: str):
+    """Drop a restored conversation's archived index rows (its messages are indexed again on insert)."""
+    if not _has_index(conn):
+        return
+    conn.execute(text("DELETE FROM archived_messages_fts WHERE conversation_id = :id"), {"id": conversation_id})
+
+
+def search(db: Session, query: str, limit: int, offset: int = 0) -> dict:
+    """
+    Ranked (bm25) message hits with snippets, plus conversations whose title
+    matches. Only index lookups and primary-key joins: the messages table is
+    never scanned. Hits in archived conversations are included and flagged;
+    opening the conversation restores it.
+    """
+    terms = query_terms(query)
+    result = {"query": query, "terms": terms, "conversations": [], "messages": [], "has_more": False}
+    if not terms:
+        return result
+    match = match_expression(terms)
+
+    rows = db.execute(text(
+        """
+        SELECT m.id, m.conversation_id, m.role, m.content, m.created_at, c.title,
+               messages_fts.rank AS score, 0 AS archived
+        FROM messages_fts
+        JOIN messages m ON m.id = messages_fts.rowid
+        JOIN conversations c ON c.id = m.conversation_id
+        WHERE messages_fts MATCH :match
+        UNION ALL
+        SELECT archived_messages_fts.message_id, archived_messages_fts.conversation_id,
+               archived_messages_fts.role, archived_messages_fts.original,
+               archived_messages_fts.created_at, c.title, archived_messages_fts.rank, 1
+        FROM archived_messages_fts
+        JOIN conversations c ON c.id = archived_messages_fts.conversation_id
+        WHERE archived_messages_fts MATCH :match
+        ORDER BY score
+        LIMIT :limit OFFSET :offset
+        """
+    ), {"match": match, "limit": limit + 1, "offset": offset}).all()
+    result["has_more"] = len(rows) > limit
+    result["messages"] = [
+        {
+            "message_id": row.id,
+            "conversation_id": row.conversation_id,
+            "conversation_title": row.title,
+            "role": row.role,
+            "snippet": make_snippet(row.content, terms),
+            "created_at": row.created_at,
+            "score": round(-row.score, 4),
+            "archived": bool(row.archived),
+        }
+        for row in rows[:limit]
+    ]
+
+    if offset == 0:
+        conversations = db.execute(text(
+            """
+            SELECT c.id, c.title, conversations_fts.rank AS score
+            FROM conversations_fts
+            JOIN conversations c ON c.rowid = conversations_fts.rowid
+            WHERE conversations_fts MATCH :match
+            ORDER BY conversations_fts.rank
+            LIMIT :limit
+            """
+        ), {"match": match, "limit": limit}).all()
+        result["conversations"] = [
+            {"conversation_id": row.id, "title": row.title, "score": round(-row.score, 4)}
+            for row in conversations
+        ]
+    return result
@@ -0,0 +1,340 @@
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.documents import Document
+from rank_bm25 import BM25Okapi
+from sqlalchemy import DateTime
+from app.core import database
+from app.core.config import settings
+from app.models.document import DocumentModel
+from app.services import corpus_version, vector_store
+from app.services.document_service import DocumentService
+from app.services.vector_store import VectorStoreService, chinese_tokenizer
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional, gzipped JSON columns are used instead
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# A knowledge-base snapshot is a directory:
+#   manifest.json        format version, counts, embedding model and the SHA-256 of every other file
+#   chunks.parquet       chunk ID, file ID, text and metadata columns (chunks.columns.json.gz without pyarrow)
+#   embeddings.npy       float32 (chunks x dimension) matrix in chunk order, loadable with mmap_mode="r"
+#   bm25.json.gz         the BM25 index as per-chunk term counts, so importing does not re-tokenize
+#   documents.json       document rows
+#   uploads/             uploaded files and their extracted-text caches
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+BM25_FILE = "bm25.json.gz"
+DOCUMENTS_FILE = "documents.json"
+UPLOADS_DIRECTORY = "uploads"
+_CHUNK_FILES = {"parquet": "chunks.parquet", "json": "chunks.columns.json.gz"}
+
+
+class SnapshotError(ValueError):
+    """The snapshot is invalid, corrupt, incompatible, or the target is not empty."""
+
+
+def snapshot_path(name: str) -> str:
+    # Snapshot names come from API callers; only plain names inside SNAPSHOT_DIRECTORY are accepted
+    if not name or os.path.basename(name) != name or name.startswith("."):
+        raise SnapshotError(f"Invalid snapshot name: {name}")
+    return os.path.join(settings.SNAPSHOT_DIRECTORY, name)
+
+
+def list_snapshots() -> List[dict]:
+    snapshots = []
+    if not os.path.isdir(settings.SNAPSHOT_DIRECTORY):
+        return snapshots
+    for name in sorted(os.listdir(settings.SNAPSHOT_DIRECTORY)):
+        try:
+            with open(os.path.join(settings.SNAPSHOT_DIRECTORY, name, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            continue
+        snapshots.append({"name": name, **{k: v for k, v in manifest.items() if k != "files"}})
+    return snapshots
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _row_to_dict(row: DocumentModel) -> dict:
+    values = {}
+    for column in DocumentModel.__table__.columns:
+        value = getattr(row, column.key)
+        values[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return values
+
+
+def _row_from_dict(values: dict) -> DocumentModel:
+    kwargs = {}
+    for column in DocumentModel.__table__.columns:
+        value = values.get(column.key)
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        kwargs[column.key] = value
+    return DocumentModel(**kwargs)
+
+
+def _write_chunks(directory: str, ids: List[str], file_ids: List[str], texts: List[str], metadatas: List[dict]) -> str:
+    columns = {
+        "id": ids,
+        "file_id": file_ids,
+        "text": texts,
+        "metadata": [json.dumps(meta, ensure_ascii=False) for meta in metadatas],
+    }
+    if pyarrow is not None:
+        file_name = _CHUNK_FILES["parquet"]
+        pyarrow.parquet.write_table(pyarrow.table(columns), os.path.join(directory, file_name))
+    else:
+        file_name = _CHUNK_FILES["json"]
+        with open(os.path.join(directory, file_name), "wb") as f:
+            f.write(gzip.compress(json.dumps(columns, ensure_ascii=False).encode("utf-8"), compresslevel=6))
+    return file_name
+
+
+def _read_chunks(directory: str, file_name: str) -> Dict[str, list]:
+    path = os.path.join(directory, file_name)
+    if file_name == _CHUNK_FILES["parquet"]:
+        if pyarrow is None:
+            raise SnapshotError(f"{file_name} needs the pyarrow package, which is not installed")
+        return pyarrow.parquet.read_table(path).to_pydict()
+    with open(path, "rb") as f:
+        return json.loads(gzip.decompress(f.read()))
+
+
+def export_snapshot(name: Optional[str] = None, progress: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    Write a consistent snapshot of the knowledge base to SNAPSHOT_DIRECTORY/<name>.
+    Only processed documents whose row, uploaded file and chunks all exist are
+    included, so an upload or delete running at the same time is either fully
+    in or out.
+    The directory only appears (renamed from .tmp) once it is complete.
+    """
+    progress = progress or logger.info
+    start = time.perf_counter()
+    name = name or f"snapshot_{datetime.utcnow():%Y%m%d%H%M%S}"
+    path = snapshot_path(name)
+    if os.path.exists(path):
+        raise SnapshotError(f"Snapshot {name} already exists")
+
+    # Rows first: a document deleted meanwhile loses its chunks and is dropped below
+    with database.SessionLocal() as db:
+        rows = {
+            str(row.id): _row_to_dict(row)
+            for row in db.query(DocumentModel).filter(DocumentModel.status == "processed").order_by(DocumentModel.id)
+        }
+
+    # Then the uploaded files: a document whose file is gone cannot be previewed
+    # or re-chunked on the importing node, so it is left out of the snapshot
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    uploads_path = os.path.join(tmp_path, UPLOADS_DIRECTORY)
+    os.makedirs(uploads_path)
+    copied: Dict[str, List[str]] = {}
+    for file_id, row in list(rows.items()):
+        upload = DocumentService.upload_path(row["id"], row["filename"])
+        try:
+            shutil.copy2(upload, os.path.join(uploads_path, os.path.basename(upload)))
+        except FileNotFoundError:
+            logger.warning(f"Upload of document {file_id} ({row['filename']}) is missing; not exported.")
+            del rows[file_id]
+            continue
+        copied[file_id] = [os.path.basename(upload)]
+        cache = DocumentService.extracted_text_path(upload)
+        if os.path.exists(cache):
+            shutil.copy2(cache, os.path.join(uploads_path, os.path.basename(cache)))
+            copied[file_id].append(os.path.basename(cache))
+
+    service = VectorStoreService()
+    data = service.vector_db._collection.get(include=["documents", "metadatas", "embeddings"])
+
+    ids, file_ids, texts, metadatas, keep = [], [], [], [], []
+    for i, (chunk_id, text, meta) in enumerate(zip(data["ids"], data["documents"], data["metadatas"])):
+        meta = meta or {}
+        if meta.get("file_id") not in rows:
+            continue
+        ids.append(chunk_id)
+        file_ids.append(meta["file_id"])
+        texts.append(text)
+        metadatas.append(meta)
+        keep.append(i)
+    exported_files = set(file_ids)
+    documents = [row for file_id, row in rows.items() if file_id in exported_files]
+    embeddings = np.asarray(data["embeddings"], dtype=np.float32)[keep] if keep else np.zeros((0, 0), dtype=np.float32)
+
+    try:
+        # Files of documents that were dropped for having no chunks
+        for file_id in set(copied) - exported_files:
+            for file_name in copied[file_id]:
+                os.remove(os.path.join(uploads_path, file_name))
+
+        chunks_file = _write_chunks(tmp_path, ids, file_ids, texts, metadatas)
+        np.save(os.path.join(tmp_path, EMBEDDINGS_FILE), embeddings)
+
+        # BM25 term counts in chunk order (from the cached index when it covers exactly these chunks)
+        cached = vector_store._bm25_retriever_cache
+        if cached is not None and [d.metadata.get("chunk_id") for d in cached.docs] == ids:
+            term_counts = [dict(freqs) for freqs in cached.vectorizer.doc_freqs]
+            bm25_params = {"k1": cached.vectorizer.k1, "b": cached.vectorizer.b, "epsilon": cached.vectorizer.epsilon}
+        else:
+            term_counts = [dict(Counter(chinese_tokenizer(text))) for text in texts]
+            bm25_params = {"k1": 1.5, "b": 0.75, "epsilon": 0.25}
+        with open(os.path.join(tmp_path, BM25_FILE), "wb") as f:
+            f.write(gzip.compress(json.dumps({**bm25_params, "term_counts": term_counts}, ensure_ascii=False).encode("utf-8")))
+
+        with open(os.path.join(tmp_path, DOCUMENTS_FILE), "w", encoding="utf-8") as f:
+            json.dump(documents, f, ensure_ascii=False)
+
+        files = {}
+        for root, _, names in os.walk(tmp_path):
+            for file_name in names:
+                file_path = os.path.join(root, file_name)
+                files[os.path.relpath(file_path, tmp_path).replace(os.sep, "/")] = _sha256(file_path)
+        manifest = {
+            "format_version": SNAPSHOT_FORMAT_VERSION,
+            "name": name,
+            "created_at": datetime.utcnow().isoformat(),
+            "embedding_model": settings.EMBEDDING_MODEL_NAME,
+            "dimension": int(embeddings.shape[1]) if len(ids) else 0,
+            "documents": len(documents),
+            "chunks": len(ids),
+            "chunks_file": chunks_file,
+            "files": files,
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    progress(f"Exported {len(documents)} documents and {len(ids)} chunks to {path} in {time.perf_counter() - start:.1f}s")
+    return {k: v for k, v in manifest.items() if k != "files"}
+
+
+def verify_snapshot(path: str) -> dict:
+    """Check the format version and every file's checksum; returns the manifest."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotError(f"No snapshot at {path}")
+    if manifest.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {manifest.get('format_version')}")
+    for relative_path, checksum in manifest["files"].items():
+        file_path = os.path.join(path, *relative_path.split("/"))
+        if not os.path.exists(file_path):
+            raise SnapshotError(f"Snapshot file missing: {relative_path}")
+        if _sha256(file_path) != checksum:
+            raise SnapshotError(f"Checksum mismatch: {relative_path}")
+    return manifest
+
+
+def import_snapshot(path: str, progress: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    Bulk-load a snapshot into an empty knowledge base: stored embeddings go
+    straight into Chroma (no embedding calls), rows keep their IDs, and the
+    BM25 index is rebuilt from the stored term counts. Raises SnapshotError if
+    the snapshot does not verify or this node already has documents.
+    """
+    progress = progress or logger.info
+    start = time.perf_counter()
+    manifest = verify_snapshot(path)
+    if manifest["chunks"] and manifest["embedding_model"] != settings.EMBEDDING_MODEL_NAME:
+        raise SnapshotError(
+            f"Snapshot embeddings are from {manifest['embedding_model']}, this node uses {settings.EMBEDDING_MODEL_NAME}"
+        )
+
+    service = VectorStoreService()
+    collection = service.vector_db._collection
+    with database.SessionLocal() as db:
+        if db.query(DocumentModel.id).first() is not None or collection.count():
+            raise SnapshotError("The knowledge base is not empty; import into a fresh node")
+
+    chunks = _read_chunks(path, manifest["chunks_file"])
+    embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+    with open(os.path.join(path, DOCUMENTS_FILE), encoding="utf-8") as f:
+        documents = json.load(f)
+    with open(os.path.join(path, BM25_FILE), "rb") as f:
+        bm25_data = json.loads(gzip.decompress(f.read()))
+    metadatas = [json.loads(meta) for meta in chunks["metadata"]]
+    if not (len(chunks["id"]) == len(metadatas) == len(bm25_data["term_counts"]) == manifest["chunks"] == len(embeddings)):
+        raise SnapshotError("Snapshot chunk, embedding and BM25 counts do not match")
+
+    # 1. Upload files, so chunks never point at a missing source
+    os.makedirs(os.path.join("data", "uploads"), exist_ok=True)
+    uploads = os.path.join(path, UPLOADS_DIRECTORY)
+    copied = []
+    try:
+        for file_name in os.listdir(uploads):
+            target = os.path.join("data", "uploads", file_name)
+            shutil.copy2(os.path.join(uploads, file_name), target)
+            copied.append(target)
+
+        # 2. Vectors, in the largest batches Chroma accepts
+        batch_size = service.vector_db._client.get_max_batch_size()
+        try:
+            for i in range(0, len(chunks["id"]), batch_size):
+                collection.add(
+                    ids=chunks["id"][i:i + batch_size],
+                    documents=chunks["text"][i:i + batch_size],
+                    metadatas=metadatas[i:i + batch_size],
+                    embeddings=np.asarray(embeddings[i:i + batch_size]),
+                )
+
+            # 3. Document rows last, so documents are listed only once they are searchable
+            with database.SessionLocal() as db:
+                db.add_all([_row_from_dict(row) for row in documents])
+                corpus_version.bump_version(db)
+        except Exception:
+            if chunks["id"]:
+                collection.delete(ids=chunks["id"])
+            raise
+    except Exception:
+        # A failed import leaves the node empty, so it can simply be retried
+        for target in copied:
+            os.remove(target)
+        raise
+
+    # 4. BM25 index from the stored term counts (token order does not matter, only the counts)
+    if chunks["id"]:
+        corpus = [list(Counter(counts).elements()) for counts in bm25_data["term_counts"]]
+        docs = [
+            Document(page_content=text, metadata={"chunk_id": chunk_id, **meta})
+            for chunk_id, text, meta in zip(chunks["id"], chunks["text"], metadatas)
+        ]
+        vector_store._bm25_retriever_cache = BM25Retriever(
+            vectorizer=BM25Okapi(corpus, k1=bm25_data["k1"], b=bm25_data["b"], epsilon=bm25_data["epsilon"]),
+            docs=docs,
+            preprocess_func=chinese_tokenizer,
+        )
+
+    report = {
+        "name": manifest["name"],
+        "documents": len(documents),
+        "chunks": len(chunks["id"]),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    progress(f"Imported {report['documents']} documents and {report['chunks']} chunks in {report['seconds']}s")
+    return report
@@ -0,0 +1,65 @@
+from typing import Any, Optional
+from langchain_core.documents import Document
+from app.core.config import settings
+import re
+
+
+def make_snippet(text: str, max_chars: Optional[int] = None) -> str:
+    """Short single-line preview of a chunk."""
+    max_chars = max_chars or settings.SOURCE_SNIPPET_CHARS
+    text = re.sub(r"\s+", " ", text or "").strip()
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+
+def _score(metadata: dict) -> Optional[float]:
+    score = metadata.get("relevance_score")
+    return round(float(score), 4) if score is not None else None
+
+
+def to_source_ref(doc: Document) -> dict:
+    """
+    Compact reference to a source document.
+    Local chunks are identified by chunk_id; their full text is fetched on
+    demand from POST /documents/chunks.
+    """
+    meta = doc.metadata or {}
+    if meta.get("type") == "web_search":
+        return {
+            "type": "web",
+            "title": meta.get("title", "无标题"),
+            "url": meta.get("source", "无链接"),
+            "snippet": make_snippet(doc.page_content),
+        }
+    return {
+        "type": "file",
+        "chunk_id": meta.get("chunk_id"),
+        "file_id": meta.get("file_id"),
+        "page": meta.get("page"),
+        "score": _score(meta),
+        "title": meta.get("filename", "未知文档"),
+        "snippet": make_snippet(doc.page_content),
+    }
+
+
+def compact_source(source: Any, chunk_id_lookup=None) -> dict:
+    """
+    Convert a stored source of any earlier format into a compact reference.
+    Handles full source dicts ({type, content, metadata, title}) and plain
+    content strings; chunk_id_lookup(file_id, content) may resolve missing IDs.
+    """
+    if isinstance(source, dict):
+        if "snippet" in source:
+            return source  # already compact
+        meta = dict(source.get("metadata") or {})
+        if source.get("type") == "web":
+            meta.update(type="web_search", title=source.get("title"), source=source.get("url"))
+        elif source.get("title") and "filename" not in meta:
+            meta["filename"] = source["title"]
+        content = source.get("content", "")
+    else:
+        meta = {}
+        content = str(source)
+
+    if meta.get("type") != "web_search" and not meta.get("chunk_id") and chunk_id_lookup:
+        meta["chunk_id"] = chunk_id_lookup(meta.get("file_id"), content)
+    return to_source_ref(Document(page_content=content, metadata=meta))
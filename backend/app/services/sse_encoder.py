@@ -0,0 +1,153 @@
+from typing import AsyncIterator, Optional, Tuple
+from app.core.config import settings
+import asyncio
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def encode_event(event: dict, event_id: Optional[int] = None) -> bytes:
+    """Serialize one event as an SSE data frame, with an id line if given."""
+    if orjson is not None:
+        payload = orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS)
+    else:
+        payload = json.dumps(event, default=str, ensure_ascii=False).encode("utf-8")
+    frame = b"data: " + payload + b"\n\n"
+    if event_id is not None:
+        frame = b"id: %d\n" % event_id + frame
+    return frame
+
+
+def _split(item) -> Tuple[Optional[int], dict]:
+    # Items are event dicts or (event_id, event) pairs from a resumable stream
+    return item if isinstance(item, tuple) else (None, item)
+
+
+class SSEEncoder:
+    """
+    Turns a stream of event dicts into SSE frames.
+    Consecutive {"answer": ...} token chunks are merged into one frame, flushed
+    flush_interval seconds after the first buffered chunk or once the buffer
+    reaches flush_bytes. Any other event flushes the buffered answer first, so
+    event order and shapes are unchanged. Items may also be (event_id, event)
+    pairs; a merged frame carries the id of its last chunk. At most
+    max_pending_frames encoded frames wait for the client; beyond that the
+    producer is paused until the client catches up.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        flush_bytes: Optional[int] = None,
+        max_pending_frames: Optional[int] = None,
+    ):
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else settings.SSE_FLUSH_INTERVAL_SECONDS
+        )
+        self.flush_bytes = flush_bytes if flush_bytes is not None else settings.SSE_FLUSH_BYTES
+        self.max_pending_frames = (
+            max_pending_frames if max_pending_frames is not None else settings.SSE_MAX_PENDING_FRAMES
+        )
+        self.frames = 0
+        self.chunks = 0
+
+    async def encode(self, events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+        if self.flush_interval <= 0:
+            async for item in events:
+                self.chunks += 1
+                self.frames += 1
+                event_id, event = _split(item)
+                yield encode_event(event, event_id)
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = events.__aiter__()
+        # Bounded, so a slow client pauses the producer instead of growing memory
+        frames = asyncio.Queue(maxsize=self.max_pending_frames)
+        buffer = []
+        state = {"bytes": 0, "timer": None, "error": None, "last_id": None}
+
+        def take_buffer() -> bytes:
+            frame = encode_event({"answer": "".join(buffer)}, state["last_id"])
+            buffer.clear()
+            state["bytes"] = 0
+            self.frames += 1
+            return frame
+
+        async def push(frame: bytes):
+            self.frames += 1
+            await frames.put(frame)
+
+        async def flush():
+            if state["timer"] is not None:
+                state["timer"].cancel()
+                state["timer"] = None
+            if buffer:
+                await frames.put(take_buffer())
+
+        def flush_on_timer():
+            state["timer"] = None
+            if not buffer:
+                return
+            if frames.full():
+                # The client is behind anyway; try again rather than block the loop
+                state["timer"] = loop.call_later(self.flush_interval, flush_on_timer)
+                return
+            frames.put_nowait(take_buffer())
+
+        async def pump():
+            # Pull events in one background task; frames are handed over in batches
+            first_answer_sent = False
+            try:
+                async for item in iterator:
+                    self.chunks += 1
+                    event_id, event = _split(item)
+                    if len(event) == 1 and "answer" in event:
+                        if not first_answer_sent:
+                            # Send the first token right away to keep time-to-first-token low
+                            first_answer_sent = True
+                            await push(encode_event(event, event_id))
+                            continue
+                        if not buffer:
+                            state["timer"] = loop.call_later(self.flush_interval, flush_on_timer)
+                        buffer.append(event["answer"])
+                        state["last_id"] = event_id
+                        state["bytes"] += len(event["answer"].encode("utf-8"))
+                        if state["bytes"] >= self.flush_bytes:
+                            await flush()
+                        continue
+                    await flush()
+                    await push(encode_event(event, event_id))
+            except Exception as e:
+                state["error"] = e
+            # Not reached on cancellation, where nobody is reading any more
+            await flush()
+            await frames.put(None)
+
+        task = asyncio.create_task(pump())
+        try:
+            while True:
+                frame = await frames.get()
+                if frame is None:
+                    break
+                yield frame
+            if state["error"] is not None:
+                raise state["error"]
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+            if state["timer"] is not None:
+                state["timer"].cancel()
+            # Run the producer's own cleanup (e.g. saving a partial answer) on disconnect
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+def sse_stream(events: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """Coalesced SSE byte stream for a StreamingResponse."""
+    return SSEEncoder().encode(events)
@@ -0,0 +1,132 @@
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
+from app.core.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Global registry of in-progress and recently finished generations
+_streams: Dict[str, "StreamBuffer"] = {}
+
+
+class StreamBuffer:
+    """
+    Bounded event log of one generation, numbered from 1 for SSE Last-Event-ID.
+    The generation runs in its own task and appends here; any number of
+    clients can subscribe, replay what they missed and then follow live.
+    """
+
+    def __init__(self, stream_id: str, max_events: Optional[int] = None, **info):
+        self.stream_id = stream_id
+        self.max_events = max_events or settings.STREAM_BUFFER_MAX_EVENTS
+        self.info = info
+        self.events = deque()  # (event_id, event)
+        self.last_id = 0
+        # Answer text of events dropped from the front of the buffer
+        self.base_answer = ""
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def first_id(self) -> int:
+        return self.events[0][0] if self.events else self.last_id + 1
+
+    def append(self, event: dict) -> int:
+        self.last_id += 1
+        self.events.append((self.last_id, event))
+        while len(self.events) > self.max_events:
+            _, dropped = self.events.popleft()
+            if dropped.get("replace"):
+                self.base_answer = ""
+            if "answer" in dropped:
+                self.base_answer += dropped["answer"]
+        self._notify()
+        return self.last_id
+
+    def finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self):
+        # Wake current subscribers; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self, last_event_id: int = 0) -> AsyncIterator[Tuple[int, dict]]:
+        """Events after last_event_id, then live ones until the generation ends."""
+        cursor = max(0, last_event_id)
+        while True:
+            changed = self._changed
+            if cursor < self.first_id - 1:
+                # Missed events are gone: restart the answer from the dropped prefix
+                cursor = self.first_id - 1
+                yield cursor, {"replace": True, "reason": "resume"}
+                if self.base_answer:
+                    yield cursor, {"answer": self.base_answer}
+
+            pending = [(i, e) for i, e in self.events if i > cursor]
+            for event_id, event in pending:
+                cursor = event_id
+                yield event_id, event
+            if pending:
+                continue
+            if self.done:
+                return
+            await changed.wait()
+
+
+async def _run(buffer: StreamBuffer, events: AsyncIterator[dict]):
+    try:
+        async for event in events:
+            buffer.append(event)
+    except asyncio.CancelledError:
+        buffer.append({"error": "生成已取消"})
+    except Exception as e:
+        logger.error(f"Stream {buffer.stream_id} failed: {e}", exc_info=True)
+        buffer.append({"error": str(e)})
+    finally:
+        buffer.finish()
+        # Keep the finished buffer around for late reconnects, then release it
+        asyncio.get_running_loop().call_later(
+            settings.STREAM_RETENTION_SECONDS, _release, buffer.stream_id, buffer
+        )
+
+
+def _release(stream_id: str, buffer: StreamBuffer):
+    if _streams.get(stream_id) is buffer:
+        del _streams[stream_id]
+        logger.info(f"Released stream buffer {stream_id}.")
+
+
+def start_stream(stream_id: str, events: AsyncIterator[dict], **info) -> StreamBuffer:
+    """Run the event generator in the background, independent of any connection."""
+    buffer = StreamBuffer(stream_id, **info)
+    _streams[stream_id] = buffer
+    buffer.task = asyncio.create_task(_run(buffer, events))
+    return buffer
+
+
+def get_stream(stream_id: str) -> Optional[StreamBuffer]:
+    return _streams.get(stream_id)
+
+
+def cancel_stream(stream_id: str) -> bool:
+    buffer = _streams.get(stream_id)
+    if buffer is None or buffer.done:
+        return False
+    buffer.task.cancel()
+    return True
+
+
+async def cancel_all():
+    """Cancel every running generation and wait until each has saved its partial answer."""
+    tasks = [b.task for b in _streams.values() if not b.done and b.task is not None]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
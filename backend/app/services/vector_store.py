@@ -1,34 +1,249 @@
 from langchain_community.vectorstores import Chroma
+from chromadb.api.shared_system_client import SharedSystemClient
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.embeddings import FakeEmbeddings
 from langchain_community.retrievers import BM25Retriever
 from langchain.retrievers.ensemble import EnsembleRetriever
 from app.core.config import settings
-from typing import List
+from app.services.circuit_breaker import BreakerEmbeddings, get_breaker
+from typing import Iterable, List, Optional
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
 import jieba
+import os
+import threading
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on Windows, where the lock is process-local
+    fcntl = None
 
 # Global cache for BM25 retriever to avoid rebuilding it on every request
 _bm25_retriever_cache = None
 
+# Global LRU cache of recent query embeddings, so stages after retrieval can
+# reuse the vector retrieval computed instead of calling the provider again
+_query_embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+
+# Chroma collection queried by default; a re-chunk builds a new one and swaps it in
+DEFAULT_COLLECTION_NAME = "langchain"
+ACTIVE_COLLECTION_FILE = "active_collection"
+
+def active_collection_name() -> str:
+    try:
+        with open(os.path.join(settings.CHROMA_PERSIST_DIRECTORY, ACTIVE_COLLECTION_FILE)) as f:
+            return f.read().strip() or DEFAULT_COLLECTION_NAME
+    except FileNotFoundError:
+        return DEFAULT_COLLECTION_NAME
+
+def set_active_collection(name: str):
+    """Atomically point new VectorStoreService instances at another collection."""
+    path = os.path.join(settings.CHROMA_PERSIST_DIRECTORY, ACTIVE_COLLECTION_FILE)
+    with open(path + ".tmp", "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+# Uploads and deletes write the active collection under a shared lock; a
+# re-chunk takes it exclusively while it reconciles and swaps collections, so
+# no write lands in a collection that is about to be dropped. flock works
+# across threads and worker processes (each holder opens its own descriptor).
+CORPUS_LOCK_FILE = "corpus.lock"
+_corpus_thread_lock = threading.Lock()
+
+def _lock_corpus(exclusive: bool):
+    if fcntl is None:
+        _corpus_thread_lock.acquire()
+        return None
+    os.makedirs(settings.CHROMA_PERSIST_DIRECTORY, exist_ok=True)
+    lock_file = open(os.path.join(settings.CHROMA_PERSIST_DIRECTORY, CORPUS_LOCK_FILE), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    except BaseException:
+        lock_file.close()
+        raise
+    return lock_file
+
+def _unlock_corpus(lock_file):
+    if lock_file is None:
+        _corpus_thread_lock.release()
+        return
+    fcntl.flock(lock_file, fcntl.LOCK_UN)
+    lock_file.close()
+
+@contextmanager
+def corpus_write_lock(exclusive: bool = False):
+    """Hold the corpus lock: shared for document writes, exclusive for a collection swap."""
+    lock_file = _lock_corpus(exclusive)
+    try:
+        yield
+    finally:
+        _unlock_corpus(lock_file)
+
+@asynccontextmanager
+async def acorpus_write_lock(exclusive: bool = False):
+    """corpus_write_lock for the event loop: waits for the lock on a worker thread."""
+    lock_file = await asyncio.to_thread(_lock_corpus, exclusive)
+    try:
+        yield
+    finally:
+        _unlock_corpus(lock_file)
+
+def reset_chroma_clients():
+    """
+    Drop the Chroma systems cached in this process. A local Chroma client
+    keeps the collection's vector index in memory and does not see vectors
+    another process added or deleted; new VectorStoreService instances then
+    open a client that loads the current index.
+    """
+    SharedSystemClient.clear_system_cache()
+
 def chinese_tokenizer(text):
     return list(jieba.cut(text))
 
+def cached_query_embedding(text: str) -> Optional[List[float]]:
+    """Embedding of a query embedded recently by this process, or None (never calls the provider)."""
+    vector = _query_embedding_cache.get(text)
+    if vector is not None:
+        _query_embedding_cache.move_to_end(text)
+    return vector
+
+class QueryEmbeddingCache(Embeddings):
+    """Embeddings wrapper that remembers recent query vectors (see cached_query_embedding)."""
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.embeddings.embed_query(text)
+        _query_embedding_cache[text] = vector
+        _query_embedding_cache.move_to_end(text)
+        while len(_query_embedding_cache) > settings.QUERY_EMBEDDING_CACHE_SIZE:
+            _query_embedding_cache.popitem(last=False)
+        return vector
+
+def bm25_batch_scores(bm25, tokenized_queries: List[List[str]]) -> np.ndarray:
+    """
+    BM25Okapi scores of many queries in one vectorized pass.
+    Returns a (queries x documents) matrix equal to bm25.get_scores per query.
+    """
+    vocab = {}
+    for tokens in tokenized_queries:
+        for token in tokens:
+            vocab.setdefault(token, len(vocab))
+
+    doc_len = np.asarray(bm25.doc_len, dtype=float)
+    if not vocab or not len(doc_len):
+        return np.zeros((len(tokenized_queries), len(doc_len)))
+
+    # Term frequencies of the query vocabulary only (terms x documents)
+    tf = np.zeros((len(vocab), len(doc_len)))
+    for j, freqs in enumerate(bm25.doc_freqs):
+        for token, freq in freqs.items():
+            i = vocab.get(token)
+            if i is not None:
+                tf[i, j] = freq
+
+    idf = np.array([bm25.idf.get(token, 0.0) for token in vocab])
+    norm = bm25.k1 * (1 - bm25.b + bm25.b * doc_len / bm25.avgdl)
+    term_scores = idf[:, None] * (tf * (bm25.k1 + 1)) / (tf + norm)
+
+    # Query term counts (queries x terms); repeated terms count repeatedly as in get_scores
+    query_matrix = np.zeros((len(tokenized_queries), len(vocab)))
+    for q, tokens in enumerate(tokenized_queries):
+        for token in tokens:
+            query_matrix[q, vocab[token]] += 1
+    return query_matrix @ term_scores
+
+def drop_files_from_bm25_cache(file_ids: Iterable[str]):
+    """
+    Remove the chunks of these files from the cached BM25 index in one pass.
+    The index is rebuilt from the remaining documents' stored term counts, so
+    Chroma is not re-read and nothing is re-tokenized.
+    """
+    global _bm25_retriever_cache
+    retriever = _bm25_retriever_cache
+    if retriever is None:
+        return
+    file_ids = set(file_ids)
+    keep = [i for i, doc in enumerate(retriever.docs) if doc.metadata.get("file_id") not in file_ids]
+    if len(keep) == len(retriever.docs):
+        return
+    if not keep:
+        _bm25_retriever_cache = None
+        return
+    bm25 = retriever.vectorizer
+    # Token order does not matter to BM25, only the counts
+    corpus = [list(Counter(bm25.doc_freqs[i]).elements()) for i in keep]
+    _bm25_retriever_cache = BM25Retriever(
+        vectorizer=type(bm25)(corpus, k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon),
+        docs=[retriever.docs[i] for i in keep],
+        k=retriever.k,
+        preprocess_func=retriever.preprocess_func,
+    )
+
+def build_bm25_retriever(collection_data: dict) -> Optional[BM25Retriever]:
+    """BM25 retriever over the chunks of a Chroma get() result, or None if there are none."""
+    texts = collection_data['documents']
+    metadatas = collection_data['metadatas']
+    ids = collection_data['ids']
+    if not texts:
+        return None
+
+    # Reconstruct Document objects
+    docs = []
+    for i in range(len(texts)):
+        meta = metadatas[i] if metadatas and i < len(metadatas) else {}
+        # Ensure metadata is a dict
+        if meta is None:
+            meta = {}
+        # Chunks indexed before chunk IDs were stored in metadata
+        meta.setdefault("chunk_id", ids[i])
+        docs.append(Document(page_content=texts[i], metadata=meta))
+
+    return BM25Retriever.from_documents(docs, preprocess_func=chinese_tokenizer)
+
+def reciprocal_rank_fusion(result_lists: List[List[Document]], weights: List[float], c: int = 60) -> List[Document]:
+    """Weighted reciprocal rank fusion, deduplicated by content (same as EnsembleRetriever)."""
+    scores = {}
+    docs_by_content = {}
+    for docs, weight in zip(result_lists, weights):
+        for rank, doc in enumerate(docs, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + c)
+            docs_by_content.setdefault(doc.page_content, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs_by_content[content] for content in ranked]
+
 class VectorStoreService:
-    def __init__(self):
+    def __init__(self, collection_name: Optional[str] = None):
         if settings.USE_MOCK_RAG or not settings.is_api_key_valid():
             if not settings.USE_MOCK_RAG:
                 print("Warning: Invalid or missing OpenAI API Key. Fallback to Mock Embeddings.")
             # Mock embeddings with same dimension as text-embedding-3-small (1536)
-            self.embeddings = FakeEmbeddings(size=1536)
+            self.embeddings = QueryEmbeddingCache(FakeEmbeddings(size=1536))
         else:
-            self.embeddings = OpenAIEmbeddings(
-                model=settings.EMBEDDING_MODEL_NAME,
-                openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_API_BASE,
-                timeout=60
-            )
+            # Fail fast (and let retrieval fall back to BM25) while the provider is down
+            self.embeddings = QueryEmbeddingCache(BreakerEmbeddings(
+                OpenAIEmbeddings(
+                    model=settings.EMBEDDING_MODEL_NAME,
+                    openai_api_key=settings.OPENAI_API_KEY,
+                    openai_api_base=settings.OPENAI_API_BASE,
+                    timeout=60
+                ),
+                get_breaker("embedding"),
+            ))
+        self.collection_name = collection_name or active_collection_name()
         self.vector_db = Chroma(
+            collection_name=self.collection_name,
             persist_directory=settings.CHROMA_PERSIST_DIRECTORY,
             embedding_function=self.embeddings
         )
@@ -43,76 +258,173 @@ class VectorStoreService:
         _bm25_retriever_cache = None
         print("Invalidated BM25 cache due to new documents.")
 
+        # Stable chunk IDs (also kept in metadata) so sources can reference chunks
+        for doc in documents:
+            if not doc.metadata.get("chunk_id"):
+                doc.metadata["chunk_id"] = str(uuid.uuid4())
+
         # Process documents in batches to avoid payload size limits
         total_docs = len(documents)
         for i in range(0, total_docs, batch_size):
             batch = documents[i : i + batch_size]
             print(f"Adding batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size} (size: {len(batch)})")
-            self.vector_db.add_documents(batch)
+            self.vector_db.add_documents(batch, ids=[doc.metadata["chunk_id"] for doc in batch])
             
         self.vector_db.persist()
 
     def delete_documents_by_file_id(self, file_id: str):
         """Delete documents by file_id (stored in metadata)."""
-        # Note: Chroma expects a filter dictionary
-        # We assume that when adding documents, we add metadata={"file_id": str(db_doc.id)}
         try:
-            self.vector_db._collection.delete(where={"file_id": file_id})
-            
-            # Invalidate BM25 cache when documents are deleted
-            global _bm25_retriever_cache
-            _bm25_retriever_cache = None
-            print(f"Deleted vectors for file_id: {file_id} and invalidated BM25 cache.")
+            self.delete_documents_by_file_ids([file_id])
+            print(f"Deleted vectors for file_id: {file_id} and updated BM25 cache.")
         except Exception as e:
             print(f"Error deleting vectors for file_id {file_id}: {str(e)}")
 
+    def delete_documents_by_file_ids(self, file_ids: List[str]):
+        """Delete the chunks of many files with one Chroma call and update the BM25 index once."""
+        file_ids = [str(file_id) for file_id in file_ids]
+        if not file_ids:
+            return
+        # We assume that when adding documents, we add metadata={"file_id": str(db_doc.id)}
+        self.vector_db._collection.delete(where={"file_id": {"$in": file_ids}})
+        drop_files_from_bm25_cache(file_ids)
+
+
+    def get_chunks(self, chunk_ids: List[str]) -> List[Document]:
+        """Fetch full chunk text and metadata by chunk ID (unknown IDs are skipped)."""
+        if not chunk_ids:
+            return []
+        data = self.vector_db._collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+        return [
+            Document(page_content=text, metadata={**(meta or {}), "chunk_id": chunk_id})
+            for chunk_id, text, meta in zip(data["ids"], data["documents"], data["metadatas"])
+        ]
+
+    def get_chunk_embeddings(self, chunk_ids: List[str]) -> dict:
+        """Stored embeddings by chunk ID (unknown IDs are skipped)."""
+        if not chunk_ids:
+            return {}
+        data = self.vector_db._collection.get(ids=list(chunk_ids), include=["embeddings"])
+        return {chunk_id: list(embedding) for chunk_id, embedding in zip(data["ids"], data["embeddings"])}
+
+    def backfill_chunk_ids(self, batch_size: int = 500) -> int:
+        """Store each chunk's Chroma ID as its chunk_id metadata where missing. Returns the count."""
+        collection = self.vector_db._collection
+        updated = 0
+        offset = 0
+        while True:
+            data = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            if not data["ids"]:
+                break
+            ids, metadatas = [], []
+            for chunk_id, meta in zip(data["ids"], data["metadatas"]):
+                meta = meta or {}
+                if meta.get("chunk_id") != chunk_id:
+                    ids.append(chunk_id)
+                    metadatas.append({**meta, "chunk_id": chunk_id})
+            if ids:
+                collection.update(ids=ids, metadatas=metadatas)
+                updated += len(ids)
+            offset += batch_size
+
+        if updated:
+            global _bm25_retriever_cache
+            _bm25_retriever_cache = None
+        return updated
 
     def similarity_search(self, query: str, k: int = 4) -> List[Document]:
         """Search for similar documents."""
         return self.vector_db.similarity_search(query, k=k)
 
+    def get_bm25_retriever(self, k=4):
+        """Get the cached BM25 retriever (built on first use), or None if the store is empty."""
+        global _bm25_retriever_cache
+
+        # Use cached BM25 retriever if available
+        if _bm25_retriever_cache is None:
+            print("Building BM25 index...")
+            # Get all documents from Chroma to build BM25 index
+            # Note: This might be slow for large datasets
+            _bm25_retriever_cache = build_bm25_retriever(self.vector_db.get())
+            if _bm25_retriever_cache is None:
+                print("Warning: No documents found in vector store for hybrid search fallback.")
+                return None
+
+        # Use the cached retriever
+        bm25_retriever = _bm25_retriever_cache
+        bm25_retriever.k = k
+        return bm25_retriever
+
+    def batch_bm25_search(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """BM25 top-k for many queries with a single vectorized scoring pass."""
+        bm25_retriever = self.get_bm25_retriever(k)
+        if bm25_retriever is None:
+            return [[] for _ in queries]
+
+        tokenized = [bm25_retriever.preprocess_func(query) for query in queries]
+        scores = bm25_batch_scores(bm25_retriever.vectorizer, tokenized)
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return [[bm25_retriever.docs[j] for j in row] for row in top]
+
+    def batch_similarity_search(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """Dense top-k for many queries: one embedding call and one Chroma query."""
+        if not queries:
+            return []
+        query_embeddings = self.embeddings.embed_documents(queries)
+        results = self.vector_db._collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["documents", "metadatas"],
+        )
+        batches = []
+        for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"]):
+            batches.append([
+                Document(page_content=text, metadata={"chunk_id": chunk_id, **(meta or {})})
+                for chunk_id, text, meta in zip(ids, texts, metadatas)
+            ])
+        return batches
+
+    def batch_hybrid_search(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """Hybrid retrieval for many queries, fused like the hybrid retriever."""
+        bm25_results = self.batch_bm25_search(queries, k)
+        if get_breaker("embedding").is_open:
+            print("Embedding circuit is open. Using BM25-only batch retrieval.")
+            return bm25_results
+        try:
+            dense_results = self.batch_similarity_search(queries, k)
+        except Exception as e:
+            print(f"Batch similarity search failed: {e}. Using BM25-only batch retrieval.")
+            return bm25_results
+        return [
+            reciprocal_rank_fusion([bm25_docs, dense_docs], weights=[0.5, 0.5])
+            for bm25_docs, dense_docs in zip(bm25_results, dense_results)
+        ]
+
     def get_retriever(self, search_type="similarity", k=4):
         """Get retriever based on search type."""
+        if search_type == "bm25" or (
+            search_type == "hybrid" and get_breaker("embedding").is_open
+        ):
+            # Lexical-only retrieval needs no embedding call
+            try:
+                bm25_retriever = self.get_bm25_retriever(k)
+                if bm25_retriever is not None:
+                    if search_type == "hybrid":
+                        print("Embedding circuit is open. Using BM25-only retrieval.")
+                    return bm25_retriever
+            except Exception as e:
+                print(f"BM25 retriever setup failed: {e}.")
+
         chroma_retriever = self.vector_db.as_retriever(
             search_type="similarity",
             search_kwargs={"k": k}
         )
         
         if search_type == "hybrid":
-            global _bm25_retriever_cache
-            
             try:
-                # Use cached BM25 retriever if available
-                if _bm25_retriever_cache is None:
-                    print("Building BM25 index...")
-                    # Get all documents from Chroma to build BM25 index
-                    # Note: This might be slow for large datasets
-                    collection_data = self.vector_db.get()
-                    texts = collection_data['documents']
-                    metadatas = collection_data['metadatas']
-                    
-                    if not texts:
-                        print("Warning: No documents found in vector store for hybrid search fallback.")
-                        return chroma_retriever
-
-                    # Reconstruct Document objects
-                    docs = []
-                    for i in range(len(texts)):
-                        meta = metadatas[i] if metadatas and i < len(metadatas) else {}
-                        # Ensure metadata is a dict
-                        if meta is None:
-                            meta = {}
-                        docs.append(Document(page_content=texts[i], metadata=meta))
-                    
-                    # Build BM25 Retriever
-                    _bm25_retriever_cache = BM25Retriever.from_documents(
-                        docs, 
-                        preprocess_func=chinese_tokenizer
-                    )
-                
-                # Use the cached retriever
-                bm25_retriever = _bm25_retriever_cache
-                bm25_retriever.k = k
+                bm25_retriever = self.get_bm25_retriever(k)
+                if bm25_retriever is None:
+                    return chroma_retriever
                 
                 # Create Ensemble Retriever
                 ensemble_retriever = EnsembleRetriever(
@@ -1,20 +1,126 @@
 from duckduckgo_search import DDGS
 from langchain_core.documents import Document
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from app.core.config import settings
+import json
 import logging
 import asyncio
 import os
-from functools import partial
+import re
+import threading
+import time
+from app.services.circuit_breaker import CircuitOpenError, get_breaker
 
 logger = logging.getLogger(__name__)
 
+# Global TTL cache of search results keyed by (normalized query, max_results)
+_result_cache: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (expires_at, documents)
+# Searches currently running, shared by identical concurrent callers
+_inflight: Dict[tuple, Future] = {}
+_lock = threading.Lock()
+
+# Dedicated pool so slow searches cannot exhaust the default executor
+_executor: Optional[ThreadPoolExecutor] = None
+
+# One DDGS session per worker thread, reused across searches
+_thread_local = threading.local()
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.WEB_SEARCH_MAX_WORKERS,
+                thread_name_prefix="web-search",
+            )
+        return _executor
+
+
+class LocalSearchBackend:
+    """
+    Offline stand-in for DuckDuckGo with the same text() result format.
+    Serves entries from WEB_SEARCH_LOCAL_FILE (a JSON list of {title, href, body})
+    ranked by query term overlap, or synthetic results if no file is configured.
+    """
+
+    def __init__(self, path: Optional[str] = None, latency: Optional[float] = None):
+        self.path = path if path is not None else settings.WEB_SEARCH_LOCAL_FILE
+        self.latency = latency if latency is not None else settings.WEB_SEARCH_LOCAL_LATENCY_SECONDS
+        self.entries = []
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def text(self, keywords: str, max_results: int = 5, **kwargs) -> List[dict]:
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not self.entries:
+            return [
+                {
+                    "title": f"{keywords} - 本地搜索结果 {i + 1}",
+                    "href": f"http://localhost/search/{i + 1}",
+                    "body": f"关于“{keywords}”的本地模拟搜索摘要 {i + 1}。",
+                }
+                for i in range(max_results)
+            ]
+
+        from app.services.vector_store import chinese_tokenizer
+
+        terms = {t.strip().lower() for t in chinese_tokenizer(keywords) if t.strip()}
+        scored = []
+        for entry in self.entries:
+            text = f"{entry.get('title', '')} {entry.get('body', '')}".lower()
+            score = sum(1 for t in terms if t in text)
+            if score:
+                scored.append((score, entry))
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return [entry for _, entry in scored[:max_results]]
+
+
+def _get_backend():
+    """Search backend of the current worker thread."""
+    backend = getattr(_thread_local, "backend", None)
+    if backend is None:
+        if settings.WEB_SEARCH_BACKEND == "local":
+            backend = LocalSearchBackend()
+        else:
+            backend = DDGS(timeout=int(settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS))
+        _thread_local.backend = backend
+    return backend
+
+
 class WebSearchService:
     @staticmethod
-    def search(query: str, max_results: int = 5) -> List[Document]:
-        """
-        Perform a web search using DuckDuckGo.
-        Returns a list of Documents compatible with LangChain.
-        """
+    def _get_cached(key: tuple) -> Optional[List[Document]]:
+        with _lock:
+            cached = _result_cache.get(key)
+            if cached is None:
+                return None
+            expires_at, documents = cached
+            if expires_at < time.monotonic():
+                del _result_cache[key]
+                return None
+            _result_cache.move_to_end(key)
+            return list(documents)
+
+    @staticmethod
+    def _set_cached(key: tuple, documents: List[Document]):
+        with _lock:
+            _result_cache[key] = (time.monotonic() + settings.WEB_SEARCH_CACHE_TTL_SECONDS, documents)
+            _result_cache.move_to_end(key)
+            while len(_result_cache) > settings.WEB_SEARCH_CACHE_SIZE:
+                _result_cache.popitem(last=False)
+
+    @staticmethod
+    def _search_uncached(query: str, max_results: int) -> List[Document]:
         # Check and log proxy settings for debugging
         proxy = os.getenv("HTTP_PROXY") or os.getenv("HTTPS_PROXY")
         if proxy:
@@ -22,28 +128,34 @@ class WebSearchService:
         else:
             logger.info("No proxy configured for Web Search. Ensure direct connection to DuckDuckGo is possible.")
 
+        breaker = get_breaker("web_search")
+        try:
+            # Fail fast while DuckDuckGo is known to be down
+            breaker.before_call()
+        except CircuitOpenError:
+            logger.warning(f"Web search circuit is open. Skipping search for '{query}'.")
+            return []
+
         try:
             results = []
-            # strict=False allows fallback if strict search fails
-            with DDGS() as ddgs:
-                # text() method returns a list of dicts or generator
-                # Use backend="html" for better stability if api fails
-                search_results = ddgs.text(query, max_results=max_results, backend="html")
-                
-                if search_results:
-                    for r in search_results:
-                        # DDGS returns: {'title': ..., 'href': ..., 'body': ...}
-                        content = f"标题: {r.get('title')}\n来源: {r.get('href')}\n摘要: {r.get('body')}"
-                        doc = Document(
-                            page_content=content,
-                            metadata={
-                                "source": r.get('href'), 
-                                "title": r.get('title'), 
-                                "type": "web_search"
-                            }
-                        )
-                        results.append(doc)
-            
+            # Use backend="html" for better stability if api fails
+            search_results = _get_backend().text(query, max_results=max_results, backend="html")
+
+            if search_results:
+                for r in search_results:
+                    # DDGS returns: {'title': ..., 'href': ..., 'body': ...}
+                    content = f"标题: {r.get('title')}\n来源: {r.get('href')}\n摘要: {r.get('body')}"
+                    doc = Document(
+                        page_content=content,
+                        metadata={
+                            "source": r.get('href'),
+                            "title": r.get('title'),
+                            "type": "web_search"
+                        }
+                    )
+                    results.append(doc)
+
+            breaker.record_success()
             if not results:
                 logger.warning(f"Web search for '{query}' returned no results.")
                 return []
@@ -51,12 +163,74 @@ class WebSearchService:
             logger.info(f"Web search for '{query}' returned {len(results)} results.")
             return results
         except Exception as e:
+            breaker.record_failure()
+            # Drop the session; the next search on this thread opens a fresh one
+            _thread_local.backend = None
             logger.error(f"Web search failed: {e}")
             return []
 
+    @staticmethod
+    def _run(key: tuple, query: str, max_results: int) -> List[Document]:
+        try:
+            results = WebSearchService._search_uncached(query, max_results)
+            if results:
+                WebSearchService._set_cached(key, results)
+            return results
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+
+    @staticmethod
+    def _submit(query: str, max_results: int) -> Future:
+        """Future for the search, joining an identical search already in flight."""
+        key = (normalize_query(query), max_results)
+        executor = _get_executor()
+        with _lock:
+            future = _inflight.get(key)
+            if future is None:
+                # _run removes the entry under the same lock, so it cannot finish first
+                future = executor.submit(WebSearchService._run, key, query, max_results)
+                _inflight[key] = future
+            else:
+                logger.info(f"Joining in-flight web search for '{query}'.")
+        return future
+
+    @staticmethod
+    def search(query: str, max_results: int = 5) -> List[Document]:
+        """
+        Perform a web search using DuckDuckGo.
+        Returns a list of Documents compatible with LangChain.
+        """
+        key = (normalize_query(query), max_results)
+        cached = WebSearchService._get_cached(key)
+        if cached is not None:
+            return cached
+        try:
+            return WebSearchService._submit(query, max_results).result(
+                timeout=settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS
+            )
+        except FutureTimeoutError:
+            logger.warning(f"Web search for '{query}' timed out.")
+            return []
+
     @staticmethod
     async def asearch(query: str, max_results: int = 5) -> List[Document]:
-        """Async wrapper for search"""
-        loop = asyncio.get_running_loop()
-        # DDGS requests might block, so run in executor
-        return await loop.run_in_executor(None, partial(WebSearchService.search, query, max_results))
+        """Async search: cached, coalesced and bounded by the hard search timeout."""
+        key = (normalize_query(query), max_results)
+        cached = WebSearchService._get_cached(key)
+        if cached is not None:
+            logger.info(f"Web search cache hit for '{query}'.")
+            return cached
+
+        future = WebSearchService._submit(query, max_results)
+        try:
+            # shield: a caller giving up must not cancel the search for the others
+            return list(
+                await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)),
+                    timeout=settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS,
+                )
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Web search for '{query}' timed out.")
+            return []
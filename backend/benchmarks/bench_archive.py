@@ -0,0 +1,123 @@
+"""
+Benchmark conversation archival.
+
+Builds a temporary database of chat conversations (answers with a sources
+payload), archives the inactive share of them to compressed cold storage and
+VACUUMs, then reports the database size before and after, and the latency of
+opening a conversation: a live one (latest message page) versus an archived
+one (transparent restore + latest message page).
+
+Usage (from backend/):
+    python benchmarks/bench_archive.py
+    python benchmarks/bench_archive.py --conversations 500 --messages 40 --inactive 0.8
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy.orm import sessionmaker
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, create_db_engine
+from app.models.conversation import Conversation, Message
+from app.services.conversation_archive import archive_codec, ensure_restored
+from app.services.conversation_service import ConversationService
+from app.services.search_index import create_search_index
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+from archive_conversations import archive_all, database_size, vacuum  # noqa: E402
+
+service = ConversationService()
+SOURCES = json.dumps([{"type": "file", "chunk_id": f"c{i}", "snippet": "片段" * 60} for i in range(5)], ensure_ascii=False)
+
+
+def populate(Session, conversations: int, messages: int, inactive: float) -> list:
+    now = datetime.utcnow()
+    ids = []
+    with Session() as db:
+        for i in range(conversations):
+            idle_days = 365 if i < conversations * inactive else 1
+            updated_at = now - timedelta(days=idle_days)
+            conversation = Conversation(title=f"对话 {i}", updated_at=updated_at, message_count=messages)
+            db.add(conversation)
+            db.flush()
+            ids.append(conversation.id)
+            for j in range(messages):
+                assistant = j % 2 == 1
+                db.add(Message(
+                    conversation_id=conversation.id,
+                    role="assistant" if assistant else "user",
+                    content=("回答内容，" * 120) if assistant else f"问题 {j}",
+                    sources=SOURCES if assistant else None,
+                    created_at=updated_at - timedelta(minutes=messages - j),
+                ))
+        db.commit()
+    return ids
+
+
+def open_latency(conversation_ids: list, restore: bool) -> list:
+    async def open_all():
+        timings = []
+        for conversation_id in conversation_ids:
+            start = time.perf_counter()
+            if restore:
+                await ensure_restored(conversation_id)
+            await database.run_db(service.get_messages_page, conversation_id, settings.MESSAGE_PAGE_SIZE)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    return asyncio.run(open_all())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conversations", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=30, help="messages per conversation")
+    parser.add_argument("--inactive", type=float, default=0.8, help="share of conversations idle for a year")
+    parser.add_argument("--samples", type=int, default=50, help="conversations opened per latency measurement")
+    args = parser.parse_args()
+
+    settings.ARCHIVE_DIRECTORY = tempfile.mkdtemp()
+    engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    Base.metadata.create_all(bind=engine)
+    create_search_index(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    database.SessionLocal = Session
+
+    ids = populate(Session, args.conversations, args.messages, args.inactive)
+    vacuum(engine)
+    size_before = database_size(engine)
+
+    start = time.perf_counter()
+    results = asyncio.run(archive_all(settings.ARCHIVE_AFTER_DAYS))
+    archive_seconds = time.perf_counter() - start
+    vacuum(engine)
+    size_after = database_size(engine)
+    archive_bytes = sum(r["bytes_archived"] for r in results)
+
+    inactive = int(args.conversations * args.inactive)
+    live = open_latency(ids[inactive:][:args.samples], restore=True)
+    archived = open_latency(ids[:inactive][:args.samples], restore=True)
+
+    print(f"{args.conversations} conversations x {args.messages} messages, {len(results)} archived in {archive_seconds:.2f}s ({archive_codec()})\n")
+    print(f"database size before:  {size_before / 1024 / 1024:>8.2f} MiB")
+    print(f"database size after:   {size_after / 1024 / 1024:>8.2f} MiB")
+    print(f"archive files:         {archive_bytes / 1024 / 1024:>8.2f} MiB\n")
+    print(f"{'open conversation':<20} {'p50':>9} {'p95':>9}")
+    for name, timings in [("live", live), ("archived (restore)", archived)]:
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1] if timings else 0.0
+        print(f"{name:<20} {statistics.median(timings) * 1000:>7.2f}ms {p95 * 1000:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
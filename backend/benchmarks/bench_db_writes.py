@@ -0,0 +1,125 @@
+"""
+Benchmark concurrent chat-message writes.
+
+Each simulated client runs chat turns the way the conversation endpoint does:
+save the user message, load the history, save the assistant message (with a
+sources payload). Compares the previous setup (default rollback journal, sync
+sessions called on the event loop) with WAL + the run_db executor, reporting
+write throughput and event loop lag (how late a 10 ms timer fires, i.e. how
+long every other request would stall). Uses a temporary database.
+
+Usage (from backend/):
+    python benchmarks/bench_db_writes.py
+    python benchmarks/bench_db_writes.py --clients 200 --turns 5
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy.orm import sessionmaker
+from app.core import database
+from app.core.database import Base, create_db_engine, run_db
+from app.models.conversation import Conversation
+from app.schemas.conversation import MessageCreate
+from app.services.conversation_service import ConversationService
+
+service = ConversationService()
+SOURCES = json.dumps([{"type": "file", "chunk_id": f"c{i}", "snippet": "片段" * 60} for i in range(5)], ensure_ascii=False)
+
+
+def turn(db, conversation_id: str, i: int):
+    service.add_message(db, conversation_id, MessageCreate(role="user", content=f"问题 {i}"))
+    history = service.get_messages(db, conversation_id)
+    service.add_message(
+        db, conversation_id, MessageCreate(role="assistant", content="回答" * 100, sources=SOURCES)
+    )
+    return len(history)
+
+
+async def blocking_client(Session, conversation_id: str, turns: int):
+    for i in range(turns):
+        with Session() as db:
+            turn(db, conversation_id, i)
+        await asyncio.sleep(0)
+
+
+async def executor_client(conversation_id: str, turns: int):
+    for i in range(turns):
+        await run_db(service.add_message, conversation_id, MessageCreate(role="user", content=f"问题 {i}"), write=True)
+        await run_db(service.get_messages, conversation_id)
+        await run_db(
+            service.add_message, conversation_id,
+            MessageCreate(role="assistant", content="回答" * 100, sources=SOURCES), write=True,
+        )
+
+
+async def loop_lag(stop: asyncio.Event, lags: list, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(mode: str, clients: int, turns: int) -> dict:
+    engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/bench.db", wal=(mode == "wal+executor"))
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    database.SessionLocal = Session
+
+    with Session() as db:
+        ids = []
+        for i in range(clients):
+            conversation = Conversation(title=f"bench {i}")
+            db.add(conversation)
+            db.flush()
+            ids.append(conversation.id)
+        db.commit()
+
+    lags = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(loop_lag(stop, lags))
+    start = time.perf_counter()
+    if mode == "blocking":
+        await asyncio.gather(*(blocking_client(Session, cid, turns) for cid in ids))
+    else:
+        await asyncio.gather(*(executor_client(cid, turns) for cid in ids))
+    wall = time.perf_counter() - start
+    stop.set()
+    await ticker
+    engine.dispose()
+
+    lags.sort()
+    return {
+        "wall": wall,
+        "writes": clients * turns * 2,
+        "lag_p50": statistics.median(lags) if lags else 0.0,
+        "lag_max": lags[-1] if lags else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=100, help="concurrent chat clients")
+    parser.add_argument("--turns", type=int, default=5, help="chat turns per client")
+    args = parser.parse_args()
+
+    print(f"{args.clients} concurrent clients x {args.turns} turns (2 message writes + 1 history read per turn)\n")
+    print(f"{'mode':<14} {'writes':>7} {'wall (s)':>9} {'writes/s':>9} {'loop lag p50':>13} {'loop lag max':>13}")
+    for mode in ["blocking", "wal+executor"]:
+        r = await run(mode, args.clients, args.turns)
+        print(
+            f"{mode:<14} {r['writes']:>7} {r['wall']:>9.2f} {r['writes'] / r['wall']:>9.0f} "
+            f"{r['lag_p50'] * 1000:>11.1f}ms {r['lag_max'] * 1000:>11.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
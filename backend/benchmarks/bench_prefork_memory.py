@@ -0,0 +1,148 @@
+"""
+Benchmark worker memory: independent workers vs the preforked server.
+
+Builds a temporary knowledge base, then starts N workers two ways and
+reports each worker's RSS, PSS and private memory once it has served a few
+BM25 searches:
+  separate  every worker loads its own BM25 index, jieba dictionary and
+            rerank model (what `uvicorn --workers N` does)
+  prefork   the parent loads them once and forks the workers (app.prefork)
+
+RSS counts shared pages in full for every process, so it barely changes;
+PSS splits shared pages between the processes using them and is the number
+that adds up to the machine's memory use.
+
+Usage (from backend/, Linux):
+    python benchmarks/bench_prefork_memory.py
+    python benchmarks/bench_prefork_memory.py --workers 8 --chunks 50000
+"""
+import sys
+import os
+import argparse
+import multiprocessing
+import random
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+WORDS = [
+    "检索", "增强", "生成", "向量", "数据库", "知识库", "文档", "切分", "嵌入", "模型", "查询", "改写",
+    "重排序", "召回", "准确率", "延迟", "缓存", "索引", "分词", "语义", "关键词", "混合", "检索器", "上下文",
+    "压缩", "对话", "历史", "摘要", "流式", "输出", "熔断", "降级", "网络", "搜索", "评估", "数据集",
+]
+QUERIES = ["检索增强生成的原理", "向量数据库与关键词检索", "如何降低查询延迟", "重排序模型的作用"]
+
+
+def populate(chunks: int):
+    """Runs in a spawned process, so the benchmark process never opens Chroma before forking."""
+    from langchain_core.documents import Document
+    from app.services.vector_store import VectorStoreService
+
+    rng = random.Random(0)
+    docs = [
+        Document(
+            page_content="".join(rng.choice(WORDS) for _ in range(40)) + f"，编号{i}。",
+            metadata={"file_id": str(i // 100), "chunk_id": f"chunk-{i}"},
+        )
+        for i in range(chunks)
+    ]
+    VectorStoreService().add_documents(docs, batch_size=5000)
+
+
+def serve_searches():
+    from app.services.vector_store import VectorStoreService
+
+    for _ in range(10):
+        VectorStoreService().batch_bm25_search(QUERIES, k=4)
+
+
+def separate_worker(ready, stop):
+    # Loads what a uvicorn worker loads by the end of its first requests
+    import jieba
+    import app.main  # noqa: F401 - schema setup and routers, as in a worker
+    from app.services.context_assembler import _get_encoding
+    from app.services.rerank import RerankService
+
+    jieba.initialize()
+    RerankService()._load_model()
+    _get_encoding()
+    serve_searches()
+    ready.set()
+    stop.wait()
+
+
+def forked_worker(ready, stop):
+    import gc
+
+    gc.enable()
+    serve_searches()
+    ready.set()
+    stop.wait()
+
+
+def run_workers(context, target, workers: int):
+    stop = context.Event()
+    processes = []
+    for _ in range(workers):
+        ready = context.Event()
+        process = context.Process(target=target, args=(ready, stop), daemon=True)
+        process.start()
+        processes.append((process, ready))
+    for _, ready in processes:
+        ready.wait(300)
+
+    from app.prefork import memory_usage
+
+    usage = [memory_usage(process.pid) for process, _ in processes]
+    stop.set()
+    for process, _ in processes:
+        process.join(30)
+    return usage
+
+
+def report(title: str, usage: list, parent: dict = None):
+    mib = lambda kib: f"{kib / 1024:8.1f}"
+    print(f"\n{title}")
+    print(f"{'':10}{'RSS MiB':>9}{'PSS MiB':>9}{'private':>9}{'shared':>9}")
+    for i, u in enumerate(usage):
+        print(f"worker {i:<3}{mib(u['rss'])} {mib(u.get('pss', 0))} {mib(u['private'])} {mib(u['shared'])}")
+    total = [u.get("pss", 0) for u in usage]
+    if parent is not None:
+        print(f"{'parent':10}{mib(parent['rss'])} {mib(parent.get('pss', 0))} {mib(parent['private'])} {mib(parent['shared'])}")
+        total.append(parent.get("pss", 0))
+    print(f"{'total PSS':10}{'':9} {mib(sum(total))}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Temporary data directory: the SQLite database is relative to the working directory
+    os.chdir(tempfile.mkdtemp())
+    os.makedirs(os.path.join("data", "uploads"))
+    os.environ["CHROMA_PERSIST_DIRECTORY"] = tempfile.mkdtemp()
+    os.environ["USE_MOCK_RAG"] = "true"
+    spawn = multiprocessing.get_context("spawn")
+    process = spawn.Process(target=populate, args=(args.chunks,))
+    process.start()
+    process.join()
+    print(f"{args.chunks} chunks, {args.workers} workers")
+    import app.main  # noqa: F401 - create the schema once, before workers start together
+
+    report("separate (each worker loads its own copy)", run_workers(spawn, separate_worker, args.workers))
+
+    import gc
+    from app import prefork
+
+    gc.disable()
+    loaded = prefork.preload()
+    prefork.freeze_for_fork()
+    usage = run_workers(multiprocessing.get_context("fork"), forked_worker, args.workers)
+    report(f"prefork (loaded once in {loaded['seconds']}s, gc.freeze)", usage, prefork.memory_usage(os.getpid()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark SSE framing cost for many concurrent mock chat streams.
+
+Compares the previous framing (one json.dumps frame per token chunk) with the
+coalescing SSEEncoder. Streams come from the mock RAG pipeline, so no API key,
+vector store or network is needed.
+
+Usage (from backend/):
+    python benchmarks/bench_sse_streams.py
+    python benchmarks/bench_sse_streams.py --streams 500 --delay 0.005
+"""
+import sys
+import os
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+
+
+async def legacy_frames(events):
+    async for event in events:
+        yield f"data: {json.dumps(event)}\n\n".encode("utf-8")
+
+
+async def counted(events, stats: dict):
+    async for event in events:
+        stats["chunks"] += 1
+        yield event
+
+
+async def consume(engine, encoder, question: str) -> dict:
+    from app.services.sse_encoder import SSEEncoder
+
+    stats = {"chunks": 0}
+    events = counted(engine.astream_answer_generator(question), stats)
+    frames = legacy_frames(events) if encoder == "legacy" else SSEEncoder().encode(events)
+
+    start = time.perf_counter()
+    first_frame = None
+    count = 0
+    size = 0
+    async for frame in frames:
+        if first_frame is None:
+            first_frame = time.perf_counter() - start
+        count += 1
+        size += len(frame)
+    return {"chunks": stats["chunks"], "frames": count, "bytes": size, "first_frame": first_frame or 0.0}
+
+
+async def run(engine, encoder: str, streams: int) -> dict:
+    questions = ["RAG 的优势是什么？", "项目金额是多少？", "介绍一下这个系统"]
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    results = await asyncio.gather(
+        *(consume(engine, encoder, questions[i % len(questions)]) for i in range(streams))
+    )
+    return {
+        "wall": time.perf_counter() - wall_start,
+        "cpu": time.process_time() - cpu_start,
+        "chunks": sum(r["chunks"] for r in results),
+        "frames": sum(r["frames"] for r in results),
+        "bytes": sum(r["bytes"] for r in results),
+        "first_frame_p50": statistics.median(r["first_frame"] for r in results),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streams", type=int, default=500, help="concurrent streams")
+    parser.add_argument("--delay", type=float, default=0.005, help="mock delay between token chunks (s)")
+    parser.add_argument("--chunk-chars", type=int, default=2, help="mock characters per token chunk")
+    args = parser.parse_args()
+
+    settings.USE_MOCK_RAG = True
+    settings.MOCK_STREAM_DELAY_SECONDS = args.delay
+    settings.MOCK_STREAM_CHUNK_CHARS = args.chunk_chars
+    # The mock pipeline never reads the store; keep it out of data/
+    settings.CHROMA_PERSIST_DIRECTORY = tempfile.mkdtemp(prefix="bench_chroma_")
+
+    from app.services.rag_engine import RAGEngine
+
+    engine = RAGEngine()
+    print(
+        f"{args.streams} concurrent mock streams, {args.chunk_chars} chars/chunk, "
+        f"{args.delay * 1000:.1f} ms between chunks, flush every "
+        f"{settings.SSE_FLUSH_INTERVAL_SECONDS * 1000:.0f} ms / {settings.SSE_FLUSH_BYTES} B\n"
+    )
+    print(f"{'framing':<10} {'chunks':>8} {'frames':>8} {'KiB':>8} {'wall (s)':>9} {'cpu (s)':>8} {'chunks/s':>9} {'ttff p50':>9}")
+    for encoder in ["legacy", "coalesced"]:
+        r = await run(engine, encoder, args.streams)
+        print(
+            f"{encoder:<10} {r['chunks']:>8} {r['frames']:>8} {r['bytes'] / 1024:>8.0f} {r['wall']:>9.2f} "
+            f"{r['cpu']:>8.2f} {r['chunks'] / r['wall']:>9.0f} {r['first_frame_p50']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
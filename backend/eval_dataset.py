@@ -0,0 +1,26 @@
+"""Shared question/ground-truth pairs for RAG evaluation and benchmarks."""
+
+# Define Test Data based on "1_知识库项目分析报告.md"
+# We need: question, ground_truth (optional but good for context_recall)
+TEST_DATA = [
+    {
+        "question": "本项目的前端核心框架是什么？",
+        "ground_truth": "本项目前端核心框架采用 React 18 + Vite。",
+    },
+    {
+        "question": "RAG 系统的数据流向是怎样的？",
+        "ground_truth": "数据流向分为文档处理流和智能问答流。文档处理流包括上传、解析、切块和双路索引生成。智能问答流包括混合检索（Hybrid Search）、联网搜索兜底（Web Search Fallback）和答案生成。",
+    },
+    {
+        "question": "后端使用了哪个向量数据库？",
+        "ground_truth": "后端使用了 ChromaDB 作为本地持久化向量数据库。",
+    },
+    {
+        "question": "如何实现流式响应？",
+        "ground_truth": "系统使用 SSE (Server-Sent Events) 实现流式响应，提供实时打字机效果。",
+    },
+    {
+        "question": "混合检索的具体策略是什么？",
+        "ground_truth": "混合检索结合了向量检索 (Vector Search) 和 BM25 关键词检索，并使用 EnsembleRetriever 对结果进行加权融合 (Reciprocal Rank Fusion) 来提取 Top-K 相关文档。",
+    },
+]
@@ -10,6 +10,7 @@ from ragas.metrics import (
     answer_relevancy,
 )
 from app.services.rag_engine import RAGEngine
+from app.services.llm_gateway import LLMPriority
 from app.core.config import settings
 from openai import AsyncOpenAI
 from ragas.llms import llm_factory
@@ -52,65 +53,39 @@ async def custom_create(*args, **kwargs):
 # Bind the custom method
 client.chat.completions.create = custom_create
 
-# Define Test Data based on "1_知识库项目分析报告.md"
-# We need: question, ground_truth (optional but good for context_recall)
-TEST_DATA = [
-    {
-        "question": "本项目的前端核心框架是什么？",
-        "ground_truth": "本项目前端核心框架采用 React 18 + Vite。",
-    },
-    {
-        "question": "RAG 系统的数据流向是怎样的？",
-        "ground_truth": "数据流向分为文档处理流和智能问答流。文档处理流包括上传、解析、切块和双路索引生成。智能问答流包括混合检索（Hybrid Search）、联网搜索兜底（Web Search Fallback）和答案生成。",
-    },
-    {
-        "question": "后端使用了哪个向量数据库？",
-        "ground_truth": "后端使用了 ChromaDB 作为本地持久化向量数据库。",
-    },
-    {
-        "question": "如何实现流式响应？",
-        "ground_truth": "系统使用 SSE (Server-Sent Events) 实现流式响应，提供实时打字机效果。",
-    },
-    {
-        "question": "混合检索的具体策略是什么？",
-        "ground_truth": "混合检索结合了向量检索 (Vector Search) 和 BM25 关键词检索，并使用 EnsembleRetriever 对结果进行加权融合 (Reciprocal Rank Fusion) 来提取 Top-K 相关文档。",
-    },
-]
+# Test data lives in eval_dataset.py so benchmarks can share it without ragas
+from eval_dataset import TEST_DATA
 
 
 async def run_evaluation():
     print("Initializing RAG Engine...")
-    rag_engine = RAGEngine()
+    # Evaluation traffic yields to interactive chat in the shared LLM gateway
+    rag_engine = RAGEngine(priority=LLMPriority.EVALUATION)
 
-    questions = []
-    answers = []
-    contexts = []
-    ground_truths = []
+    questions = [item["question"] for item in TEST_DATA]
+    ground_truths = [item["ground_truth"] for item in TEST_DATA]
+    answers = [""] * len(TEST_DATA)
+    contexts = [[] for _ in TEST_DATA]
 
     print(f"Starting evaluation on {len(TEST_DATA)} test cases...")
 
-    for item in TEST_DATA:
-        question = item["question"]
-        print(f"\nProcessing Question: {question}")
+    # Batch path: one embedding call, one BM25 pass and batched reranking for all
+    # questions; generations run concurrently and finish in any order.
+    async for response in rag_engine.abatch_answer(questions):
+        index = response["index"]
+        print(f"\nProcessed Question: {response['query']}")
 
-        # Run RAG Pipeline
-        # We need to access the retrieval steps to get contexts,
-        # but RAGEngine.aget_answer returns the final result and source documents.
-        # Ragas expects contexts to be a list of strings.
-
-        response = await rag_engine.aget_answer(question)
-        answer = response["result"]
-        source_docs = response["source_documents"]
+        if "error" in response:
+            print(f"Failed: {response['error']}")
+            continue
 
-        # Extract context content
-        context_list = [doc.page_content for doc in source_docs]
+        # Ragas expects contexts to be a list of strings.
+        context_list = [doc.page_content for doc in response["source_documents"]]
 
-        questions.append(question)
-        answers.append(answer)
-        contexts.append(context_list)
-        ground_truths.append(item["ground_truth"])
+        answers[index] = response["result"]
+        contexts[index] = context_list
 
-        print(f"Generated Answer: {answer[:100]}...")
+        print(f"Generated Answer: {answers[index][:100]}...")
         print(f"Retrieved {len(context_list)} documents.")
 
     # Construct Dataset
@@ -0,0 +1,86 @@
+"""
+Move inactive conversations to compressed cold storage.
+
+Runs the same archival pass as the background job (see ARCHIVE_AFTER_DAYS)
+until no conversation idle for longer than --days is left, then VACUUMs
+SQLite so the freed pages go back to the file system, and reports the
+database size before and after. Archived conversations are restored
+transparently when opened; --restore brings one back explicitly.
+
+Usage (from backend/):
+    python migrations/archive_conversations.py [--days 90] [--no-vacuum]
+    python migrations/archive_conversations.py --restore <conversation_id>
+"""
+import sys
+import os
+import argparse
+import asyncio
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from app.core.config import settings
+
+
+def database_size(engine) -> int:
+    """Bytes in use by the database (pages, including those in the WAL)."""
+    with engine.connect() as conn:
+        page_count = conn.execute(text("PRAGMA page_count")).scalar()
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return page_count * page_size
+
+
+def vacuum(engine):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
+        conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+
+
+async def archive_all(days: float) -> list:
+    from app.services.conversation_archive import archive_inactive
+
+    results = []
+    while True:
+        batch = await archive_inactive(days, settings.ARCHIVE_BATCH_SIZE)
+        results.extend(batch)
+        if len(batch) < settings.ARCHIVE_BATCH_SIZE:
+            return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=float, default=settings.ARCHIVE_AFTER_DAYS, help="archive conversations idle for longer than this")
+    parser.add_argument("--no-vacuum", action="store_true", help="don't VACUUM afterwards")
+    parser.add_argument("--restore", metavar="CONVERSATION_ID", help="restore one archived conversation instead")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal, engine
+    from app.services.conversation_archive import archive_codec, restore_conversation
+
+    if args.restore:
+        with SessionLocal() as db:
+            restored = restore_conversation(db, args.restore)
+        print("Restored." if restored else "Conversation is not archived.")
+        return
+
+    size_before = database_size(engine)
+    results = asyncio.run(archive_all(args.days))
+    if not results:
+        print(f"No conversation idle for more than {args.days:g} days.")
+        return
+    if not args.no_vacuum:
+        vacuum(engine)
+    size_after = database_size(engine)
+
+    messages = sum(r["messages"] for r in results)
+    raw = sum(r["bytes_raw"] for r in results)
+    archived = sum(r["bytes_archived"] for r in results)
+    print(f"Archived {len(results)} conversations ({messages} messages) to {settings.ARCHIVE_DIRECTORY} ({archive_codec()}).")
+    print(f"Archive files: {raw / 1024:.1f} KiB of JSON -> {archived / 1024:.1f} KiB")
+    print(f"Database: {size_before / 1024:.1f} KiB -> {size_after / 1024:.1f} KiB"
+          + (" (not vacuumed)" if args.no_vacuum else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Backfill ingestion statistics of documents uploaded before they were recorded.
+
+The upload path now stores chunk, token and page counts (and parse/embed
+times) on each document row so the catalog never has to query the vector
+store. For older rows this reads their chunks from Chroma once and fills in
+chunk_count, token_count and page_count; times stay empty. Safe to run more
+than once: only rows without a chunk count are touched.
+
+Usage (from backend/):
+    python migrations/backfill_document_stats.py [--dry-run]
+"""
+import sys
+import os
+import argparse
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy.orm import Session
+from app.models.document import DocumentModel
+from app.services.context_assembler import count_tokens
+
+
+def chunk_stats(collection, file_id: str) -> dict:
+    data = collection.get(where={"file_id": file_id}, include=["documents", "metadatas"])
+    pages = {meta.get("page") for meta in data["metadatas"] if meta and meta.get("page") is not None}
+    return {
+        "chunk_count": len(data["documents"]),
+        "token_count": sum(count_tokens(text) for text in data["documents"]),
+        "page_count": len(pages) or (1 if data["documents"] else 0),
+    }
+
+
+def backfill_document_stats(db: Session, collection, dry_run: bool = False) -> int:
+    documents = db.query(DocumentModel).filter(DocumentModel.chunk_count.is_(None)).all()
+    for document in documents:
+        for field, value in chunk_stats(collection, str(document.id)).items():
+            setattr(document, field, value)
+    if dry_run:
+        db.rollback()
+    else:
+        db.commit()
+    return len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="count rows without writing")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal
+    from app.services.vector_store import VectorStoreService
+
+    collection = VectorStoreService().vector_db._collection
+    with SessionLocal() as db:
+        updated = backfill_document_stats(db, collection, dry_run=args.dry_run)
+    print(f"{'Would backfill' if args.dry_run else 'Backfilled'} statistics of {updated} documents.")
+
+
+if __name__ == "__main__":
+    main()
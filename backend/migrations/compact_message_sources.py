@@ -0,0 +1,125 @@
+"""
+Compact stored message sources into chunk references.
+
+Older assistant messages store the full text and metadata of every source
+chunk in messages.sources. This migration rewrites them to the compact
+reference format (chunk_id, file_id, page, score, title, snippet) used since
+sources are fetched lazily via POST /documents/chunks, then VACUUMs SQLite to
+release the space. It also stores each chunk's Chroma ID in its metadata so
+references can be resolved. Safe to run more than once.
+
+Usage (from backend/):
+    python migrations/compact_message_sources.py [--dry-run] [--skip-vectors]
+"""
+import sys
+import os
+import argparse
+import json
+from typing import Callable, Optional
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.models.conversation import Message
+from app.services.source_refs import compact_source
+
+
+def make_chunk_id_lookup(vector_service) -> Callable[[Optional[str], str], Optional[str]]:
+    """Resolve (file_id, chunk text) to a chunk ID, loading each file's chunks once."""
+    by_file = {}
+
+    def lookup(file_id: Optional[str], content: str) -> Optional[str]:
+        if not file_id:
+            return None
+        if file_id not in by_file:
+            data = vector_service.vector_db._collection.get(
+                where={"file_id": file_id}, include=["documents"]
+            )
+            by_file[file_id] = dict(zip(data["documents"], data["ids"]))
+        return by_file[file_id].get(content)
+
+    return lookup
+
+
+def compact_message_sources(
+    db: Session, chunk_id_lookup=None, batch_size: int = 200, dry_run: bool = False
+) -> dict:
+    """Rewrite every messages.sources value in the compact format."""
+    stats = {"messages": 0, "updated": 0, "bytes_before": 0, "bytes_after": 0, "unparseable": 0}
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Message)
+            .filter(Message.sources.isnot(None), Message.id > last_id)
+            .order_by(Message.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+
+        for message in rows:
+            last_id = message.id
+            stats["messages"] += 1
+            stats["bytes_before"] += len(message.sources.encode("utf-8"))
+            try:
+                sources = json.loads(message.sources)
+            except ValueError:
+                stats["unparseable"] += 1
+                stats["bytes_after"] += len(message.sources.encode("utf-8"))
+                continue
+            if not isinstance(sources, list):
+                sources = [sources]
+
+            compacted = json.dumps(
+                [compact_source(s, chunk_id_lookup) for s in sources], ensure_ascii=False
+            )
+            stats["bytes_after"] += len(compacted.encode("utf-8"))
+            if compacted != message.sources:
+                message.sources = compacted
+                stats["updated"] += 1
+
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    parser.add_argument("--skip-vectors", action="store_true", help="don't touch the vector store")
+    args = parser.parse_args()
+
+    from app.core.database import SessionLocal, engine
+
+    chunk_id_lookup = None
+    if not args.skip_vectors:
+        from app.services.vector_store import VectorStoreService
+
+        vector_service = VectorStoreService()
+        if not args.dry_run:
+            print(f"Stored chunk IDs in metadata for {vector_service.backfill_chunk_ids()} chunks.")
+        chunk_id_lookup = make_chunk_id_lookup(vector_service)
+
+    with SessionLocal() as db:
+        stats = compact_message_sources(db, chunk_id_lookup, dry_run=args.dry_run)
+
+    print(
+        f"{stats['updated']}/{stats['messages']} messages compacted: "
+        f"{stats['bytes_before'] / 1024:.1f} KiB -> {stats['bytes_after'] / 1024:.1f} KiB"
+        + (f" ({stats['unparseable']} unparseable, left as is)" if stats["unparseable"] else "")
+    )
+
+    if not args.dry_run and stats["updated"]:
+        # Give the freed pages back to the file system
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+        print("Database vacuumed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Export or import a knowledge-base snapshot, to bootstrap a new node without
+copying live database files or paying for the embeddings again.
+
+The snapshot is a directory with the chunk texts and metadata (columnar),
+the embeddings (.npy), the BM25 index, the document rows and the upload
+files, plus a manifest with the SHA-256 of each file. Import verifies the
+checksums and only loads into an empty knowledge base.
+
+Usage (from backend/):
+    python migrations/kb_snapshot.py export [--name NAME]
+    python migrations/kb_snapshot.py import PATH
+"""
+import sys
+import os
+import argparse
+import json
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import Base, engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a snapshot to SNAPSHOT_DIRECTORY")
+    export_parser.add_argument("--name", help="snapshot directory name (default: snapshot_<timestamp>)")
+    import_parser = commands.add_parser("import", help="load a snapshot into this empty node")
+    import_parser.add_argument("path", help="snapshot directory")
+    args = parser.parse_args()
+
+    from app.services import snapshot
+
+    try:
+        if args.command == "export":
+            result = snapshot.export_snapshot(args.name, progress=print)
+        else:
+            Base.metadata.create_all(bind=engine)
+            result = snapshot.import_snapshot(args.path, progress=print)
+    except snapshot.SnapshotError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Rebuild the full-text search index over messages and conversation titles.
+
+The index is created and backfilled automatically on startup; run this after
+changing the jieba dictionary so existing text is segmented the same way as
+new text. Safe to run more than once.
+
+Usage (from backend/):
+    python migrations/rebuild_search_index.py
+"""
+import sys
+import os
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.database import Base, engine
+from app.models import conversation, document  # noqa: F401 - register tables
+from app.services.search_index import create_search_index, rebuild_search_index
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    if not create_search_index(engine):
+        rebuild_search_index(engine)
+    print(f"Search index rebuilt in {time.perf_counter() - start:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
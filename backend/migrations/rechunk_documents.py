@@ -0,0 +1,38 @@
+"""
+Re-chunk the knowledge base with new splitter settings.
+
+Re-splits every processed document from the extracted-text cache stored next
+to its upload (documents uploaded before the cache existed are parsed once
+and cached), reusing the embeddings and chunk IDs of chunks whose text did
+not change, then atomically swaps the new Chroma collection in. Set
+CHUNK_SIZE / CHUNK_OVERLAP to the same values so new uploads match.
+
+Usage (from backend/):
+    python migrations/rechunk_documents.py --chunk-size 800 --chunk-overlap 100 [--workers 4]
+"""
+import sys
+import os
+import argparse
+import json
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=settings.CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=settings.CHUNK_OVERLAP)
+    parser.add_argument("--workers", type=int, default=settings.RECHUNK_WORKERS, help="parallel split processes")
+    args = parser.parse_args()
+
+    from app.services.rechunk import rechunk_documents
+
+    report = rechunk_documents(args.chunk_size, args.chunk_overlap, args.workers, progress=print)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
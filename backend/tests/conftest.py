@@ -0,0 +1,67 @@
+import sys
+import os
+import tempfile
+
+# Tests never touch the tracked database or vector store: importing app.main
+# creates and migrates the schema of whatever DATABASE_URL points at
+_test_data_directory = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_test_data_directory}/sql_app.db"
+os.environ["CHROMA_PERSIST_DIRECTORY"] = os.path.join(_test_data_directory, "chroma_db")
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, create_db_engine
+# Import models to register them with Base
+from app.models import conversation, document  # noqa: F401
+from app.services import vector_store
+
+
+def _install_temp_database():
+    engine = create_db_engine(f"sqlite:///{tempfile.mkdtemp()}/test.db")
+    Base.metadata.create_all(bind=engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return engine
+
+
+@pytest.fixture
+def temp_database():
+    """A fresh database with the app schema, installed as database.SessionLocal; yields its engine."""
+    original_session = database.SessionLocal
+    engine = _install_temp_database()
+    yield engine
+    database.SessionLocal = original_session
+    engine.dispose()
+
+
+@pytest.fixture
+def temp_node():
+    """
+    Factory for fresh nodes: each call installs a new database, an empty Chroma
+    directory and a working directory with data/uploads, and returns the
+    sessionmaker. Everything is restored after the test.
+    """
+    original_session = database.SessionLocal
+    original_chroma_directory = settings.CHROMA_PERSIST_DIRECTORY
+    original_cwd = os.getcwd()
+    engines = []
+
+    def new_node():
+        engines.append(_install_temp_database())
+        settings.CHROMA_PERSIST_DIRECTORY = tempfile.mkdtemp()
+        os.chdir(tempfile.mkdtemp())
+        os.makedirs(os.path.join("data", "uploads"))
+        vector_store._bm25_retriever_cache = None
+        return database.SessionLocal
+
+    yield new_node
+    os.chdir(original_cwd)
+    database.SessionLocal = original_session
+    settings.CHROMA_PERSIST_DIRECTORY = original_chroma_directory
+    vector_store._bm25_retriever_cache = None
+    for engine in engines:
+        engine.dispose()
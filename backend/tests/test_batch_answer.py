@@ -0,0 +1,169 @@
+import sys
+import os
+import asyncio
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.retrievers import BM25Retriever
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from app.services import vector_store
+from app.services.vector_store import bm25_batch_scores, chinese_tokenizer
+from app.services.context_assembler import count_tokens
+from app.services.deadline import Deadline
+from app.services.llm_gateway import LLMGateway, LLMPriority
+from app.services.rag_engine import RAGEngine
+from app.core.config import settings
+
+DOCS = [
+    Document(page_content="RAG 通过检索外部知识库来增强大模型的回答。", metadata={"source": "rag.txt"}),
+    Document(page_content="BM25 是一种基于词频和逆文档频率的检索算法。", metadata={"source": "bm25.txt"}),
+    Document(page_content="向量数据库存储文本的嵌入向量用于相似度检索。", metadata={"source": "vector.txt"}),
+    Document(page_content="项目预算总额为五十万元，首期款占百分之三十。", metadata={"source": "budget.txt"}),
+]
+
+class CountingEmbeddings(FakeEmbeddings):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+def test_bm25_batch_scores_match_per_query_scores():
+    retriever = BM25Retriever.from_documents(DOCS, preprocess_func=chinese_tokenizer)
+    queries = ["BM25 检索算法", "项目预算是多少", "检索 检索 向量", "完全无关的问题"]
+    tokenized = [chinese_tokenizer(q) for q in queries]
+
+    scores = bm25_batch_scores(retriever.vectorizer, tokenized)
+    assert scores.shape == (len(queries), len(DOCS))
+    for row, tokens in zip(scores, tokenized):
+        expected = retriever.vectorizer.get_scores(tokens)
+        assert all(abs(a - b) < 1e-9 for a, b in zip(row, expected))
+
+class UsageReportingChatModel(FakeListChatModel):
+    """Reports provider token usage on its answers, like ChatOpenAI."""
+
+    async def ainvoke(self, *args, **kwargs):
+        message = await super().ainvoke(*args, **kwargs)
+        return AIMessage(content=message.content, usage_metadata={"input_tokens": 30, "output_tokens": 10, "total_tokens": 40})
+
+def make_engine() -> RAGEngine:
+    LLMGateway._instance = None
+    # Keep the test's vector store away from the shared data/chroma_db
+    persist_directory = settings.CHROMA_PERSIST_DIRECTORY
+    settings.CHROMA_PERSIST_DIRECTORY = tempfile.mkdtemp()
+    try:
+        return RAGEngine(priority=LLMPriority.BATCH)
+    finally:
+        settings.CHROMA_PERSIST_DIRECTORY = persist_directory
+
+def test_answer_from_docs_is_charged_actual_usage():
+    engine = make_engine()
+    engine.llm = UsageReportingChatModel(responses=["项目预算总额为五十万元。"])
+    bucket = engine.llm_gateway.token_bucket
+    # No refill during the test, so the bucket shows exactly what was charged
+    bucket.rate = 0
+    capacity = bucket.capacity
+
+    result = asyncio.run(engine._aanswer_from_docs("项目预算多少", DOCS, Deadline()))
+
+    assert result["result"] == "项目预算总额为五十万元。"
+    # Provider-reported usage replaces the reservation
+    assert bucket.available == capacity - 40
+    assert engine.llm_gateway.metrics()["in_flight"] == 0
+    assert result["prompt_tokens"] > 0
+    assert len(result["source_documents"]) == len(DOCS)
+
+def test_answer_from_docs_packs_context_into_the_prompt_budget():
+    engine = make_engine()
+    prompts = []
+
+    class RecordingChatModel(FakeListChatModel):
+        async def ainvoke(self, messages, *args, **kwargs):
+            prompts.append(messages)
+            return await super().ainvoke(messages, *args, **kwargs)
+
+    engine.llm = RecordingChatModel(responses=["回答"])
+    engine.context_assembler.max_prompt_tokens = 300
+    long_docs = [
+        Document(page_content="项目预算的详细说明。" * 100, metadata={"source": f"long{i}.txt"})
+        for i in range(5)
+    ]
+
+    result = asyncio.run(engine._aanswer_from_docs("项目预算多少", long_docs, Deadline()))
+
+    # Only the chunks that fit are sent and reported as sources
+    assert 0 < len(result["source_documents"]) < len(long_docs)
+    assert result["prompt_tokens"] <= 300
+    assert sum(count_tokens(message.content) for message in prompts[0]) <= 300
+
+def test_batch_answer_shares_retrieval_and_bounds_concurrency():
+    vector_store._bm25_retriever_cache = None
+    engine = make_engine()
+    embeddings = CountingEmbeddings(size=32)
+    engine.vector_store_service.embeddings = embeddings
+    engine.vector_store_service.vector_db = Chroma(
+        collection_name="batch_test",
+        persist_directory=tempfile.mkdtemp(),
+        embedding_function=embeddings,
+    )
+    engine.vector_store_service.add_documents(DOCS)
+    engine.llm = FakeListChatModel(responses=["批量回答"], sleep=0.02)
+
+    running = 0
+    max_running = 0
+    original = engine._aanswer_from_docs
+
+    async def counting_answer(query, docs, deadline):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        try:
+            return await original(query, docs, deadline)
+        finally:
+            running -= 1
+
+    engine._aanswer_from_docs = counting_answer
+
+    questions = ["RAG 是什么", "BM25 怎么打分", "向量数据库做什么", "项目预算多少", "首期款比例"]
+    embeddings.calls = 0
+
+    async def main():
+        return [r async for r in engine.abatch_answer(questions, concurrency=2)]
+
+    try:
+        results = asyncio.run(main())
+        bm25_top = engine.vector_store_service.batch_bm25_search(questions, k=1)
+    finally:
+        vector_store._bm25_retriever_cache = None
+
+    # One embedding call for the whole batch
+    assert embeddings.calls == 1
+    assert max_running == 2
+    assert sorted(r["index"] for r in results) == list(range(len(questions)))
+    for r in results:
+        assert "error" not in r, r
+        assert r["query"] == questions[r["index"]]
+        assert r["result"] == "批量回答"
+        assert r["source_documents"]
+
+    # BM25 top hit of each question comes from the vectorized pass
+    assert bm25_top[1][0].metadata["source"] == "bm25.txt"
+    assert bm25_top[3][0].metadata["source"] == "budget.txt"
+
+def teardown_function():
+    LLMGateway._instance = None
+
+if __name__ == "__main__":
+    test_bm25_batch_scores_match_per_query_scores()
+    test_answer_from_docs_is_charged_actual_usage()
+    teardown_function()
+    test_answer_from_docs_packs_context_into_the_prompt_budget()
+    teardown_function()
+    test_batch_answer_shares_retrieval_and_bounds_concurrency()
+    print("All batch answer tests passed.")
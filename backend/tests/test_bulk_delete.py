@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_community.retrievers import BM25Retriever
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.models.document import DocumentModel
+from app.services import corpus_version, vector_store
+from app.services.vector_store import VectorStoreService, chinese_tokenizer, drop_files_from_bm25_cache
+
+def make_chunks(files: int = 4, per_file: int = 3):
+    return [
+        Document(
+            page_content=f"文件{f}的第{c}段：检索增强生成与向量数据库，关键词{f * 10 + c}",
+            metadata={"file_id": str(f), "chunk_id": f"{f}-{c}"},
+        )
+        for f in range(1, files + 1)
+        for c in range(per_file)
+    ]
+
+def test_dropping_files_matches_a_rebuilt_index():
+    chunks = make_chunks()
+    vector_store._bm25_retriever_cache = BM25Retriever.from_documents(chunks, preprocess_func=chinese_tokenizer)
+    drop_files_from_bm25_cache(["2", "3", "404"])
+
+    remaining = [c for c in chunks if c.metadata["file_id"] not in ("2", "3")]
+    rebuilt = BM25Retriever.from_documents(remaining, preprocess_func=chinese_tokenizer)
+    updated = vector_store._bm25_retriever_cache
+    assert [d.metadata["chunk_id"] for d in updated.docs] == [d.metadata["chunk_id"] for d in remaining]
+    query = chinese_tokenizer("文件4 检索 关键词41")
+    assert list(updated.vectorizer.get_scores(query)) == list(rebuilt.vectorizer.get_scores(query))
+
+    drop_files_from_bm25_cache(["1", "4"])
+    assert vector_store._bm25_retriever_cache is None
+
+def test_bulk_delete_endpoint(temp_node):
+    from app.main import app
+
+    Session = temp_node()
+    vector_service = VectorStoreService()
+    vector_service.add_documents(make_chunks())
+    with Session() as db:
+        for f in range(1, 5):
+            db.add(DocumentModel(id=f, filename=f"f{f}.txt", status="processed"))
+        db.commit()
+    for f in range(1, 5):
+        with open(os.path.join("data", "uploads", f"{f}_f{f}.txt"), "w") as out:
+            out.write("x")
+    # This worker is at the current corpus version, so the index it builds is kept
+    with Session() as db:
+        corpus_version.sync(db)
+    vector_service.get_bm25_retriever()
+
+    collection_type = type(vector_service.vector_db._collection)
+    original_delete = collection_type.delete
+    calls = []
+
+    def counting_delete(self, *args, **kwargs):
+        calls.append(kwargs.get("where"))
+        return original_delete(self, *args, **kwargs)
+
+    collection_type.delete = counting_delete
+    try:
+        client = TestClient(app)
+        response = client.post("/api/v1/documents/bulk-delete", json={"ids": [1, 3, 3, 99]})
+    finally:
+        collection_type.delete = original_delete
+
+    assert response.status_code == 200
+    assert response.json() == {"deleted": [1, 3], "missing": [99]}
+    assert calls == [{"file_id": {"$in": ["1", "3"]}}]
+    remaining = vector_service.vector_db._collection.get(include=["metadatas"])["metadatas"]
+    assert {m["file_id"] for m in remaining} == {"2", "4"}
+    assert {d.metadata["file_id"] for d in vector_store._bm25_retriever_cache.docs} == {"2", "4"}
+    with Session() as db:
+        assert [d.id for d in db.query(DocumentModel).order_by(DocumentModel.id)] == [2, 4]
+    assert sorted(os.listdir(os.path.join("data", "uploads"))) == ["2_f2.txt", "4_f4.txt"]
+
+    too_many = client.post("/api/v1/documents/bulk-delete", json={"ids": list(range(settings.MAX_BULK_DELETE + 1))})
+    assert too_many.status_code == 400
+
+def teardown_function():
+    vector_store._bm25_retriever_cache = None
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,237 @@
+import sys
+import os
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services import circuit_breaker
+from app.services.circuit_breaker import (
+    CLOSED, HALF_OPEN, OPEN, BreakerEmbeddings, CircuitBreaker, CircuitOpenError, get_breaker,
+)
+from app.services.llm_gateway import LLMGateway
+
+_original_breakers = dict(circuit_breaker._breakers)
+_original_gateway = LLMGateway._instance
+
+class FakeProvider:
+    """Local stand-in for the OpenAI API that can be switched into failure mode."""
+
+    def __init__(self):
+        self.fail = False
+        self.hits = {"chat": 0, "embeddings": 0}
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.endswith("/chat/completions"):
+                    provider.hits["chat"] += 1
+                    payload = {
+                        "id": "chatcmpl-local",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", "local"),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "本地回答"},
+                            "finish_reason": "stop",
+                        }],
+                        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                    }
+                else:
+                    provider.hits["embeddings"] += 1
+                    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+                    payload = {
+                        "object": "list",
+                        "data": [
+                            {"object": "embedding", "index": i, "embedding": [0.1, 0.2, 0.3]}
+                            for i in range(len(inputs))
+                        ],
+                        "model": body.get("model", "local"),
+                        "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                    }
+
+                if provider.fail:
+                    self.send_response(500)
+                    payload = {"error": {"message": "injected failure", "type": "server_error"}}
+                else:
+                    self.send_response(200)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def reset_breakers(**overrides):
+    circuit_breaker._breakers.clear()
+    LLMGateway._instance = None
+    for name in ("llm", "embedding", "web_search"):
+        circuit_breaker._breakers[name] = CircuitBreaker(name, **overrides)
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("test", failure_rate_threshold=0.5, min_calls=4, open_seconds=0.1)
+    breaker.record_success()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED  # below min_calls
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    try:
+        breaker.before_call()
+        assert False, "Expected CircuitOpenError"
+    except CircuitOpenError:
+        pass
+    assert breaker.snapshot()["rejected_total"] == 1
+
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+    # Only one probe at a time
+    assert breaker.is_open
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 1
+
+def test_llm_breaker_fails_fast_and_recovers():
+    from langchain_openai import ChatOpenAI
+
+    reset_breakers(failure_rate_threshold=0.5, min_calls=3, open_seconds=0.3)
+    provider = FakeProvider()
+    llm = ChatOpenAI(
+        model_name="local", openai_api_key="sk-local", openai_api_base=provider.base_url,
+        max_retries=0, timeout=5,
+    )
+    gateway = LLMGateway()
+
+    async def main():
+        assert (await gateway.ainvoke("你好", llm=llm)).content == "本地回答"
+
+        provider.fail = True
+        # 1 success + 2 failures reaches min_calls at a 66% failure rate
+        for _ in range(2):
+            try:
+                await gateway.ainvoke("你好", llm=llm)
+                assert False, "Expected provider error"
+            except CircuitOpenError:
+                raise
+            except Exception:
+                pass
+        assert get_breaker("llm").state == OPEN
+        hits = provider.hits["chat"]
+
+        # While open, calls are rejected without touching the provider
+        start = time.monotonic()
+        try:
+            await gateway.ainvoke("你好", llm=llm)
+            assert False, "Expected CircuitOpenError"
+        except CircuitOpenError:
+            pass
+        assert time.monotonic() - start < 0.05
+        assert provider.hits["chat"] == hits
+
+        # Provider recovers: the half-open probe closes the circuit
+        provider.fail = False
+        await asyncio.sleep(0.35)
+        assert (await gateway.ainvoke("你好", llm=llm)).content == "本地回答"
+        assert get_breaker("llm").state == CLOSED
+
+    try:
+        asyncio.run(main())
+    finally:
+        provider.close()
+    assert gateway.metrics()["in_flight"] == 0
+
+def test_embedding_breaker_switches_to_bm25_only():
+    import tempfile
+    from langchain_openai import OpenAIEmbeddings
+    from langchain_community.retrievers import BM25Retriever
+    from langchain_core.documents import Document
+    from app.services import vector_store
+    from app.services.vector_store import VectorStoreService
+    from langchain_community.vectorstores import Chroma
+
+    reset_breakers(failure_rate_threshold=0.5, min_calls=2, open_seconds=30)
+    provider = FakeProvider()
+    embeddings = BreakerEmbeddings(
+        OpenAIEmbeddings(
+            model="local", openai_api_key="sk-local", openai_api_base=provider.base_url,
+            check_embedding_ctx_length=False, max_retries=0, timeout=5,
+        ),
+        get_breaker("embedding"),
+    )
+
+    service = VectorStoreService.__new__(VectorStoreService)
+    service.embeddings = embeddings
+    service.vector_db = Chroma(
+        collection_name="breaker_test",
+        persist_directory=tempfile.mkdtemp(),
+        embedding_function=embeddings,
+    )
+    vector_store._bm25_retriever_cache = None
+
+    try:
+        service.vector_db.add_documents([
+            Document(page_content="熔断器在依赖故障时快速失败", metadata={"source": "a.txt"}),
+            Document(page_content="BM25 是一种词法检索算法", metadata={"source": "b.txt"}),
+            Document(page_content="向量检索依赖嵌入模型", metadata={"source": "c.txt"}),
+        ])
+        assert provider.hits["embeddings"] == 1
+
+        provider.fail = True
+        # 1 success + 1 failure reaches min_calls at a 50% failure rate
+        for _ in range(1):
+            try:
+                embeddings.embed_query("熔断器")
+                assert False, "Expected provider error"
+            except CircuitOpenError:
+                raise
+            except Exception:
+                pass
+        assert get_breaker("embedding").state == OPEN
+
+        hits = provider.hits["embeddings"]
+        retriever = service.get_retriever(search_type="hybrid", k=1)
+        assert isinstance(retriever, BM25Retriever)
+        docs = retriever.invoke("熔断器")
+        assert docs and docs[0].metadata["source"] == "a.txt"
+        assert provider.hits["embeddings"] == hits
+    finally:
+        vector_store._bm25_retriever_cache = None
+        provider.close()
+
+def teardown_function():
+    # Later tests must not inherit an open breaker or a gateway bound to the test breakers
+    circuit_breaker._breakers.clear()
+    circuit_breaker._breakers.update(_original_breakers)
+    LLMGateway._instance = _original_gateway
+
+if __name__ == "__main__":
+    test_breaker_opens_half_opens_and_closes()
+    teardown_function()
+    test_llm_breaker_fails_fast_and_recovers()
+    teardown_function()
+    test_embedding_breaker_switches_to_bm25_only()
+    teardown_function()
+    print("All circuit breaker tests passed.")
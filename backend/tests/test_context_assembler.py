@@ -0,0 +1,55 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.documents import Document
+from app.services.context_assembler import ContextAssembler, count_tokens
+
+TEMPLATE = "参考文档：\n{context}\n\n用户问题：{question}"
+
+def test_merge_overlapping_adjacent_chunks():
+    text = "".join(f"第{i}句：RAG 结合了检索和生成。" for i in range(40))
+    first = Document(page_content=text[:300], metadata={"file_id": "1", "page": 0})
+    second = Document(page_content=text[250:600], metadata={"file_id": "1", "page": 0})
+    other_page = Document(page_content=text[250:600], metadata={"file_id": "1", "page": 1})
+
+    merged = ContextAssembler.merge_overlapping([first, second, other_page])
+    assert len(merged) == 2
+    assert merged[0].page_content == text[:600]
+    assert merged[0].metadata["merged_chunks"] == 2
+
+def test_highest_scores_packed_first_within_budget():
+    docs = [
+        Document(page_content="低分片段。" * 200, metadata={"file_id": "1", "relevance_score": 0.1}),
+        Document(page_content="高分片段。" * 200, metadata={"file_id": "2", "relevance_score": 0.9}),
+        Document(page_content="中分片段。" * 200, metadata={"file_id": "3", "relevance_score": 0.5}),
+    ]
+    budget = count_tokens(docs[1].page_content) + 200
+    assembler = ContextAssembler(max_prompt_tokens=budget, history_token_budget=0)
+
+    result = assembler.assemble("系统提示", TEMPLATE, "问题", docs)
+    assert result["docs"][0].metadata["file_id"] == "2"
+    assert result["prompt_tokens"] <= budget
+    # The low-score chunk never makes it in
+    assert all(doc.metadata["file_id"] != "1" for doc in result["docs"])
+
+def test_long_history_is_trimmed():
+    history = [
+        {"role": "user", "content": "第一个问题"},
+        {"role": "assistant", "content": "很长的回答。" * 2000},
+        {"role": "user", "content": "第二个问题"},
+        {"role": "assistant", "content": "简短回答"},
+    ]
+    assembler = ContextAssembler(max_prompt_tokens=4000, history_token_budget=600)
+    packed, used = assembler.pack_history(history, 600)
+    assert used <= 600
+    assert packed[-1]["content"] == "简短回答"
+    assert sum(count_tokens(m["content"]) for m in packed) < count_tokens(history[1]["content"])
+
+if __name__ == "__main__":
+    test_merge_overlapping_adjacent_chunks()
+    test_highest_scores_packed_first_within_budget()
+    test_long_history_is_trimmed()
+    print("All context assembler tests passed.")
@@ -0,0 +1,82 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.services import vector_store
+from app.services.context_compressor import ContextCompressor, split_sentences
+from app.services.vector_store import QueryEmbeddingCache
+
+SENTENCES = ["后端使用 FastAPI 提供接口。", "向量数据库是 ChromaDB。", "会议每周举行一次。", "团队共有五名成员。", "项目于去年启动。"]
+
+class QueryOnlyEmbeddings(Embeddings):
+    """Embeds queries only: compression must not embed sentences."""
+
+    def embed_documents(self, texts):
+        raise AssertionError("sentences were embedded")
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+class StoredVectors:
+    def get_chunk_embeddings(self, chunk_ids):
+        vectors = {"near": [1.0, 0.1], "far": [0.2, 1.0]}
+        return {chunk_id: vectors[chunk_id] for chunk_id in chunk_ids}
+
+def test_split_sentences():
+    text = "后端使用 FastAPI。向量库是 ChromaDB！\n前端用 React? Yes. Version 3.5 is used."
+    assert split_sentences(text) == [
+        "后端使用 FastAPI。",
+        "向量库是 ChromaDB！",
+        "前端用 React?",
+        "Yes.",
+        "Version 3.5 is used.",
+    ]
+
+def test_bm25_compression_keeps_relevant_sentences_and_metadata():
+    doc = Document(
+        page_content="项目于去年启动。团队共有五名成员。后端使用了 ChromaDB 作为向量数据库。会议每周举行一次。前端使用 React 构建。",
+        metadata={"file_id": "7", "filename": "report.md", "page": 2},
+    )
+    compressor = ContextCompressor(mode="bm25")
+    compressed = compressor.compress("后端使用了哪个向量数据库？", [doc])
+
+    assert len(compressed) == 1
+    assert "ChromaDB" in compressed[0].page_content
+    assert "会议每周举行一次" not in compressed[0].page_content
+    assert len(compressed[0].page_content) < len(doc.page_content)
+    # Source attribution survives compression
+    assert compressed[0].metadata["file_id"] == "7"
+    assert compressed[0].metadata["page"] == 2
+    assert compressed[0].metadata["compressed"] is True
+
+def test_compression_off_returns_docs_unchanged():
+    docs = [Document(page_content="一句话。另一句话。第三句话。", metadata={})]
+    assert ContextCompressor(mode="off").compress("问题", docs) is docs
+
+def test_embedding_mode_reuses_retrieval_vectors():
+    docs = [Document(page_content="".join(SENTENCES), metadata={"chunk_id": chunk_id}) for chunk_id in ("near", "far")]
+    compressor = ContextCompressor(vector_store=StoredVectors(), mode="embedding")
+    query = "后端用的什么向量数据库？"
+
+    # Query not embedded by retrieval: lexical scoring only, same as bm25 mode
+    vector_store._query_embedding_cache.clear()
+    assert compressor.keep_ratios(query, docs) == ContextCompressor(mode="bm25").keep_ratios(query, docs)
+
+    # After retrieval embedded it, the stored chunk vectors size each chunk's share
+    QueryEmbeddingCache(QueryOnlyEmbeddings()).embed_query(query)
+    near_ratio, far_ratio = compressor.keep_ratios(query, docs)
+    assert far_ratio < near_ratio
+    near, far = compressor.compress(query, docs)
+    assert "ChromaDB" in near.page_content and len(far.page_content) <= len(near.page_content)
+    vector_store._query_embedding_cache.clear()
+
+if __name__ == "__main__":
+    test_split_sentences()
+    test_bm25_compression_keeps_relevant_sentences_and_metadata()
+    test_compression_off_returns_docs_unchanged()
+    test_embedding_mode_reuses_retrieval_vectors()
+    print("All context compressor tests passed.")
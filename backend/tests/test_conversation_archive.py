@@ -0,0 +1,138 @@
+import sys
+import os
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.core import database
+from app.core.config import settings
+from app.models.conversation import Conversation, Message
+from app.services.conversation_archive import (
+    acquire_lease, archive_conversation, archive_inactive, archive_path, restore_conversation,
+)
+from app.services.conversation_service import ConversationService
+from app.services.search_index import create_search_index, search
+
+_original_archive_directory = settings.ARCHIVE_DIRECTORY
+
+def add_conversations(engine):
+    settings.ARCHIVE_DIRECTORY = tempfile.mkdtemp()
+    create_search_index(engine)
+    Session = database.SessionLocal
+    now = datetime.utcnow()
+    with Session() as db:
+        for i, (cid, idle_days) in enumerate([("old", 200), ("recent", 1)]):
+            db.add(Conversation(id=cid, title=cid, updated_at=now - timedelta(days=idle_days), message_count=2,
+                                last_message_preview="回答", summary_message_id=2 * i + 1))
+            db.add(Message(id=2 * i + 1, conversation_id=cid, role="user", content="检索增强生成是什么",
+                           created_at=now - timedelta(days=idle_days, minutes=1)))
+            db.add(Message(id=2 * i + 2, conversation_id=cid, role="assistant", content="回答", sources='[{"chunk_id": "c1"}]',
+                           created_at=now - timedelta(days=idle_days)))
+        db.commit()
+    return Session
+
+def snapshot(db, conversation_id):
+    conversation = db.get(Conversation, conversation_id)
+    messages = [(m.id, m.role, m.content, m.sources, m.created_at)
+                for m in ConversationService().get_messages(db, conversation_id)]
+    return conversation.updated_at, conversation.summary_message_id, messages
+
+def test_archive_inactive_and_restore_round_trip(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        before = snapshot(db, "old")
+
+    archived = asyncio.run(archive_inactive(older_than_days=90))
+    assert [r["conversation_id"] for r in archived] == ["old"]
+    with Session() as db:
+        stub = db.get(Conversation, "old")
+        assert stub.archived_at is not None and os.path.exists(archive_path(stub.archive_file))
+        # The stub keeps what the conversation list shows; messages leave SQLite but stay searchable
+        assert stub.message_count == 2 and stub.last_message_preview == "回答"
+        assert db.query(Message).filter(Message.conversation_id == "old").count() == 0
+        hits = {h["conversation_id"]: h for h in search(db, "检索", limit=10)["messages"]}
+        assert set(hits) == {"old", "recent"}
+        assert hits["old"]["archived"] and not hits["recent"]["archived"]
+        assert hits["old"]["message_id"] == 1 and hits["old"]["snippet"] == "检索增强生成是什么"
+        archive_file = stub.archive_file
+
+        assert restore_conversation(db, "old")
+        assert not restore_conversation(db, "old")
+        db.expire_all()
+        assert snapshot(db, "old") == before
+        hits = search(db, "检索", limit=10)["messages"]
+        assert len(hits) == 2 and not any(h["archived"] for h in hits)
+    assert not os.path.exists(archive_path(archive_file))
+
+def test_restore_remaps_reused_message_ids(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        old_ids = [m.id for m in ConversationService().get_messages(db, "old")]
+        assert archive_conversation(db, "old")
+        # Without AUTOINCREMENT SQLite may hand out an archived ID again
+        db.add(Message(id=old_ids[0], conversation_id="recent", role="user", content="新消息"))
+        db.commit()
+        assert restore_conversation(db, "old")
+        db.expire_all()
+        restored = ConversationService().get_messages(db, "old")
+        assert [m.content for m in restored] == ["检索增强生成是什么", "回答"]
+        assert old_ids[0] not in [m.id for m in restored]
+        assert db.get(Conversation, "old").summary_message_id == restored[0].id
+        # Indexed once, under the new IDs
+        hits = [h for h in search(db, "检索", limit=10)["messages"] if h["conversation_id"] == "old"]
+        assert [h["message_id"] for h in hits] == [restored[0].id] and not hits[0]["archived"]
+
+def test_deleting_archived_conversation_drops_its_search_rows(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        assert archive_conversation(db, "old")
+        db.delete(db.get(Conversation, "old"))
+        db.commit()
+        assert {h["conversation_id"] for h in search(db, "检索", limit=10)["messages"]} == {"recent"}
+
+def test_archive_lease_is_held_by_one_worker(temp_database):
+    Session = database.SessionLocal
+    with Session() as db:
+        assert acquire_lease(db, "archive", "worker-1", 60)
+        assert not acquire_lease(db, "archive", "worker-2", 60)
+        # The holder renews its lease
+        assert acquire_lease(db, "archive", "worker-1", 60)
+        # An expired lease is taken over
+        assert acquire_lease(db, "archive", "worker-1", -1)
+        assert acquire_lease(db, "archive", "worker-2", 60)
+        assert not acquire_lease(db, "archive", "worker-1", 60)
+
+def test_active_conversation_is_not_archived(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        # Became active after it was selected for archival
+        assert archive_conversation(db, "recent", cutoff=datetime.utcnow() - timedelta(days=90)) is None
+        assert db.get(Conversation, "recent").archived_at is None
+
+def test_opening_archived_conversation_restores_it(temp_database):
+    from app.main import app
+
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        archive_conversation(db, "old")
+    client = TestClient(app)
+    response = client.get("/api/v1/conversations/old")
+    assert response.status_code == 200
+    assert [m["role"] for m in response.json()["messages"]] == ["user", "assistant"]
+
+    with Session() as db:
+        archive_conversation(db, "old")
+        archive_file = db.get(Conversation, "old").archive_file
+    assert client.delete("/api/v1/conversations/old").status_code == 200
+    assert not os.path.exists(archive_path(archive_file))
+
+def teardown_function():
+    settings.ARCHIVE_DIRECTORY = _original_archive_directory
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,113 @@
+import sys
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from app.core import database
+from app.core.database import Base, create_missing_columns, create_missing_indexes
+from app.models.conversation import Conversation, Message
+from app.schemas.conversation import ConversationCreate, MessageCreate
+from app.services.conversation_service import ConversationService, backfill_conversation_stats
+
+def add_conversations(conversations: int):
+    Session = database.SessionLocal
+    start = datetime(2024, 1, 1)
+    with Session() as db:
+        for i in range(conversations):
+            # Pairs share updated_at so the id breaks ties
+            db.add(Conversation(id=f"c{i:03d}", title=f"t{i}", updated_at=start + timedelta(minutes=i // 2)))
+        db.commit()
+    return Session
+
+def test_keyset_pages_cover_every_conversation_once(temp_database):
+    Session = add_conversations(25)
+    service = ConversationService()
+    seen, before = [], None
+    with Session() as db:
+        while True:
+            rows, has_more, before = service.get_conversations_page(db, 10, before)
+            seen.extend(row.id for row in rows)
+            if not has_more:
+                assert before is None
+                break
+    assert len(seen) == 25 and len(set(seen)) == 25
+    assert seen == sorted(seen, reverse=True)
+
+def test_stats_are_maintained_on_write(temp_database):
+    Session = database.SessionLocal
+    service = ConversationService()
+    with Session() as db:
+        conversation = service.create_conversation(db, ConversationCreate(title="New Chat"))
+        cid = conversation.id
+        service.add_message(db, cid, MessageCreate(role="user", content="第一个问题"))
+        last = service.add_message(db, cid, MessageCreate(role="assistant", content="回答\n" + "很长" * 100))
+        db.refresh(conversation)
+        assert conversation.message_count == 2
+        assert conversation.last_message_preview.startswith("回答 很长") and conversation.last_message_preview.endswith("...")
+        updated_at = conversation.updated_at
+
+        assert service.delete_message(db, cid, last.id)
+        db.refresh(conversation)
+        assert conversation.message_count == 1 and conversation.last_message_preview == "第一个问题"
+        # Deleting does not move the conversation in the list
+        assert conversation.updated_at == updated_at
+
+def test_backfill_existing_conversations(temp_database):
+    Session = database.SessionLocal
+    with Session() as db:
+        db.add(Conversation(id="old", title="t"))
+        db.add(Message(conversation_id="old", role="user", content="q"))
+        db.add(Message(conversation_id="old", role="assistant", content="a"))
+        db.commit()
+        # As left by ADD COLUMN on a database from before the stats existed
+        db.execute(text("UPDATE conversations SET message_count = NULL"))
+        db.commit()
+    assert backfill_conversation_stats(temp_database) == 1
+    assert backfill_conversation_stats(temp_database) == 0
+    with Session() as db:
+        conversation = db.get(Conversation, "old")
+        assert conversation.message_count == 2 and conversation.last_message_preview == "a"
+
+def test_list_query_uses_covering_index(temp_database):
+    add_conversations(5)
+    with temp_database.connect() as conn:
+        plan = [row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, title, created_at, updated_at, message_count, last_message_preview "
+            "FROM conversations WHERE (updated_at, id) < ('2024-01-01 00:02:00.000000', 'c004') "
+            "ORDER BY updated_at DESC, id DESC LIMIT 11"
+        ))]
+    assert len(plan) == 1 and "USING COVERING INDEX ix_conversations_list" in plan[0], plan
+
+def test_missing_columns_and_index_on_old_database():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE conversations (id VARCHAR PRIMARY KEY, title VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+    # Same order as app startup
+    Base.metadata.create_all(bind=engine)
+    create_missing_columns(engine)
+    create_missing_indexes(engine)
+    with engine.connect() as conn:
+        names = {row[0] for row in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert "ix_conversations_list" in names
+
+def test_list_endpoint(temp_database):
+    from app.main import app
+
+    add_conversations(5)
+    client = TestClient(app)
+    page = client.get("/api/v1/conversations/", params={"limit": 3}).json()
+    assert [c["id"] for c in page["conversations"]] == ["c004", "c003", "c002"] and page["has_more"]
+    rest = client.get("/api/v1/conversations/", params={"before": page["next_before"]}).json()
+    assert [c["id"] for c in rest["conversations"]] == ["c001", "c000"] and not rest["has_more"]
+    assert rest["conversations"][0]["message_count"] == 0
+    assert client.get("/api/v1/conversations/", params={"before": "garbage"}).status_code == 400
+    assert client.get("/api/v1/conversations/", params={"limit": 0}).status_code == 400
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,97 @@
+import sys
+import os
+import asyncio
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from app.core import database
+from app.core.config import settings
+from app.core.database import create_missing_columns
+from app.models.conversation import Conversation, Message
+from app.services.context_assembler import ContextAssembler, count_tokens
+from app.services.conversation_memory import ConversationMemory
+from app.services.conversation_service import ConversationService
+from app.services.query_rewriter import QueryRewriter
+
+def add_messages(messages: int):
+    Session = database.SessionLocal
+    with Session() as db:
+        db.add(Conversation(id="conv", title="t"))
+        for i in range(messages):
+            db.add(Message(conversation_id="conv", role="user" if i % 2 == 0 else "assistant", content=f"m{i}"))
+        db.commit()
+    return Session
+
+def test_missing_summary_columns_are_added():
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/old.db")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE conversations (id VARCHAR PRIMARY KEY, title VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+    create_missing_columns(engine)
+    columns = {c["name"] for c in inspect(engine).get_columns("conversations")}
+    assert {"summary", "summary_message_id"} <= columns
+    create_missing_columns(engine)  # idempotent
+
+def test_summary_folds_messages_outside_recent_window(temp_database):
+    Session = add_messages(10)
+    llm = FakeListChatModel(responses=["摘要一", "摘要二"])
+    memory = ConversationMemory(llm)
+
+    async def main():
+        assert await memory.update("conv")
+        # Nothing left outside the recent window
+        assert not await memory.update("conv")
+
+    asyncio.run(main())
+    with Session() as db:
+        conversation = db.get(Conversation, "conv")
+        covered = db.query(Message).filter(Message.id == conversation.summary_message_id).one()
+        assert conversation.summary == "摘要一" and covered.content == "m5"
+
+        # The chat path reads the summary plus only the messages after it
+        history = ConversationService().get_recent_history(
+            db, "conv", settings.CHAT_HISTORY_WINDOW, after_id=conversation.summary_message_id
+        )
+        assert [m["content"] for m in history] == ["m6", "m7", "m8", "m9"]
+
+    prompt = memory.build_prompt("摘要一", [{"role": "user", "content": "m6"}])
+    assert "摘要一" in prompt and "用户: m6" in prompt
+
+def test_schedule_update_runs_once_per_conversation(temp_database):
+    add_messages(10)
+    llm = FakeListChatModel(responses=["摘要"])
+    memory = ConversationMemory(llm)
+    original = ConversationMemory.enabled
+    ConversationMemory.enabled = staticmethod(lambda: True)
+    try:
+        async def main():
+            task = memory.schedule_update("conv")
+            assert task is not None
+            assert memory.schedule_update("conv") is None  # already running
+            await task
+        asyncio.run(main())
+    finally:
+        ConversationMemory.enabled = original
+
+def test_prompt_size_stays_bounded():
+    assembler = ContextAssembler()
+    summary = "很长的摘要" * 1000
+    sizes = []
+    for turns in [4, 40, 400]:
+        history = [{"role": "user", "content": "问题" * 2000} for _ in range(turns)]
+        packed, tokens = assembler.pack_history(history, settings.HISTORY_TOKEN_BUDGET, summary)
+        assert packed[0]["role"] == "system" and "此前对话摘要" in packed[0]["content"]
+        assert tokens <= settings.HISTORY_TOKEN_BUDGET
+        sizes.append(tokens)
+    assert len(set(sizes)) == 1
+
+    prompt = QueryRewriter.build_prompt("它呢？", [{"role": "assistant", "content": "答" * 20000}], summary)
+    assert "此前对话摘要" in prompt
+    assert count_tokens(prompt) < settings.SUMMARY_MAX_TOKENS + settings.HISTORY_MESSAGE_MAX_TOKENS + 200
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,136 @@
+import sys
+import os
+import multiprocessing
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, create_db_engine
+from app.services import corpus_version, rag_engine, vector_store
+
+def test_sync_drops_caches_only_after_another_process_changes_the_corpus(temp_database):
+    Session = database.SessionLocal
+    corpus_version._seen_version = None
+    with Session() as db:
+        assert corpus_version.read_version(db) == 0
+        assert corpus_version.sync(db)
+        assert not corpus_version.sync(db)
+
+        # A change made by this process keeps its (already updated) caches
+        vector_store._bm25_retriever_cache = "index"
+        rag_engine._answer_cache["q"] = {"answer": "a", "docs": []}
+        assert corpus_version.bump_version(db) == 1
+        assert not corpus_version.sync(db)
+        assert vector_store._bm25_retriever_cache == "index" and "q" in rag_engine._answer_cache
+
+        # A change committed by another process drops them
+        db.execute(text("UPDATE corpus_state SET version = version + 1"))
+        db.commit()
+        assert corpus_version.sync(db)
+        assert vector_store._bm25_retriever_cache is None and not rag_engine._answer_cache
+        assert corpus_version.read_version(db) == 2
+
+def worker(connection, workdir: str, chroma_directory: str):
+    """One API worker process: runs commands from the test against the shared database and Chroma."""
+    os.chdir(workdir)
+    settings.CHROMA_PERSIST_DIRECTORY = chroma_directory
+    # Fake embeddings whatever API key the parent process was given
+    settings.USE_MOCK_RAG = True
+    engine = create_db_engine(f"sqlite:///{os.path.join(workdir, 'shared.db')}")
+    Base.metadata.create_all(bind=engine)
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.services.vector_store import VectorStoreService
+
+    client = TestClient(app)
+    connection.send("ready")
+    while True:
+        command, argument = connection.recv()
+        if command == "stop":
+            break
+        if command == "upload":
+            name, content = argument
+            response = client.post("/api/v1/rag/upload", files={"file": (name, content.encode("utf-8"), "text/plain")})
+            connection.send(response.json()["doc_id"])
+        elif command == "delete":
+            response = client.post("/api/v1/documents/bulk-delete", json={"ids": argument})
+            connection.send(response.json()["deleted"])
+        elif command == "cache_answer":
+            rag_engine._answer_cache[argument] = {"answer": "cached", "docs": []}
+            connection.send(True)
+        elif command == "search":
+            # Any API request checks the corpus version first
+            client.get("/api/v1/documents/stats")
+            docs = VectorStoreService().batch_bm25_search([argument], k=10)[0]
+            # Vector retrieval too (fake embeddings rank at random; with k above the corpus size every chunk is returned)
+            vector_docs = VectorStoreService().vector_db.similarity_search(argument, k=10)
+            connection.send({
+                "file_ids": sorted({int(d.metadata["file_id"]) for d in docs if argument in d.page_content}),
+                "vector_file_ids": sorted({int(d.metadata["file_id"]) for d in vector_docs}),
+                "index": id(vector_store._bm25_retriever_cache),
+                "answers": len(rag_engine._answer_cache),
+            })
+
+def test_workers_see_each_others_ingests_and_deletes():
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "data", "uploads"))
+    chroma_directory = tempfile.mkdtemp()
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for _ in range(2):
+        parent_end, child_end = context.Pipe()
+        process = context.Process(target=worker, args=(child_end, workdir, chroma_directory), daemon=True)
+        process.start()
+        workers.append((process, parent_end))
+        # Started one after the other so only the first creates the schema
+        assert parent_end.poll(120) and parent_end.recv() == "ready"
+
+    def call(index, command, argument=None):
+        connection = workers[index][1]
+        connection.send((command, argument))
+        assert connection.poll(120), f"worker {index} did not answer {command}"
+        return connection.recv()
+
+    try:
+        apple = call(0, "upload", ("apple.txt", "苹果是一种常见的水果，富含维生素。"))
+        first = call(1, "search", "苹果")
+        assert first["file_ids"] == [apple] and first["vector_file_ids"] == [apple]
+
+        # Worker 0 ingests: worker 1 drops its index and answers on its next request
+        call(1, "cache_answer", "苹果是什么")
+        banana = call(0, "upload", ("banana.txt", "香蕉是一种热带水果，口感软糯。"))
+        second = call(1, "search", "香蕉")
+        assert second["file_ids"] == [banana] and second["answers"] == 0
+        assert second["vector_file_ids"] == [apple, banana]
+
+        # No change in between: the index is reused
+        assert call(1, "search", "苹果")["index"] == call(1, "search", "香蕉")["index"]
+
+        # Worker 1 deletes: worker 0 stops returning the deleted document
+        assert call(0, "search", "苹果")["file_ids"] == [apple]
+        assert call(1, "delete", [apple]) == [apple]
+        after_delete = call(0, "search", "苹果")
+        assert after_delete["file_ids"] == [] and after_delete["vector_file_ids"] == [banana]
+        assert call(0, "search", "香蕉")["file_ids"] == [banana]
+    finally:
+        for process, connection in workers:
+            if process.is_alive():
+                connection.send(("stop", None))
+            process.join(30)
+            if process.is_alive():
+                process.kill()
+
+def teardown_function():
+    vector_store._bm25_retriever_cache = None
+    rag_engine._answer_cache.clear()
+    corpus_version._seen_version = None
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
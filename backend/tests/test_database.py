@@ -0,0 +1,64 @@
+import sys
+import os
+import asyncio
+import threading
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from sqlalchemy import text
+from app.core.database import run_db
+from app.schemas.conversation import ConversationCreate, MessageCreate
+from app.services.conversation_service import ConversationService
+
+service = ConversationService()
+
+def test_engine_uses_wal_and_pragmas(temp_database):
+    with temp_database.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+    assert temp_database.pool.size() > 1
+
+def test_run_db_concurrent_writes_off_the_loop(temp_database):
+    async def main():
+        conversation = await run_db(service.create_conversation, ConversationCreate(title="t"), write=True)
+        threads = set()
+
+        def add(db, i):
+            threads.add(threading.current_thread().name)
+            return service.add_message(db, conversation.id, MessageCreate(role="user", content=f"q{i}"))
+
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        tick_task = asyncio.create_task(ticker())
+        saved = await asyncio.gather(*(run_db(add, i, write=True) for i in range(50)))
+        tick_task.cancel()
+
+        assert len({m.id for m in saved}) == 50
+        # Writes share one writer thread; the loop kept running meanwhile
+        assert len(threads) == 1 and threads.pop().startswith("db-write")
+        assert ticks > 1
+        messages = await run_db(service.get_messages, conversation.id)
+        assert len(messages) == 50
+
+    asyncio.run(main())
+
+def test_run_db_returns_detached_loaded_objects(temp_database):
+    async def main():
+        conversation = await run_db(service.create_conversation, ConversationCreate(title="标题"), write=True)
+        fetched = await run_db(service.get_conversation, conversation.id)
+        assert fetched.title == "标题" and fetched.created_at is not None
+        assert await run_db(service.delete_conversation, conversation.id, write=True)
+        assert await run_db(service.get_conversation, conversation.id) is None
+
+    asyncio.run(main())
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,39 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services.deadline import Deadline
+
+def test_optional_stages_respect_generation_reserve():
+    deadline = Deadline(settings.GENERATION_RESERVE_SECONDS + 2)
+    # Only ~2s are available outside the generation reserve
+    assert deadline.stage_timeout(5) <= 2
+    assert deadline.can_run(5)
+
+    tight = Deadline(settings.GENERATION_RESERVE_SECONDS)
+    assert not tight.can_run(5)
+    # Required stages may still use the reserved time
+    assert tight.stage_timeout(5, reserve_generation=False) > 0
+
+def test_generation_is_capped_when_time_is_short():
+    assert Deadline(settings.GENERATION_FULL_SECONDS + 10).max_generation_tokens() is None
+    capped = Deadline(4).max_generation_tokens()
+    assert capped is not None
+    assert capped <= max(settings.GENERATION_MIN_TOKENS, 4 * settings.GENERATION_TOKENS_PER_SECOND)
+
+def test_skipped_stages_are_recorded_once():
+    deadline = Deadline(0)
+    assert deadline.expired()
+    deadline.skip("rerank")
+    deadline.skip("rerank")
+    deadline.skip("web_search")
+    assert deadline.skipped == ["rerank", "web_search"]
+
+if __name__ == "__main__":
+    test_optional_stages_respect_generation_reserve()
+    test_generation_is_capped_when_time_is_short()
+    test_skipped_stages_are_recorded_once()
+    print("All deadline tests passed.")
@@ -0,0 +1,131 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.core import database
+from app.models.document import DocumentModel
+from app.services.document_catalog import get_catalog_stats, get_documents_page
+from app.services.document_service import DocumentService
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'migrations'))
+from backfill_document_stats import backfill_document_stats  # noqa: E402
+
+def add_documents(documents: int = 12):
+    Session = database.SessionLocal
+    start = datetime(2024, 1, 1)
+    with Session() as db:
+        for i in range(documents):
+            legacy = i % 4 == 0
+            db.add(DocumentModel(
+                filename=f"doc{i:02d}.pdf",
+                upload_time=start + timedelta(hours=i // 3),  # ties broken by id
+                status="error" if i % 5 == 0 else "processed",
+                file_size=1000 * (i % 3),
+                chunk_count=None if legacy else i * 10,
+                token_count=None if legacy else i * 1000,
+                page_count=None if legacy else i,
+                parse_seconds=None if legacy else 0.5,
+                embed_seconds=None if legacy else 1.5,
+            ))
+        db.commit()
+    return Session
+
+def collect(db, limit, **kwargs):
+    ids, cursor = [], None
+    while True:
+        documents, has_more, cursor = get_documents_page(db, limit, cursor=cursor, **kwargs)
+        ids.extend(d.id for d in documents)
+        if not has_more:
+            return ids
+
+def test_keyset_pages_for_every_sort(temp_database):
+    Session = add_documents()
+    with Session() as db:
+        everything = db.query(DocumentModel).all()
+        for sort in ["upload_time", "filename", "file_size", "chunk_count", "token_count"]:
+            for descending in [True, False]:
+                ids = collect(db, 5, sort=sort, descending=descending)
+                assert sorted(ids) == sorted(d.id for d in everything), (sort, descending)
+
+                def key(d):
+                    value = getattr(d, sort)
+                    return (-1 if value is None else value, d.id)
+                expected = [d.id for d in sorted(everything, key=key, reverse=descending)]
+                assert ids == expected, (sort, descending)
+
+        errors = collect(db, 2, status="error")
+        assert errors and all(db.get(DocumentModel, i).status == "error" for i in errors)
+
+def test_cursor_must_match_sort(temp_database):
+    Session = add_documents()
+    with Session() as db:
+        _, _, cursor = get_documents_page(db, 3, sort="filename")
+        try:
+            get_documents_page(db, 3, sort="upload_time", cursor=cursor)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("cursor of another sort accepted")
+
+def test_default_order_uses_index(temp_database):
+    add_documents()
+    with temp_database.connect() as conn:
+        for where, index in [("", "ix_documents_upload"), ("WHERE status = 'error' ", "ix_documents_status_upload")]:
+            plan = " ".join(row[-1] for row in conn.execute(text(
+                f"EXPLAIN QUERY PLAN SELECT * FROM documents {where}ORDER BY upload_time DESC, id DESC LIMIT 51"
+            )))
+            assert index in plan and "TEMP B-TREE" not in plan, plan
+
+def test_catalog_stats(temp_database):
+    Session = add_documents()
+    with Session() as db:
+        stats = get_catalog_stats(db)
+    recorded = [i for i in range(12) if i % 4 != 0]
+    assert stats["documents"] == 12 and stats["by_status"] == {"error": 3, "processed": 9}
+    assert stats["chunks"] == sum(i * 10 for i in recorded)
+    assert stats["embed_seconds"] == 1.5 * len(recorded)
+
+def test_document_service_reports_pages_and_tokens():
+    service = DocumentService()
+    pages = service.load(os.path.join(os.path.dirname(__file__), '../data/test_doc.txt'))
+    chunks = service.split(pages)
+    assert len(pages) == 1 and chunks
+    assert service.count_chunk_tokens(chunks) > 0
+
+def test_backfill_from_vector_store(temp_database):
+    class Collection:
+        def get(self, where, include):
+            if where["file_id"] != "1":
+                return {"documents": [], "metadatas": []}
+            return {"documents": ["第一页内容", "第二页内容", "更多"], "metadatas": [{"page": 0}, {"page": 1}, {"page": 1}]}
+
+    Session = add_documents(5)
+    with Session() as db:
+        assert backfill_document_stats(db, Collection()) == 2
+        first = db.get(DocumentModel, 1)
+        assert first.chunk_count == 3 and first.page_count == 2 and first.token_count > 0
+        assert backfill_document_stats(db, Collection()) == 0
+
+def test_catalog_endpoint(temp_database):
+    from app.main import app
+
+    add_documents()
+    client = TestClient(app)
+    page = client.get("/api/v1/documents/", params={"limit": 5, "sort": "token_count"}).json()
+    assert len(page["documents"]) == 5 and page["has_more"]
+    assert page["documents"][0]["token_count"] == 11000
+    rest = client.get("/api/v1/documents/", params={"limit": 5, "sort": "token_count", "cursor": page["next_cursor"]})
+    assert rest.status_code == 200 and rest.json()["documents"][0]["token_count"] < 7000
+    assert client.get("/api/v1/documents/", params={"status": "error"}).json()["documents"][0]["status"] == "error"
+    assert client.get("/api/v1/documents/", params={"sort": "bogus"}).status_code == 400
+    assert client.get("/api/v1/documents/", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/v1/documents/stats").json()["documents"] == 12
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,122 @@
+import sys
+import os
+import asyncio
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage
+from app.core.config import settings
+from app.services.llm_gateway import LLMGateway, LLMOverloadedError, LLMPriority, TokenBucket
+
+def fresh_gateway(max_concurrency=1, max_queue=2) -> LLMGateway:
+    LLMGateway._instance = None
+    gateway = LLMGateway()
+    gateway.max_concurrency = max_concurrency
+    gateway.max_queue = max_queue
+    return gateway
+
+def test_interactive_requests_jump_the_queue():
+    gateway = fresh_gateway(max_concurrency=1, max_queue=10)
+    order = []
+
+    async def job(name, priority, started=None):
+        async with gateway.slot(priority):
+            if started:
+                started.set()
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        started = asyncio.Event()
+        first = asyncio.create_task(job("first", LLMPriority.BATCH, started))
+        await started.wait()
+        # Queue a batch job before an interactive one; the interactive one runs first
+        batch = asyncio.create_task(job("batch", LLMPriority.BATCH))
+        evaluation = asyncio.create_task(job("evaluation", LLMPriority.EVALUATION))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(job("interactive", LLMPriority.INTERACTIVE))
+        await asyncio.gather(first, batch, evaluation, interactive)
+
+    asyncio.run(main())
+    assert order == ["first", "interactive", "evaluation", "batch"]
+    assert gateway.metrics()["completed_total"] == 4
+    assert gateway.metrics()["in_flight"] == 0
+
+def test_full_queue_is_rejected_fast():
+    gateway = fresh_gateway(max_concurrency=1, max_queue=1)
+
+    async def hold(event):
+        async with gateway.slot():
+            await event.wait()
+
+    async def main():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(hold(release))
+        await asyncio.sleep(0)
+        assert gateway.is_overloaded()
+
+        try:
+            async with gateway.slot():
+                pass
+            assert False, "expected LLMOverloadedError"
+        except LLMOverloadedError:
+            pass
+
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    metrics = gateway.metrics()
+    assert metrics["rejected_total"] == 1
+    assert metrics["queue_depth"] == 0
+    assert metrics["wait_seconds_max"] is not None
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.wait_time(60) == 0
+    bucket.consume(60)
+    # One token per second refill rate
+    assert 0.9 < bucket.wait_time(1) <= 1.0
+
+class UsageReportingChatModel(FakeListChatModel):
+    """Reports provider token usage on its answers, like ChatOpenAI."""
+
+    async def ainvoke(self, *args, **kwargs):
+        message = await super().ainvoke(*args, **kwargs)
+        return AIMessage(content=message.content, usage_metadata={"input_tokens": 30, "output_tokens": 10, "total_tokens": 40})
+
+def frozen_gateway() -> LLMGateway:
+    gateway = fresh_gateway(max_concurrency=2)
+    # No refill during the test, so the bucket shows exactly what was charged
+    gateway.token_bucket.rate = 0
+    return gateway
+
+def test_token_bucket_is_corrected_from_actual_usage():
+    gateway = frozen_gateway()
+    capacity = gateway.token_bucket.capacity
+
+    # Provider-reported usage replaces the reservation (prompt estimate + completion estimate)
+    asyncio.run(gateway.ainvoke("问题", llm=UsageReportingChatModel(responses=["回答"])))
+    assert gateway.token_bucket.available == capacity - 40
+
+    # Without reported usage the streamed completion is counted
+    gateway = frozen_gateway()
+
+    async def stream():
+        return [chunk async for chunk in gateway.astream("问题", llm=FakeListChatModel(responses=["短回答"]))]
+
+    asyncio.run(stream())
+    used = capacity - gateway.token_bucket.available
+    assert 0 < used < settings.LLM_COMPLETION_TOKENS_ESTIMATE
+    assert gateway.metrics()["in_flight"] == 0
+
+if __name__ == "__main__":
+    test_interactive_requests_jump_the_queue()
+    test_full_queue_is_rejected_fast()
+    test_token_bucket_wait_time()
+    test_token_bucket_is_corrected_from_actual_usage()
+    print("All LLM gateway tests passed.")
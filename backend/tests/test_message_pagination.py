@@ -0,0 +1,91 @@
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+from app.core import database
+from app.core.database import create_missing_indexes
+from app.models.conversation import Conversation, Message
+from app.services.conversation_service import ConversationService
+
+service = ConversationService()
+
+def add_messages(messages: int = 25):
+    Session = database.SessionLocal
+    start = datetime(2024, 1, 1)
+    with Session() as db:
+        db.add(Conversation(id="conv", title="t"))
+        db.add(Conversation(id="other", title="o"))
+        for i in range(messages):
+            role = "user" if i % 2 == 0 else "assistant"
+            # Pairs share a timestamp so the id tie-breaker matters
+            db.add(Message(conversation_id="conv", role=role, content=f"m{i}",
+                           sources="[]" * 100, created_at=start + timedelta(seconds=i // 2)))
+        db.add(Message(conversation_id="other", role="user", content="x", created_at=start))
+        db.commit()
+    return Session
+
+def test_recent_history_window(temp_database):
+    Session = add_messages()
+    with Session() as db:
+        history = service.get_recent_history(db, "conv", 6)
+        assert [m["content"] for m in history] == [f"m{i}" for i in range(19, 25)]
+        assert set(history[0]) == {"role", "content"}
+
+        # Window before a given message (e.g. the query just saved)
+        last_id = db.query(Message.id).filter(Message.content == "m24").scalar()
+        history = service.get_recent_history(db, "conv", 4, before_id=last_id)
+        assert [m["content"] for m in history] == ["m20", "m21", "m22", "m23"]
+
+def test_keyset_pages_cover_all_messages(temp_database):
+    Session = add_messages()
+    with Session() as db:
+        seen, before = [], None
+        while True:
+            page, has_more = service.get_messages_page(db, "conv", 10, before_id=before)
+            seen = [m.content for m in page] + seen
+            if not has_more:
+                break
+            before = page[0].id
+        assert seen == [f"m{i}" for i in range(25)]
+
+def test_history_query_uses_index(temp_database):
+    add_messages()
+    create_missing_indexes(temp_database)
+    assert "ix_messages_conversation_created" in {i["name"] for i in inspect(temp_database).get_indexes("messages")}
+    with temp_database.connect() as conn:
+        plan = " ".join(str(row) for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, role, content FROM messages "
+            "WHERE conversation_id = 'conv' ORDER BY created_at DESC, id DESC LIMIT 6"
+        )))
+    assert "ix_messages_conversation_created" in plan
+
+def test_message_api_pagination(temp_database):
+    from app.main import app
+
+    add_messages()
+    client = TestClient(app)
+
+    detail = client.get("/api/v1/conversations/conv", params={"message_limit": 10}).json()
+    assert [m["content"] for m in detail["messages"]] == [f"m{i}" for i in range(15, 25)]
+    assert detail["has_more_messages"] is True
+
+    page = client.get("/api/v1/conversations/conv/messages",
+                      params={"before": detail["messages"][0]["id"], "limit": 10}).json()
+    assert [m["content"] for m in page["messages"]] == [f"m{i}" for i in range(5, 15)]
+    assert page["has_more"] and page["next_before"] == page["messages"][0]["id"]
+
+    last = client.get("/api/v1/conversations/conv/messages", params={"before": page["next_before"]}).json()
+    assert [m["content"] for m in last["messages"]] == [f"m{i}" for i in range(5)]
+    assert not last["has_more"] and last["next_before"] is None
+
+    assert client.get("/api/v1/conversations/conv/messages", params={"limit": 0}).status_code == 400
+    assert client.get("/api/v1/conversations/missing/messages").status_code == 404
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,144 @@
+import sys
+import os
+import asyncio
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from app.core import database
+from app.core.config import settings
+from app.models.conversation import Conversation, Message
+from app.schemas.conversation import MessageCreate
+from app.services import message_persister
+from app.services.message_persister import MessagePersister
+
+_original_write_batch = message_persister.write_batch
+_original_backoff = settings.PERSIST_RETRY_BACKOFF_SECONDS
+
+def add_conversation():
+    Session = database.SessionLocal
+    with Session() as db:
+        db.add(Conversation(id="conv", title="New Chat"))
+        db.commit()
+    return Session
+
+def new_persister() -> MessagePersister:
+    persister = MessagePersister()
+    persister._init()
+    return persister
+
+def test_concurrent_messages_share_transactions(temp_database):
+    Session = add_conversation()
+    persister = new_persister()
+
+    async def main():
+        futures = [
+            persister.add("conv", MessageCreate(role="user" if i % 2 == 0 else "assistant", content=f"m{i}"))
+            for i in range(50)
+        ]
+        return await asyncio.gather(*futures)
+
+    ids = asyncio.run(main())
+    assert len(set(ids)) == 50 and ids == sorted(ids)
+    assert persister.messages_total == 50 and persister.batches_total < 5
+    with Session() as db:
+        # IDs returned to callers are committed and in insertion order
+        rows = db.query(Message).order_by(Message.created_at, Message.id).all()
+        assert [m.id for m in rows] == ids and rows[0].content == "m0"
+        conversation = db.get(Conversation, "conv")
+        assert conversation.title == "m0" and conversation.updated_at >= rows[-1].created_at
+
+def test_batches_are_capped(temp_database):
+    add_conversation()
+    persister = new_persister()
+    original = settings.PERSIST_MAX_BATCH
+    settings.PERSIST_MAX_BATCH = 4
+    try:
+        async def main():
+            await asyncio.gather(*[persister.add("conv", MessageCreate(role="user", content="x")) for _ in range(10)])
+        asyncio.run(main())
+    finally:
+        settings.PERSIST_MAX_BATCH = original
+    assert persister.messages_total == 10 and persister.batches_total == 3
+
+def test_close_drains_queue(temp_database):
+    Session = add_conversation()
+    persister = new_persister()
+
+    async def main():
+        future = persister.add("conv", MessageCreate(role="user", content="bye"))
+        await persister.close()
+        assert future.done()
+        return future.result()
+
+    message_id = asyncio.run(main())
+    with Session() as db:
+        assert db.get(Message, message_id).content == "bye"
+
+def test_flush_sync_writes_without_event_loop(temp_database):
+    Session = add_conversation()
+    persister = new_persister()
+
+    async def main():
+        persister.add("conv", MessageCreate(role="assistant", content="partial"))
+
+    # The loop ends before the background task runs
+    asyncio.run(main())
+    assert persister.metrics()["pending"] == 1
+    persister.flush_sync()
+    assert persister.metrics()["pending"] == 0
+    with Session() as db:
+        assert db.query(Message).one().content == "partial"
+
+def failing_writes(failures: int):
+    """Make the next `failures` batch writes fail like a locked database."""
+    settings.PERSIST_RETRY_BACKOFF_SECONDS = 0.01
+    remaining = [failures]
+
+    def write_batch(db, items):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            raise RuntimeError("database is locked")
+        return _original_write_batch(db, items)
+
+    message_persister.write_batch = write_batch
+
+def test_failed_batch_is_retried(temp_database):
+    Session = add_conversation()
+    persister = new_persister()
+    failing_writes(2)
+
+    async def main():
+        return await asyncio.gather(*[persister.add("conv", MessageCreate(role="user", content=f"m{i}")) for i in range(3)])
+
+    ids = asyncio.run(main())
+    assert persister.metrics()["retries_total"] == 2 and persister.metrics()["failed_total"] == 0
+    with Session() as db:
+        # Written exactly once
+        assert [m.id for m in db.query(Message).order_by(Message.id)] == ids
+
+def test_batch_fails_after_repeated_failures(temp_database):
+    Session = add_conversation()
+    persister = new_persister()
+    failing_writes(settings.PERSIST_MAX_RETRIES + 1)
+
+    async def main():
+        future = persister.add("conv", MessageCreate(role="user", content="lost"))
+        with pytest.raises(RuntimeError):
+            await future
+        # The next batch is written normally
+        return await persister.save("conv", MessageCreate(role="user", content="kept"))
+
+    message_id = asyncio.run(main())
+    assert persister.metrics()["failed_total"] == 1
+    with Session() as db:
+        assert [m.content for m in db.query(Message)] == ["kept"] and db.get(Message, message_id)
+
+def teardown_function():
+    MessagePersister()._init()
+    message_persister.write_batch = _original_write_batch
+    settings.PERSIST_RETRY_BACKOFF_SECONDS = _original_backoff
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,139 @@
+import sys
+import os
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import httpx
+import pytest
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.services.vector_store import VectorStoreService
+
+BACKEND_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+_original_chroma_directory = settings.CHROMA_PERSIST_DIRECTORY
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def command_line(pid: int) -> bytes:
+    with open(f"/proc/{pid}/cmdline", "rb") as f:
+        return f.read()
+
+def child_pids(pid: int) -> set:
+    """Forked workers (same command line as the parent; multiprocessing helpers differ)."""
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return {int(p) for p in f.read().split() if command_line(int(p)) == command_line(pid)}
+
+def wait_for(predicate, timeout: float = 90):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if predicate():
+                return True
+        except (httpx.HTTPError, OSError):
+            pass
+        time.sleep(0.2)
+    return False
+
+def test_memory_usage():
+    from app.prefork import memory_usage
+
+    usage = memory_usage(os.getpid())
+    assert usage["rss"] > 0
+    assert usage["private"] + usage["shared"] == usage["rss"]
+    assert 0 < usage["pss"] <= usage["rss"]
+
+def test_preforked_server():
+    settings.CHROMA_PERSIST_DIRECTORY = tempfile.mkdtemp()
+    VectorStoreService().add_documents([
+        Document(page_content=f"第{i}段：检索增强生成", metadata={"file_id": "1", "chunk_id": f"c{i}"}) for i in range(20)
+    ])
+    workdir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(workdir, "data", "uploads"))
+    port = free_port()
+    env = dict(os.environ, CHROMA_PERSIST_DIRECTORY=settings.CHROMA_PERSIST_DIRECTORY, USE_MOCK_RAG="true", PYTHONPATH=BACKEND_DIRECTORY)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.prefork", "--workers", "2", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True,
+    )
+    base = f"http://127.0.0.1:{port}/api/v1"
+    try:
+        assert wait_for(lambda: httpx.get(f"{base}/health/").status_code == 200), "server did not start"
+        workers = child_pids(server.pid)
+        assert len(workers) == 2
+
+        # Forked workers open Chroma themselves (the parent never did)
+        for _ in range(4):
+            response = httpx.post(f"{base}/documents/chunks", json={"chunk_ids": ["c1", "c7"]}, timeout=30)
+            assert [c["content"] for c in response.json()["chunks"]] == ["第1段：检索增强生成", "第7段：检索增强生成"]
+
+        # A worker that dies is replaced
+        killed = workers.pop()
+        os.kill(killed, signal.SIGKILL)
+        assert wait_for(lambda: len(child_pids(server.pid)) == 2 and killed not in child_pids(server.pid))
+        assert wait_for(lambda: httpx.get(f"{base}/health/").status_code == 200)
+
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(30) == 0
+    finally:
+        if server.poll() is None:
+            # Workers too, not only the parent
+            os.killpg(server.pid, signal.SIGKILL)
+            server.wait()
+
+def test_worker_exit_writes_queued_messages(temp_database):
+    import asyncio
+    from app import prefork
+    from app.core import database
+    from app.models.conversation import Conversation, Message
+    from app.schemas.conversation import MessageCreate
+    from app.services.message_persister import MessagePersister
+
+    with database.SessionLocal() as db:
+        db.add(Conversation(id="conv", title="New Chat"))
+        db.commit()
+
+    class InterruptedServer:
+        """Stops with a message still queued, as when the event loop dies before shutdown drains it."""
+
+        def __init__(self, config):
+            pass
+
+        def run(self, sockets):
+            async def main():
+                MessagePersister().add("conv", MessageCreate(role="assistant", content="partial"))
+            asyncio.run(main())
+
+    class Exited(Exception):
+        pass
+
+    def exit_(status):
+        raise Exited(status)
+
+    original_server, original_exit = prefork.uvicorn.Server, prefork.os._exit
+    original_handlers = signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)
+    prefork.uvicorn.Server, prefork.os._exit = InterruptedServer, exit_
+    try:
+        with pytest.raises(Exited):
+            prefork._run_worker(None, "warning")
+    finally:
+        prefork.uvicorn.Server, prefork.os._exit = original_server, original_exit
+        signal.signal(signal.SIGINT, original_handlers[0])
+        signal.signal(signal.SIGTERM, original_handlers[1])
+        MessagePersister()._init()
+    with database.SessionLocal() as db:
+        assert db.query(Message).one().content == "partial"
+
+def teardown_function():
+    settings.CHROMA_PERSIST_DIRECTORY = _original_chroma_directory
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,64 @@
+import sys
+import os
+import asyncio
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.services import query_rewriter
+from app.services.query_rewriter import QueryRewriter
+
+HISTORY = [
+    {"role": "user", "content": "本项目使用了哪个向量数据库？"},
+    {"role": "assistant", "content": "本项目使用 ChromaDB 作为向量数据库。"},
+]
+
+class CountingChatModel(FakeListChatModel):
+    calls: int = 0
+
+    async def ainvoke(self, *args, **kwargs):
+        self.calls += 1
+        return await super().ainvoke(*args, **kwargs)
+
+def test_needs_rewrite_heuristic():
+    # No history: nothing to resolve
+    assert not QueryRewriter.needs_rewrite("它支持哪些文件格式？", [])
+    # Pronoun referring back to the history
+    assert QueryRewriter.needs_rewrite("它支持哪些文件格式？", HISTORY)
+    # Very short follow-up
+    assert QueryRewriter.needs_rewrite("为什么？", HISTORY)
+    # Self-contained question
+    assert not QueryRewriter.needs_rewrite("后端使用了哪个 Web 框架来提供 API 服务？", HISTORY)
+    assert QueryRewriter.needs_rewrite("How is this deployed to the server?", HISTORY)
+    # Markers count as words, not as characters inside other words (其他, 应该, 因此)
+    assert not QueryRewriter.needs_rewrite("除了向量检索以外，其他的检索方式有哪些？", HISTORY)
+    assert not QueryRewriter.needs_rewrite("部署到服务器上应该注意哪些安全问题？", HISTORY)
+    assert not QueryRewriter.needs_rewrite("因此文档切分的大小应该如何选择？", HISTORY)
+    assert QueryRewriter.needs_rewrite("该方法在生产环境中的表现如何？", HISTORY)
+
+def test_is_equivalent():
+    assert QueryRewriter.is_equivalent("RAG 的主要优势是什么？", "RAG的主要优势是什么？")
+    assert QueryRewriter.is_equivalent("RAG 的主要优势是什么？", "RAG 的主要优势是什么")
+    assert not QueryRewriter.is_equivalent("它支持哪些格式？", "ChromaDB 支持哪些数据持久化格式？")
+
+def test_rewrite_is_cached_per_history():
+    query_rewriter._rewrite_cache.clear()
+    llm = CountingChatModel(responses=["ChromaDB 支持哪些文件格式？", "ChromaDB 支持哪些文件格式？"])
+    rewriter = QueryRewriter(llm)
+
+    first = asyncio.run(rewriter.arewrite("它支持哪些文件格式？", HISTORY))
+    second = asyncio.run(rewriter.arewrite("它支持哪些文件格式？", HISTORY))
+    assert first == second == "ChromaDB 支持哪些文件格式？"
+    assert llm.calls == 1
+
+    # A different history must not reuse the cached rewrite
+    other_history = HISTORY + [{"role": "user", "content": "前端用的是什么？"}]
+    asyncio.run(rewriter.arewrite("它支持哪些文件格式？", other_history))
+    assert llm.calls == 2
+
+if __name__ == "__main__":
+    test_needs_rewrite_heuristic()
+    test_is_equivalent()
+    test_rewrite_is_cached_per_history()
+    print("All query rewriter tests passed.")
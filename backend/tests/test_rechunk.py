@@ -0,0 +1,178 @@
+import sys
+import os
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from app.models.document import DocumentModel
+from app.services import vector_store
+from app.services.document_service import DocumentService
+from app.services.rechunk import rechunk_documents, job_status
+from app.services.vector_store import VectorStoreService, active_collection_name
+
+PARAGRAPHS = [f"第{i}段：检索增强生成把文档切分成片段并写入向量数据库，编号{i}。" * 3 for i in range(12)]
+
+def ingest(Session, documents: dict, chunk_size: int = 200):
+    """Upload-like ingest: save the file and its extracted text, add chunks and the DB row."""
+    service = DocumentService(chunk_size, 0)
+    vector_service = VectorStoreService()
+    with Session() as db:
+        for document_id, text in documents.items():
+            file_path = DocumentService.upload_path(document_id, f"doc{document_id}.txt")
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            pages = service.load(file_path)
+            service.save_extracted_text(pages, file_path)
+            chunks = service.split(pages)
+            for chunk in chunks:
+                chunk.metadata["file_id"] = str(document_id)
+            vector_service.add_documents(chunks)
+            db.add(DocumentModel(id=document_id, filename=f"doc{document_id}.txt", status="processed", chunk_count=len(chunks)))
+        db.commit()
+
+def collection_contents(name: str = None) -> dict:
+    data = VectorStoreService(name).vector_db._collection.get(include=["documents", "metadatas", "embeddings"])
+    return {
+        chunk_id: (text, meta["file_id"], list(embedding))
+        for chunk_id, text, meta, embedding in zip(data["ids"], data["documents"], data["metadatas"], data["embeddings"])
+    }
+
+def test_extracted_text_cache(temp_node):
+    temp_node()
+    pages = [Document(page_content="第一页", metadata={"page": 0}), Document(page_content="第二页", metadata={"page": 1})]
+    DocumentService.save_extracted_text(pages, "a.pdf")
+    assert os.path.exists("a.pdf.pages.json.gz")
+    assert DocumentService.load_extracted_text("a.pdf") == pages
+
+    # A miss (upload from before the cache existed) parses once and fills the cache
+    with open("b.txt", "w", encoding="utf-8") as f:
+        f.write("原文内容")
+    service = DocumentService()
+    assert [p.page_content for p in service.load_cached("b.txt")] == ["原文内容"]
+    with open("b.txt", "w", encoding="utf-8") as f:
+        f.write("changed")
+    assert [p.page_content for p in service.load_cached("b.txt")] == ["原文内容"]
+
+def test_rechunk_reuses_embeddings_and_swaps_collection(temp_node):
+    Session = temp_node()
+    ingest(Session, {1: "\n\n".join(PARAGRAPHS), 2: "\n\n".join(PARAGRAPHS[:4])})
+    before = collection_contents()
+    assert active_collection_name() == vector_store.DEFAULT_COLLECTION_NAME
+    vector_store._bm25_retriever_cache = "stale"
+
+    # Same settings: every chunk, ID and embedding survives
+    report = rechunk_documents(200, 0, workers=1)
+    assert report["embedded"] == 0 and report["reused_embeddings"] == len(before)
+    assert active_collection_name() == report["collection"]
+    assert collection_contents() == before
+    assert vector_store._bm25_retriever_cache is None
+    client = VectorStoreService().vector_db._client
+    assert vector_store.DEFAULT_COLLECTION_NAME not in [c.name for c in client.list_collections()]
+
+    # Larger chunks: texts that still exist keep their embedding; only new texts are embedded
+    report = rechunk_documents(400, 0, workers=1)
+    after = collection_contents()
+    assert report["chunks"] == len(after) < len(before)
+    assert report["embedded"] + report["reused_embeddings"] == len(after)
+    old_by_text = {(text, file_id): (chunk_id, embedding) for chunk_id, (text, file_id, embedding) in before.items()}
+    for chunk_id, (text, file_id, embedding) in after.items():
+        if (text, file_id) in old_by_text:
+            assert old_by_text[(text, file_id)] == (chunk_id, embedding)
+    with Session() as db:
+        assert db.get(DocumentModel, 1).chunk_count == len([v for v in after.values() if v[1] == "1"])
+
+def test_rechunk_reconciles_changes_made_meanwhile(temp_node):
+    Session = temp_node()
+    ingest(Session, {1: "\n\n".join(PARAGRAPHS[:6]), 2: "\n\n".join(PARAGRAPHS[6:])})
+
+    from app.services import rechunk
+    original_split_all = rechunk._split_all
+
+    def split_then_change(*args):
+        results = original_split_all(*args)
+        # While embedding: document 3 is uploaded and document 2 deleted
+        ingest(Session, {3: "新上传的文档内容。"})
+        VectorStoreService().delete_documents_by_file_ids(["2"])
+        with Session() as db:
+            db.query(DocumentModel).filter(DocumentModel.id == 2).delete()
+            db.commit()
+        return results
+
+    rechunk._split_all = split_then_change
+    try:
+        report = rechunk_documents(300, 0, workers=1)
+    finally:
+        rechunk._split_all = original_split_all
+    assert report["documents"] == 2 and report["carried_over_chunks"] == 1
+    assert {file_id for _, file_id, _ in collection_contents().values()} == {"1", "3"}
+
+def test_upload_during_swap_waits_for_new_collection(temp_node):
+    import threading
+    from app.services import rechunk
+
+    Session = temp_node()
+    ingest(Session, {1: "\n\n".join(PARAGRAPHS[:6])})
+    original_set_active = rechunk.set_active_collection
+    upload = {}
+
+    def upload_document():
+        # What the upload endpoint does: resolve the active collection and write under the shared lock
+        with vector_store.corpus_write_lock():
+            VectorStoreService().add_documents([Document(page_content="交换期间上传。", metadata={"file_id": "2"})])
+        upload["done"] = True
+
+    def set_active_during_upload(name):
+        # Reconciled already: an upload starting now must wait and land in the new collection
+        upload["thread"] = threading.Thread(target=upload_document)
+        upload["thread"].start()
+        time.sleep(0.2)
+        upload["done_before_swap"] = upload.get("done", False)
+        original_set_active(name)
+
+    rechunk.set_active_collection = set_active_during_upload
+    try:
+        report = rechunk_documents(300, 0, workers=1)
+    finally:
+        rechunk.set_active_collection = original_set_active
+    upload["thread"].join(10)
+    assert not upload["done_before_swap"] and upload["done"]
+    assert active_collection_name() == report["collection"]
+    assert {file_id for _, file_id, _ in collection_contents().values()} == {"1", "2"}
+
+def test_rechunk_in_worker_processes(temp_node):
+    Session = temp_node()
+    ingest(Session, {1: "\n\n".join(PARAGRAPHS[:6]), 2: "\n\n".join(PARAGRAPHS[6:])})
+    # Document 2 has no cache yet (uploaded before it existed)
+    os.remove(DocumentService.extracted_text_path(DocumentService.upload_path(2, "doc2.txt")))
+    single = rechunk_documents(300, 0, workers=1)
+    assert os.path.exists(DocumentService.extracted_text_path(DocumentService.upload_path(2, "doc2.txt")))
+    texts = sorted(text for text, _, _ in collection_contents().values())
+
+    parallel = rechunk_documents(300, 0, workers=2)
+    assert parallel["errors"] == {} and parallel["embedded"] == 0
+    assert parallel["chunks"] == single["chunks"]
+    assert sorted(text for text, _, _ in collection_contents().values()) == texts
+
+def test_rechunk_endpoint(temp_node):
+    from app.main import app
+
+    Session = temp_node()
+    ingest(Session, {1: "\n\n".join(PARAGRAPHS[:4])})
+    client = TestClient(app)
+    assert client.post("/api/v1/documents/rechunk", json={"chunk_size": 100, "chunk_overlap": 100}).status_code == 400
+    response = client.post("/api/v1/documents/rechunk", json={"chunk_size": 150, "chunk_overlap": 0})
+    assert response.status_code == 202
+    for _ in range(200):
+        if job_status()["state"] != "running":
+            break
+        time.sleep(0.05)
+    status = client.get("/api/v1/documents/rechunk").json()
+    assert status["state"] == "done", status
+    assert status["active_collection"] == status["report"]["collection"]
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
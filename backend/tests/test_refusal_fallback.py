@@ -0,0 +1,192 @@
+import sys
+import os
+import asyncio
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.documents import Document
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from app.core.config import settings
+from app.services import circuit_breaker, web_search
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.deadline import Deadline
+from app.services.llm_gateway import LLMGateway
+from app.services.rag_engine import RAGEngine
+
+LOCAL_DOCS = [Document(page_content="项目预算总额为五十万元，首期款占百分之三十。", metadata={"chunk_id": "c1", "filename": "budget.txt"})]
+WEB_DOCS = [Document(page_content="最新版本于今年发布。", metadata={"type": "web_search", "source": "https://example.com/release", "title": "发布说明"})]
+REFUSAL = "抱歉，参考文档中没有相关信息，无法回答这个问题。"
+
+_original_use_mock = settings.USE_MOCK_RAG
+_original_asearch = web_search.WebSearchService.asearch
+_original_breakers = dict(circuit_breaker._breakers)
+
+# Generations and web searches in the order they started
+events = []
+
+class RecordingChatModel(FakeListChatModel):
+    """Streams its responses one character at a time and records each generation."""
+
+    async def _astream(self, *args, **kwargs):
+        events.append("generate")
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+def make_engine(responses: list, web_results: list) -> RAGEngine:
+    events.clear()
+    settings.USE_MOCK_RAG = False
+    LLMGateway._instance = None
+    engine = RAGEngine()
+    engine.llm = RecordingChatModel(responses=responses)
+
+    async def retrieve(retriever, query, deadline, k=15):
+        return list(LOCAL_DOCS)
+
+    async def rerank(query, docs, deadline, top_k=4):
+        return docs[:top_k]
+
+    async def search(query, max_results=5):
+        events.append("search")
+        return web_results
+
+    engine._aretrieve = retrieve
+    engine._arerank = rerank
+    web_search.WebSearchService.asearch = staticmethod(search)
+    return engine
+
+def run(engine: RAGEngine, query: str, deadline: Deadline = None) -> list:
+    async def main():
+        return [event async for event in engine.astream_answer_generator(query, deadline=deadline)]
+    return asyncio.run(main())
+
+def answer_runs(events: list) -> list:
+    """Answer text between replace events."""
+    runs = [""]
+    for event in events:
+        if event.get("replace"):
+            runs.append("")
+        elif "answer" in event:
+            runs[-1] += event["answer"]
+    return runs
+
+def test_early_refusal_is_replaced_by_prefetched_web_answer():
+    engine = make_engine([REFUSAL, "网络搜索的回答。"], WEB_DOCS)
+    stream = run(engine, "最新版本什么时候发布？")
+
+    # Weak retrieval: the search was prefetched and is not repeated after the refusal
+    assert sorted(events) == ["generate", "generate", "search"]
+    replaces = [e for e in stream if "replace" in e]
+    assert replaces == [{"replace": True, "reason": "web_search"}]
+    local, web = answer_runs(stream)
+    # Local generation stopped as soon as the opening tokens read as a refusal
+    assert REFUSAL.startswith(local) and len(local) < len(REFUSAL) and RAGEngine._is_refusal(local)
+    assert web == "网络搜索的回答。"
+    assert stream[-1]["sources"][0]["url"] == "https://example.com/release"
+
+def test_refusal_without_web_results_regenerates_local_answer():
+    engine = make_engine([REFUSAL, REFUSAL], [])
+    stream = run(engine, "最新版本什么时候发布？")
+
+    # The local answer is generated again after the search; the repeated prefix is not re-sent
+    assert sorted(events) == ["generate", "generate", "search"]
+    assert not any("replace" in e for e in stream)
+    assert answer_runs(stream) == [REFUSAL]
+    assert stream[-1]["sources"][0]["chunk_id"] == "c1"
+
+def test_regenerated_answer_that_differs_replaces_the_partial_one():
+    engine = make_engine([REFUSAL, "很抱歉，文档未涉及此问题。"], [])
+    stream = run(engine, "最新版本什么时候发布？")
+
+    assert [e for e in stream if "replace" in e] == [{"replace": True, "reason": "regenerated"}]
+    local, regenerated = answer_runs(stream)
+    assert REFUSAL.startswith(local) and regenerated == "很抱歉，文档未涉及此问题。"
+
+def test_refusal_with_open_breaker_runs_one_generation():
+    circuit_breaker._breakers.clear()
+    breaker = circuit_breaker._breakers["web_search"] = CircuitBreaker("web_search", open_seconds=30)
+    breaker._open(time.monotonic())
+    engine = make_engine([REFUSAL, "不应出现的第二次生成。"], WEB_DOCS)
+    stream = run(engine, "最新版本什么时候发布？")
+
+    # No search can run, so the local answer is read to the end instead of paused
+    assert events == ["generate"]
+    assert not any("replace" in e for e in stream)
+    assert answer_runs(stream) == [REFUSAL]
+    assert "web_search" in stream[-1]["metadata"]["skipped_stages"]
+
+def test_refusal_near_deadline_runs_one_generation():
+    engine = make_engine([REFUSAL, "不应出现的第二次生成。"], WEB_DOCS)
+    # Enough time for the generation, not for a search on top of it
+    deadline = Deadline(settings.GENERATION_RESERVE_SECONDS + 0.1)
+    stream = run(engine, "最新版本什么时候发布？", deadline)
+
+    assert events == ["generate"]
+    assert answer_runs(stream) == [REFUSAL]
+    assert "web_search" in stream[-1]["metadata"]["skipped_stages"]
+
+def test_refusal_after_empty_prefetch_runs_one_generation():
+    engine = make_engine([REFUSAL, "不应出现的第二次生成。"], [])
+
+    class SlowStartChatModel(RecordingChatModel):
+        async def _astream(self, *args, **kwargs):
+            # Let the prefetched search finish (empty) before the first token
+            await asyncio.sleep(0.01)
+            async for chunk in super()._astream(*args, **kwargs):
+                yield chunk
+
+    engine.llm = SlowStartChatModel(responses=[REFUSAL, "不应出现的第二次生成。"])
+    stream = run(engine, "最新版本什么时候发布？")
+
+    assert sorted(events) == ["generate", "search"]
+    assert answer_runs(stream) == [REFUSAL]
+
+def test_slot_is_free_while_waiting_for_web_search():
+    engine = make_engine([REFUSAL, "网络搜索的回答。"], WEB_DOCS)
+    in_flight = []
+
+    async def slow_search(query, max_results=5):
+        await asyncio.sleep(0.05)
+        in_flight.append(engine.llm_gateway.metrics()["in_flight"])
+        return WEB_DOCS
+
+    web_search.WebSearchService.asearch = staticmethod(slow_search)
+    run(engine, "最新版本什么时候发布？")
+    # The paused local generation does not hold a slot during the search
+    assert in_flight == [0]
+    assert engine.llm_gateway.metrics()["in_flight"] == 0
+
+def test_strong_retrieval_does_not_search():
+    engine = make_engine(["项目预算总额为五十万元。"], WEB_DOCS)
+    stream = run(engine, "项目预算总额是多少？")
+
+    assert events == ["generate"]
+    assert not any("replace" in e for e in stream)
+    assert answer_runs(stream) == ["项目预算总额为五十万元。"]
+
+def teardown_function():
+    settings.USE_MOCK_RAG = _original_use_mock
+    web_search.WebSearchService.asearch = _original_asearch
+    circuit_breaker._breakers.clear()
+    circuit_breaker._breakers.update(_original_breakers)
+    LLMGateway._instance = None
+
+if __name__ == "__main__":
+    test_early_refusal_is_replaced_by_prefetched_web_answer()
+    teardown_function()
+    test_refusal_without_web_results_regenerates_local_answer()
+    teardown_function()
+    test_refusal_with_open_breaker_runs_one_generation()
+    teardown_function()
+    test_refusal_near_deadline_runs_one_generation()
+    teardown_function()
+    test_refusal_after_empty_prefetch_runs_one_generation()
+    teardown_function()
+    test_regenerated_answer_that_differs_replaces_the_partial_one()
+    teardown_function()
+    test_slot_is_free_while_waiting_for_web_search()
+    teardown_function()
+    test_strong_retrieval_does_not_search()
+    teardown_function()
+    print("All refusal fallback tests passed.")
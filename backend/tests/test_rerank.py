@@ -0,0 +1,42 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from langchain_core.documents import Document
+from app.services.rerank import RerankService
+
+class LengthModel:
+    """Stand-in Cross-Encoder that scores longer passages higher."""
+
+    def predict(self, pairs, batch_size=32):
+        return [float(len(passage)) for _, passage in pairs]
+
+def make_service() -> RerankService:
+    # Bypass the singleton so the shared instance keeps its real model
+    service = object.__new__(RerankService)
+    service.model = LengthModel()
+    service.model_loaded = True
+    return service
+
+def test_rerank_does_not_mutate_shared_documents():
+    docs = [
+        Document(page_content="短", metadata={"chunk_id": "a"}),
+        Document(page_content="较长的段落", metadata={"chunk_id": "b"}),
+    ]
+    service = make_service()
+
+    reranked = service.rerank("问题", docs, top_k=2)
+    assert [d.metadata["chunk_id"] for d in reranked] == ["b", "a"]
+    assert reranked[0].metadata["relevance_score"] == 5.0
+    assert all("relevance_score" not in d.metadata for d in docs)
+
+    batched = service.rerank_batch(["问题一", "问题二"], [docs, docs[:1]], top_k=1)
+    assert [[d.metadata["chunk_id"] for d in result] for result in batched] == [["b"], ["a"]]
+    assert batched[1][0].metadata["relevance_score"] == 1.0
+    assert all("relevance_score" not in d.metadata for d in docs)
+
+if __name__ == "__main__":
+    test_rerank_does_not_mutate_shared_documents()
+    print("All rerank tests passed.")
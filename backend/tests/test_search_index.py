@@ -0,0 +1,126 @@
+import sys
+import os
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.core import database
+from app.models.conversation import Conversation, Message
+from app.services.search_index import create_search_index, make_snippet, match_expression, query_terms, search
+
+def add_conversations(engine, with_index_first: bool = True):
+    if with_index_first:
+        assert create_search_index(engine)
+    Session = database.SessionLocal
+    with Session() as db:
+        db.add(Conversation(id="c1", title="检索增强生成的原理"))
+        db.add(Conversation(id="c2", title="项目预算"))
+        db.add(Message(conversation_id="c1", role="user", content="RAG 的主要优势是什么？"))
+        db.add(Message(conversation_id="c1", role="assistant",
+                       content="背景介绍。" * 40 + "RAG 的主要优势包括减少幻觉、知识更新和数据隐私。"))
+        db.add(Message(conversation_id="c2", role="assistant", content="项目总金额为 120 万元，其中硬件占 40%。"))
+        db.commit()
+    return Session
+
+def test_query_terms_and_match_expression():
+    assert query_terms("RAG 的优势？") == ["RAG", "的", "优势"]
+    # FTS5 syntax in user input is quoted, not interpreted
+    assert match_expression(['a"b', "OR"]) == '"a""b" "OR"'
+
+def test_search_ranks_hits_with_snippets(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        result = search(db, "优势", limit=10)
+        hits = result["messages"]
+        assert {h["conversation_id"] for h in hits} == {"c1"} and len(hits) == 2
+        # The short message with the term scores higher than the long one
+        assert hits[0]["role"] == "user" and hits[0]["score"] >= hits[1]["score"]
+        long_snippet = hits[1]["snippet"]
+        assert "优势" in long_snippet and long_snippet.startswith("...")
+
+        assert [c["conversation_id"] for c in search(db, "检索", limit=10)["conversations"]] == ["c1"]
+        assert search(db, "金额", limit=10)["messages"][0]["conversation_title"] == "项目预算"
+        assert search(db, "  ？ ", limit=10)["messages"] == []
+
+def test_triggers_keep_index_in_sync(temp_database):
+    Session = add_conversations(temp_database)
+    with Session() as db:
+        message = db.query(Message).filter(Message.conversation_id == "c2").one()
+        message.content = "预算已经调整为九十万元"
+        db.commit()
+        assert search(db, "金额", limit=10)["messages"] == []
+        assert len(search(db, "调整", limit=10)["messages"]) == 1
+
+        db.delete(db.get(Conversation, "c1"))
+        db.commit()
+        assert search(db, "优势", limit=10)["messages"] == []
+        assert search(db, "检索", limit=10)["conversations"] == []
+
+def test_index_is_backfilled_for_existing_rows(temp_database):
+    Session = add_conversations(temp_database, with_index_first=False)
+    assert create_search_index(temp_database)
+    assert not create_search_index(temp_database)
+    with Session() as db:
+        assert len(search(db, "优势", limit=10)["messages"]) == 2
+
+def test_database_is_writable_from_plain_sqlite(temp_database):
+    import sqlite3
+
+    add_conversations(temp_database)
+    path = temp_database.url.database
+    # No custom SQL functions in the schema: a plain sqlite3 connection can write and delete
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO messages (conversation_id, role, content) VALUES ('c2', 'user', '外部写入')")
+        conn.execute("DELETE FROM messages WHERE conversation_id = 'c1'")
+        triggers = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+    assert triggers and not any("jieba_segment" in sql for (sql,) in triggers)
+    with database.SessionLocal() as db:
+        assert search(db, "优势", limit=10)["messages"] == []
+
+def test_legacy_udf_triggers_are_replaced(temp_database):
+    with temp_database.begin() as conn:
+        conn.execute(text("CREATE VIRTUAL TABLE messages_fts USING fts5(content, tokenize='unicode61')"))
+        conn.execute(text(
+            "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+            "INSERT INTO messages_fts(rowid, content) VALUES (new.id, jieba_segment(new.content)); END"
+        ))
+    create_search_index(temp_database)
+    Session = add_conversations(temp_database, with_index_first=False)
+    with Session() as db:
+        assert len(search(db, "优势", limit=10)["messages"]) == 2
+
+def test_search_does_not_scan_messages(temp_database):
+    add_conversations(temp_database)
+    with temp_database.connect() as conn:
+        plan = [row[-1] for row in conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT m.id FROM messages_fts "
+            "JOIN messages m ON m.id = messages_fts.rowid "
+            "JOIN conversations c ON c.id = m.conversation_id "
+            "WHERE messages_fts MATCH '\"优势\"' ORDER BY messages_fts.rank LIMIT 10"
+        ))]
+    # Only the FTS index is scanned; rows are fetched by primary key
+    assert plan[0].startswith("SCAN messages_fts VIRTUAL TABLE"), plan
+    assert all(step.startswith("SEARCH") for step in plan[1:]), plan
+
+def test_search_endpoint(temp_database):
+    from app.main import app
+
+    add_conversations(temp_database)
+    client = TestClient(app)
+    response = client.get("/api/v1/conversations/search", params={"q": "优势", "limit": 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["terms"] == ["优势"] and len(body["messages"]) == 1 and body["has_more"]
+    assert client.get("/api/v1/conversations/search", params={"q": "优势", "limit": 0}).status_code == 400
+
+def test_snippet_window():
+    text_ = "前文" * 100 + "关键词" + "后文" * 100
+    snippet = make_snippet(text_, ["关键词"], max_chars=40)
+    assert "关键词" in snippet and snippet.startswith("...") and snippet.endswith("...")
+    assert make_snippet("短文本", ["无"]) == "短文本"
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,200 @@
+import sys
+import os
+import json
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.models.document import DocumentModel
+from app.services import snapshot, vector_store
+from app.services.document_service import DocumentService
+from app.services.vector_store import VectorStoreService, chinese_tokenizer
+
+_original_snapshot_directory = settings.SNAPSHOT_DIRECTORY
+
+def populate(Session):
+    vector_service = VectorStoreService()
+    with Session() as db:
+        for f in (1, 2, 3):
+            text = f"文件{f}：检索增强生成结合向量检索与关键词检索，编号{f}。"
+            file_path = DocumentService.upload_path(f, f"doc{f}.txt")
+            with open(file_path, "w", encoding="utf-8") as out:
+                out.write(text)
+            DocumentService.save_extracted_text([Document(page_content=text, metadata={"source": file_path})], file_path)
+            vector_service.add_documents([
+                Document(page_content=f"{text}第{c}段", metadata={"file_id": str(f), "filename": f"doc{f}.txt"})
+                for c in range(3)
+            ])
+            db.add(DocumentModel(id=f, filename=f"doc{f}.txt", status="processed", file_size=len(text), chunk_count=3))
+        # Still being ingested: neither the row nor its chunks belong in a snapshot
+        db.add(DocumentModel(id=4, filename="doc4.txt", status="processing"))
+        db.commit()
+    vector_service.add_documents([Document(page_content="未完成", metadata={"file_id": "4"})])
+    return vector_service
+
+def test_export_and_import_round_trip(temp_node):
+    settings.SNAPSHOT_DIRECTORY = tempfile.mkdtemp()
+    Session = temp_node()
+    source = populate(Session)
+    source_data = source.vector_db._collection.get(include=["documents", "metadatas", "embeddings"])
+    expected = {
+        chunk_id: (text, list(embedding))
+        for chunk_id, text, meta, embedding in zip(
+            source_data["ids"], source_data["documents"], source_data["metadatas"], source_data["embeddings"]
+        )
+        if meta["file_id"] != "4"
+    }
+    with Session() as db:
+        updated = db.get(DocumentModel, 2).upload_time
+
+    manifest = snapshot.export_snapshot("snap1")
+    assert manifest["documents"] == 3 and manifest["chunks"] == 9 and manifest["dimension"] == 1536
+    path = snapshot.snapshot_path("snap1")
+    assert not os.path.exists(path + ".tmp")
+    assert np.load(os.path.join(path, snapshot.EMBEDDINGS_FILE), mmap_mode="r").shape == (9, 1536)
+    assert sorted(os.listdir(os.path.join(path, "uploads"))) == sorted(
+        name for f in (1, 2, 3) for name in (f"{f}_doc{f}.txt", f"{f}_doc{f}.txt.pages.json.gz")
+    )
+    assert [s["name"] for s in snapshot.list_snapshots()] == ["snap1"]
+
+    # Import into a fresh node, counting embedding calls
+    Session = temp_node()
+    embed_calls = []
+    original_embed = VectorStoreService().embeddings.__class__.embed_documents
+
+    def counting_embed(self, texts):
+        embed_calls.append(texts)
+        return original_embed(self, texts)
+
+    VectorStoreService().embeddings.__class__.embed_documents = counting_embed
+    try:
+        report = snapshot.import_snapshot(path)
+    finally:
+        VectorStoreService().embeddings.__class__.embed_documents = original_embed
+    assert report["documents"] == 3 and report["chunks"] == 9 and embed_calls == []
+
+    target = VectorStoreService().vector_db._collection.get(include=["documents", "embeddings"])
+    imported = {chunk_id: (text, list(embedding)) for chunk_id, text, embedding in zip(target["ids"], target["documents"], target["embeddings"])}
+    assert imported == expected
+    with Session() as db:
+        rows = db.query(DocumentModel).order_by(DocumentModel.id).all()
+        assert [(r.id, r.filename, r.chunk_count) for r in rows] == [(1, "doc1.txt", 3), (2, "doc2.txt", 3), (3, "doc3.txt", 3)]
+        assert rows[1].upload_time == updated
+    assert DocumentService.load_extracted_text(DocumentService.upload_path(1, "doc1.txt"))[0].page_content.startswith("文件1")
+
+    # The BM25 index is restored from the stored term counts and matches a fresh build
+    restored = vector_store._bm25_retriever_cache
+    vector_store._bm25_retriever_cache = None
+    rebuilt = VectorStoreService().get_bm25_retriever()
+    order = [d.metadata["chunk_id"] for d in rebuilt.docs]
+    restored_scores = dict(zip([d.metadata["chunk_id"] for d in restored.docs], restored.vectorizer.get_scores(chinese_tokenizer("文件2 关键词"))))
+    assert [restored_scores[c] for c in order] == list(rebuilt.vectorizer.get_scores(chinese_tokenizer("文件2 关键词")))
+
+    # Only into an empty knowledge base
+    try:
+        snapshot.import_snapshot(path)
+        assert False, "import into a non-empty node must fail"
+    except snapshot.SnapshotError as e:
+        assert "not empty" in str(e)
+
+def test_import_rejects_corrupt_snapshots(temp_node):
+    settings.SNAPSHOT_DIRECTORY = tempfile.mkdtemp()
+    populate(temp_node())
+    snapshot.export_snapshot("snap")
+    path = snapshot.snapshot_path("snap")
+
+    temp_node()
+    with open(os.path.join(path, snapshot.EMBEDDINGS_FILE), "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x00\x80\x7f")
+    try:
+        snapshot.import_snapshot(path)
+        assert False, "a corrupt snapshot must not import"
+    except snapshot.SnapshotError as e:
+        assert "Checksum mismatch: embeddings.npy" in str(e)
+    assert VectorStoreService().vector_db._collection.count() == 0
+
+    with open(os.path.join(path, snapshot.MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    manifest["format_version"] = 99
+    with open(os.path.join(path, snapshot.MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+    try:
+        snapshot.verify_snapshot(path)
+        assert False
+    except snapshot.SnapshotError as e:
+        assert "format version" in str(e)
+
+    for name in ("../etc", "", ".hidden"):
+        try:
+            snapshot.snapshot_path(name)
+            assert False
+        except snapshot.SnapshotError:
+            pass
+
+def test_export_leaves_out_documents_without_upload(temp_node):
+    settings.SNAPSHOT_DIRECTORY = tempfile.mkdtemp()
+    populate(temp_node())
+    os.remove(DocumentService.upload_path(2, "doc2.txt"))
+
+    manifest = snapshot.export_snapshot("snap")
+    assert manifest["documents"] == 2 and manifest["chunks"] == 6
+    path = snapshot.snapshot_path("snap")
+    with open(os.path.join(path, snapshot.DOCUMENTS_FILE), encoding="utf-8") as f:
+        assert [row["id"] for row in json.load(f)] == [1, 3]
+    assert not any(name.startswith("2_") for name in os.listdir(os.path.join(path, "uploads")))
+
+def test_failed_import_leaves_node_empty(temp_node):
+    settings.SNAPSHOT_DIRECTORY = tempfile.mkdtemp()
+    populate(temp_node())
+    snapshot.export_snapshot("snap")
+    path = snapshot.snapshot_path("snap")
+
+    Session = temp_node()
+    original_bump = snapshot.corpus_version.bump_version
+
+    def fail(db):
+        raise RuntimeError("database is locked")
+
+    snapshot.corpus_version.bump_version = fail
+    try:
+        with pytest.raises(RuntimeError):
+            snapshot.import_snapshot(path)
+    finally:
+        snapshot.corpus_version.bump_version = original_bump
+    # Vectors, rows and the copied uploads are all gone, so the import can be retried
+    assert VectorStoreService().vector_db._collection.count() == 0
+    with Session() as db:
+        assert db.query(DocumentModel).count() == 0
+    assert os.listdir(os.path.join("data", "uploads")) == []
+    assert snapshot.import_snapshot(path)["documents"] == 3
+
+def test_snapshot_endpoints(temp_node):
+    from app.main import app
+
+    settings.SNAPSHOT_DIRECTORY = tempfile.mkdtemp()
+    populate(temp_node())
+    client = TestClient(app)
+    response = client.post("/api/v1/documents/snapshots")
+    assert response.status_code == 201
+    name = response.json()["name"]
+    assert [s["name"] for s in client.get("/api/v1/documents/snapshots").json()] == [name]
+    # This node is not empty
+    assert client.post(f"/api/v1/documents/snapshots/{name}/import").status_code == 400
+
+    temp_node()
+    response = client.post(f"/api/v1/documents/snapshots/{name}/import")
+    assert response.status_code == 200 and response.json()["chunks"] == 9
+    assert client.post("/api/v1/documents/snapshots/missing/import").status_code == 400
+
+def teardown_function():
+    settings.SNAPSHOT_DIRECTORY = _original_snapshot_directory
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import tempfile
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import Chroma
+from langchain_core.documents import Document
+from app.core.database import Base
+from app.models.conversation import Conversation, Message
+from app.services.source_refs import compact_source, to_source_ref
+from app.services.vector_store import VectorStoreService
+from migrations.compact_message_sources import compact_message_sources, make_chunk_id_lookup
+
+LONG_TEXT = "RAG 的主要优势包括减少幻觉、知识更新和数据隐私。" * 20
+
+def temp_vector_service() -> VectorStoreService:
+    service = VectorStoreService.__new__(VectorStoreService)
+    service.embeddings = FakeEmbeddings(size=16)
+    service.vector_db = Chroma(
+        collection_name="source_refs_test",
+        persist_directory=tempfile.mkdtemp(),
+        embedding_function=service.embeddings,
+    )
+    return service
+
+def test_source_refs_are_compact():
+    doc = Document(
+        page_content=LONG_TEXT,
+        metadata={"chunk_id": "c1", "file_id": "7", "page": 2, "filename": "报告.pdf", "relevance_score": 0.91234567},
+    )
+    ref = to_source_ref(doc)
+    assert ref["type"] == "file"
+    assert (ref["chunk_id"], ref["file_id"], ref["page"], ref["score"]) == ("c1", "7", 2, 0.9123)
+    assert ref["title"] == "报告.pdf"
+    assert len(ref["snippet"]) < 200 and ref["snippet"].endswith("...")
+
+    web = to_source_ref(Document(page_content="摘要", metadata={"type": "web_search", "title": "T", "source": "http://x"}))
+    assert web == {"type": "web", "title": "T", "url": "http://x", "snippet": "摘要"}
+
+def test_legacy_sources_are_compacted():
+    legacy_file = {"type": "file", "content": LONG_TEXT, "title": "报告.pdf", "metadata": {"file_id": "7", "page": 0}}
+    legacy_web = {"type": "web", "title": "T", "url": "http://x", "content": "摘要", "metadata": {"type": "web_search"}}
+
+    ref = compact_source(legacy_file, chunk_id_lookup=lambda file_id, content: "c1" if file_id == "7" else None)
+    assert ref["chunk_id"] == "c1" and ref["title"] == "报告.pdf" and ref["page"] == 0
+    assert compact_source(legacy_web)["url"] == "http://x"
+    assert compact_source("旧格式的纯文本来源")["snippet"] == "旧格式的纯文本来源"
+    # Idempotent
+    assert compact_source(ref) == ref
+
+def test_chunk_ids_fetch_and_backfill():
+    service = temp_vector_service()
+    service.add_documents([
+        Document(page_content="第一段", metadata={"file_id": "1"}),
+        Document(page_content="第二段", metadata={"file_id": "1"}),
+    ])
+    # A chunk indexed before chunk IDs were stored in metadata
+    service.vector_db.add_documents([Document(page_content="旧的段落", metadata={"file_id": "2"})], ids=["legacy-id"])
+
+    data = service.vector_db.get()
+    new_ids = [i for i in data["ids"] if i != "legacy-id"]
+    chunks = service.get_chunks(new_ids + ["legacy-id", "unknown"])
+    assert {c.page_content for c in chunks} == {"第一段", "第二段", "旧的段落"}
+    assert all(c.metadata["chunk_id"] in new_ids + ["legacy-id"] for c in chunks)
+
+    assert service.backfill_chunk_ids() == 1
+    assert service.backfill_chunk_ids() == 0
+    assert service.vector_db.get(ids=["legacy-id"])["metadatas"][0]["chunk_id"] == "legacy-id"
+
+def test_migration_compacts_stored_sources():
+    service = temp_vector_service()
+    service.vector_db.add_documents([Document(page_content=LONG_TEXT, metadata={"file_id": "7"})], ids=["chunk-7"])
+
+    engine = create_engine(f"sqlite:///{tempfile.mkdtemp()}/test.db")
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+
+    legacy = [{"type": "file", "content": LONG_TEXT, "title": "报告.pdf", "metadata": {"file_id": "7", "page": 0}}]
+    with Session() as db:
+        db.add(Conversation(id="conv"))
+        db.add(Message(conversation_id="conv", role="assistant", content="答", sources=json.dumps(legacy)))
+        db.add(Message(conversation_id="conv", role="assistant", content="答", sources="not json"))
+        db.add(Message(conversation_id="conv", role="user", content="问"))
+        db.commit()
+
+    with Session() as db:
+        stats = compact_message_sources(db, make_chunk_id_lookup(service), batch_size=1)
+    assert stats["messages"] == 2 and stats["updated"] == 1 and stats["unparseable"] == 1
+    assert stats["bytes_after"] < stats["bytes_before"] / 2
+
+    with Session() as db:
+        stored = json.loads(db.query(Message).filter(Message.sources.like("[%")).one().sources)
+        assert stored[0]["chunk_id"] == "chunk-7" and stored[0]["file_id"] == "7"
+        # Running again changes nothing
+        assert compact_message_sources(db)["updated"] == 0
+
+if __name__ == "__main__":
+    test_source_refs_are_compact()
+    test_legacy_sources_are_compacted()
+    test_chunk_ids_fetch_and_backfill()
+    test_migration_compacts_stored_sources()
+    print("All source reference tests passed.")
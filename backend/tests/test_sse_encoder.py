@@ -0,0 +1,117 @@
+import sys
+import os
+import asyncio
+import json
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.services.sse_encoder import SSEEncoder, encode_event
+
+def parse(frames):
+    events = []
+    for frame in frames:
+        assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+        events.append(json.loads(frame[6:-2]))
+    return events
+
+async def collect(encoder, events):
+    return [frame async for frame in encoder.encode(events)]
+
+def test_token_chunks_are_coalesced_between_other_events():
+    async def events():
+        yield {"status": "正在检索..."}
+        for ch in "你好，世界":
+            yield {"answer": ch}
+        yield {"replace": True, "reason": "web_search"}
+        for ch in "新的回答":
+            yield {"answer": ch}
+        yield {"sources": [{"title": "a"}], "metadata": {"skipped_stages": []}}
+
+    encoder = SSEEncoder(flush_interval=10, flush_bytes=1024)
+    parsed = parse(asyncio.run(collect(encoder, events())))
+
+    assert parsed == [
+        {"status": "正在检索..."},
+        {"answer": "你"},  # first token is not delayed
+        {"answer": "好，世界"},
+        {"replace": True, "reason": "web_search"},
+        {"answer": "新的回答"},
+        {"sources": [{"title": "a"}], "metadata": {"skipped_stages": []}},
+    ]
+    assert encoder.chunks == 12
+    assert encoder.frames == 6
+
+def test_flush_on_interval_and_byte_threshold():
+    async def slow_events():
+        for ch in "abcd":
+            yield {"answer": ch}
+        await asyncio.sleep(0.1)
+        yield {"answer": "e"}
+
+    # Buffered text is sent once the interval passes, even if the producer stalls
+    parsed = parse(asyncio.run(collect(SSEEncoder(flush_interval=0.02, flush_bytes=1024), slow_events())))
+    assert [e["answer"] for e in parsed] == ["a", "bcd", "e"]
+
+    async def fast_events():
+        for ch in "abcdefg":
+            yield {"answer": ch}
+
+    parsed = parse(asyncio.run(collect(SSEEncoder(flush_interval=10, flush_bytes=3), fast_events())))
+    assert [e["answer"] for e in parsed] == ["a", "bcd", "efg"]
+
+    # Interval 0 disables coalescing
+    parsed = parse(asyncio.run(collect(SSEEncoder(flush_interval=0), fast_events())))
+    assert len(parsed) == 7
+
+def test_early_close_runs_producer_cleanup():
+    closed = []
+
+    async def events():
+        try:
+            for i in range(100):
+                yield {"answer": str(i)}
+                await asyncio.sleep(0.01)
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = SSEEncoder(flush_interval=0.05, flush_bytes=1024).encode(events())
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(main())
+    assert closed == [True]
+
+def test_slow_client_pauses_the_producer():
+    produced = []
+
+    async def events():
+        for i in range(50):
+            produced.append(i)
+            yield {"status": str(i)}
+
+    async def main():
+        stream = SSEEncoder(flush_interval=0.05, max_pending_frames=4).encode(events())
+        await stream.__anext__()
+        await asyncio.sleep(0.05)
+        # One frame delivered, a bounded number queued; the rest is not pulled yet
+        assert len(produced) <= 1 + 4 + 1
+        rest = [frame async for frame in stream]
+        assert len(rest) == 49
+
+    asyncio.run(main())
+    assert len(produced) == 50
+
+def test_encode_event_handles_non_json_values():
+    frame = encode_event({"metadata": {"score": 0.5, "path": object}, "sources": []})
+    assert json.loads(frame[6:-2])["metadata"]["score"] == 0.5
+
+if __name__ == "__main__":
+    test_token_chunks_are_coalesced_between_other_events()
+    test_flush_on_interval_and_byte_threshold()
+    test_early_close_runs_producer_cleanup()
+    test_slow_client_pauses_the_producer()
+    test_encode_event_handles_non_json_values()
+    print("All SSE encoder tests passed.")
@@ -0,0 +1,115 @@
+import sys
+import os
+import asyncio
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services import stream_buffer
+from app.services.sse_encoder import SSEEncoder
+from app.services.stream_buffer import StreamBuffer, start_stream, get_stream, cancel_stream
+
+async def token_events(count: int, delay: float = 0.0):
+    yield {"status": "generating"}
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield {"answer": f"{i},"}
+    yield {"sources": [], "metadata": {}}
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+def answer_of(events):
+    answer = ""
+    for _, event in events:
+        if event.get("replace"):
+            answer = ""
+        answer += event.get("answer", "")
+    return answer
+
+def test_replay_from_last_event_id():
+    async def main():
+        buffer = start_stream("s1", token_events(5))
+        full = await collect(buffer.subscribe())
+        assert [i for i, _ in full] == list(range(1, 8))
+        assert answer_of(full) == "0,1,2,3,4,"
+
+        # A client that saw event 3 only gets the rest
+        rest = await collect(buffer.subscribe(3))
+        assert [i for i, _ in rest] == [4, 5, 6, 7]
+        assert get_stream("s1") is buffer
+    asyncio.run(main())
+
+def test_reconnect_continues_live():
+    async def main():
+        buffer = start_stream("s2", token_events(20, delay=0.005))
+        first = []
+        async for item in buffer.subscribe():
+            first.append(item)
+            if len(first) == 5:
+                break  # connection dropped; generation goes on
+        await asyncio.sleep(0.03)
+        assert not buffer.done
+
+        resumed = await collect(buffer.subscribe(first[-1][0]))
+        assert resumed[0][0] == first[-1][0] + 1
+        assert answer_of(first + resumed) == "".join(f"{i}," for i in range(20))
+        assert "sources" in resumed[-1][1]
+    asyncio.run(main())
+
+def test_evicted_events_are_folded_into_answer():
+    async def main():
+        buffer = StreamBuffer("s3", max_events=4)
+        buffer.append({"status": "generating"})
+        for i in range(10):
+            buffer.append({"answer": f"{i},"})
+        buffer.finish()
+        assert len(buffer.events) == 4
+
+        resumed = await collect(buffer.subscribe(2))
+        assert resumed[0][1] == {"replace": True, "reason": "resume"}
+        assert answer_of(resumed) == "".join(f"{i}," for i in range(10))
+    asyncio.run(main())
+
+def test_cancel_and_retention():
+    async def main():
+        original = settings.STREAM_RETENTION_SECONDS
+        settings.STREAM_RETENTION_SECONDS = 0.05
+        try:
+            buffer = start_stream("s4", token_events(1000, delay=0.01))
+            await asyncio.sleep(0.03)
+            assert cancel_stream("s4")
+            await asyncio.wait({buffer.task})
+            assert buffer.done and "error" in buffer.events[-1][1]
+            assert not cancel_stream("s4")
+
+            await asyncio.sleep(0.1)
+            assert get_stream("s4") is None
+        finally:
+            settings.STREAM_RETENTION_SECONDS = original
+    asyncio.run(main())
+
+def test_encoder_frames_carry_event_ids():
+    async def main():
+        buffer = start_stream("s5", token_events(6))
+        await asyncio.wait({buffer.task})
+        frames = await collect(SSEEncoder(flush_interval=1.0).encode(buffer.subscribe()))
+        ids = [int(f.split(b"\n")[0][4:]) for f in frames]
+        assert all(f.startswith(b"id: ") for f in frames)
+        assert ids == sorted(ids) and ids[-1] == buffer.last_id
+        # Merged answer chunks report the id of their last chunk
+        assert len(frames) < buffer.last_id
+    asyncio.run(main())
+
+def teardown_function():
+    stream_buffer._streams.clear()
+
+if __name__ == "__main__":
+    test_replay_from_last_event_id()
+    test_reconnect_continues_live()
+    test_evicted_events_are_folded_into_answer()
+    test_cancel_and_retention()
+    test_encoder_frames_carry_event_ids()
+    print("All stream buffer tests passed.")
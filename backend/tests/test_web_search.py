@@ -0,0 +1,124 @@
+import sys
+import os
+import asyncio
+import json
+import tempfile
+import threading
+import time
+
+# Add backend directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from app.core.config import settings
+from app.services import circuit_breaker, web_search
+from app.services.web_search import LocalSearchBackend, WebSearchService
+
+class CountingBackend(LocalSearchBackend):
+    def __init__(self, latency=0.0):
+        super().__init__(path="", latency=latency)
+        self.calls = 0
+        self.threads = set()
+        self._calls_lock = threading.Lock()
+
+    def text(self, keywords, max_results=5, **kwargs):
+        with self._calls_lock:
+            self.calls += 1
+            self.threads.add(threading.current_thread().name)
+        return super().text(keywords, max_results=max_results, **kwargs)
+
+ORIGINAL_GET_BACKEND = web_search._get_backend
+ORIGINAL_MAX_WORKERS = settings.WEB_SEARCH_MAX_WORKERS
+
+def teardown_function(function):
+    web_search._get_backend = ORIGINAL_GET_BACKEND
+    settings.WEB_SEARCH_MAX_WORKERS = ORIGINAL_MAX_WORKERS
+    web_search._result_cache.clear()
+    web_search._executor = None
+
+def use_backend(backend, max_workers=2):
+    web_search._result_cache.clear()
+    web_search._inflight.clear()
+    web_search._executor = None
+    circuit_breaker._breakers.clear()
+    settings.WEB_SEARCH_MAX_WORKERS = max_workers
+    web_search._get_backend = lambda: backend
+
+def test_identical_searches_are_coalesced_then_cached():
+    backend = CountingBackend(latency=0.1)
+    use_backend(backend)
+
+    async def main():
+        # Same query modulo case/whitespace, issued concurrently
+        queries = ["RAG 优势", "rag  优势", " RAG 优势 "] * 3
+        return await asyncio.gather(*(WebSearchService.asearch(q) for q in queries))
+
+    results = asyncio.run(main())
+    assert backend.calls == 1
+    assert all(len(r) == 5 for r in results)
+    assert results[0][0].metadata["type"] == "web_search"
+
+    # Served from the TTL cache afterwards
+    assert len(WebSearchService.search("rag 优势")) == 5
+    assert backend.calls == 1
+
+    # Runs on the dedicated pool, not the default executor
+    assert all(name.startswith("web-search") for name in backend.threads)
+
+def test_cache_entries_expire():
+    backend = CountingBackend()
+    use_backend(backend)
+    ttl = settings.WEB_SEARCH_CACHE_TTL_SECONDS
+    settings.WEB_SEARCH_CACHE_TTL_SECONDS = 0.05
+    try:
+        WebSearchService.search("过期测试")
+        WebSearchService.search("过期测试")
+        assert backend.calls == 1
+        time.sleep(0.1)
+        WebSearchService.search("过期测试")
+        assert backend.calls == 2
+    finally:
+        settings.WEB_SEARCH_CACHE_TTL_SECONDS = ttl
+
+def test_hard_timeout_and_bounded_pool():
+    backend = CountingBackend(latency=0.3)
+    use_backend(backend, max_workers=2)
+    timeout = settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS
+    settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS = 0.1
+    try:
+        async def main():
+            start = time.monotonic()
+            results = await asyncio.gather(*(WebSearchService.asearch(f"慢查询 {i}") for i in range(4)))
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(main())
+        assert results == [[], [], [], []]
+        assert elapsed < 0.25
+        # Only max_workers searches reach the backend at once
+        time.sleep(0.05)
+        assert len(backend.threads) <= 2
+    finally:
+        settings.WEB_SEARCH_HARD_TIMEOUT_SECONDS = timeout
+        web_search._executor.shutdown(wait=True)
+
+    # The late results still land in the cache for the next caller
+    assert len(WebSearchService.search("慢查询 0")) == 5
+
+def test_local_backend_ranks_file_entries():
+    entries = [
+        {"title": "天气预报", "href": "http://localhost/weather", "body": "明天晴"},
+        {"title": "检索增强生成", "href": "http://localhost/rag", "body": "RAG 结合检索与生成"},
+    ]
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(entries, f, ensure_ascii=False)
+
+    backend = LocalSearchBackend(path=f.name)
+    results = backend.text("RAG 检索", max_results=5)
+    assert [r["href"] for r in results] == ["http://localhost/rag"]
+    os.remove(f.name)
+
+if __name__ == "__main__":
+    test_identical_searches_are_coalesced_then_cached()
+    test_cache_entries_expire()
+    test_hard_timeout_and_bounded_pool()
+    test_local_backend_ranks_file_entries()
+    print("All web search tests passed.")
@@ -3,6 +3,8 @@ import {
   uploadDocument,
   createConversation,
   getConversation,
+  getMessages,
+  Message as ApiMessage,
   chatStreamWithConversation,
   deleteMessage,
 } from "./services/api";
@@ -42,6 +44,14 @@ import { VoiceWave } from "./components/VoiceWave";
 
 // interface Message removed as it is imported from store
 
+const formatMessage = (msg: ApiMessage) => ({
+  id: msg.id.toString(),
+  uid: msg.id.toString(), // Use DB ID as UID for historical messages
+  role: msg.role,
+  content: msg.content,
+  sources: msg.sources ? JSON.parse(msg.sources) : undefined,
+});
+
 function App() {
   const {
     activeId,
@@ -75,6 +85,10 @@ function App() {
   };
   // currentConversationId replaced by activeId from store
   const [refreshSidebarTrigger, setRefreshSidebarTrigger] = useState(0);
+  // Per conversation: id to load older messages before (null when fully loaded)
+  const [olderCursors, setOlderCursors] = useState<Record<string, number | null>>({});
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
+  const skipScrollRef = useRef(false);
   const [isKnowledgeBaseOpen, setIsKnowledgeBaseOpen] = useState(true);
   const [isSidebarOpen, setIsSidebarOpen] = useState(true);
 
@@ -107,14 +121,11 @@ function App() {
       // just fetch and update
       getConversation(activeId)
         .then((data) => {
-          const formattedMessages = data.messages.map((msg) => ({
-            id: msg.id.toString(),
-            uid: msg.id.toString(), // Use DB ID as UID for historical messages
-            role: msg.role,
-            content: msg.content,
-            sources: msg.sources ? JSON.parse(msg.sources) : undefined,
+          setStoreMessages(activeId, data.messages.map(formatMessage));
+          setOlderCursors((prev) => ({
+            ...prev,
+            [activeId]: data.has_more_messages && data.messages.length ? data.messages[0].id : null,
           }));
-          setStoreMessages(activeId, formattedMessages);
         })
         .catch((err) => {
           console.error(err);
@@ -124,6 +135,23 @@ function App() {
     }
   }, [activeId]);
 
+  const handleLoadOlder = async () => {
+    if (!activeId || !olderCursors[activeId] || isLoadingOlder) return;
+    const conversationId = activeId;
+    setIsLoadingOlder(true);
+    try {
+      const page = await getMessages(conversationId, olderCursors[conversationId]!);
+      // Keep the scroll position when prepending
+      skipScrollRef.current = true;
+      setStoreMessages(conversationId, [...page.messages.map(formatMessage), ...messages]);
+      setOlderCursors((prev) => ({ ...prev, [conversationId]: page.next_before }));
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const handleNewConversation = () => {
     setActiveId(null);
     setInput("");
@@ -184,6 +212,10 @@ function App() {
   };
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -358,6 +390,13 @@ function App() {
               content: msg.content + `\n\n❌ 错误: ${data.error}`,
             }));
           }
+          if (data.replace) {
+            // Server discarded the partial answer (e.g. switched to web search)
+            updateMessage(targetConversationId!, currentAssistantId, (msg) => ({
+              ...msg,
+              content: "",
+            }));
+          }
           if (data.answer) {
             updateMessage(targetConversationId!, currentAssistantId, (msg) => ({
               ...msg,
@@ -614,6 +653,19 @@ function App() {
               </div>
             )}
 
+            {activeId && olderCursors[activeId] && (
+              <div className="flex justify-center">
+                <button
+                  onClick={handleLoadOlder}
+                  disabled={isLoadingOlder}
+                  className="text-sm text-gray-500 hover:text-primary-600 flex items-center gap-2 disabled:opacity-50"
+                >
+                  {isLoadingOlder && <Loader2 className="w-4 h-4 animate-spin" />}
+                  加载更早的消息
+                </button>
+              </div>
+            )}
+
             <AnimatePresence>
               {messages.map((msg) => (
                 <motion.div
@@ -1,9 +1,15 @@
 import React, { useEffect, useState } from "react";
-import { Modal, Table, Button, Tag, Popconfirm, message, Space, Tooltip } from "antd";
+import { Modal, Table, Button, Tag, Popconfirm, message, Space, Tooltip, Select } from "antd";
 import { FileTextOutlined, ReloadOutlined } from "@ant-design/icons";
 import { Trash2, Eye } from "lucide-react";
 import type { ColumnsType } from "antd/es/table";
-import { getDocuments, deleteDocument, Document as DocumentType } from "../services/api";
+import {
+  getDocuments,
+  deleteDocument,
+  bulkDeleteDocuments,
+  Document as DocumentType,
+  DocumentQuery,
+} from "../services/api";
 import { DocumentPreview, PreviewFile } from "./DocumentPreview";
 
 interface DocumentManagerProps {
@@ -18,20 +24,25 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
   refreshTrigger,
 }) => {
   const [documents, setDocuments] = useState<DocumentType[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [statusFilter, setStatusFilter] = useState<string | undefined>(undefined);
+  const [sort, setSort] = useState<NonNullable<DocumentQuery["sort"]>>("upload_time");
   const [loading, setLoading] = useState(false);
   const [deleteLoading, setDeleteLoading] = useState<number | null>(null);
+  const [selectedIds, setSelectedIds] = useState<number[]>([]);
+  const [bulkDeleting, setBulkDeleting] = useState(false);
 
   // Local preview state
   const [isPreviewOpen, setIsPreviewOpen] = useState(false);
   const [previewFile, setPreviewFile] = useState<PreviewFile | null>(null);
 
-  const fetchDocuments = async () => {
+  // Pages are appended when a cursor is given, otherwise the list restarts
+  const fetchDocuments = async (cursor?: string) => {
     setLoading(true);
     try {
-      const data = await getDocuments();
-      setDocuments(
-        data.sort((a, b) => new Date(b.upload_time).getTime() - new Date(a.upload_time).getTime()),
-      );
+      const page = await getDocuments({ status: statusFilter, sort, order: "desc", cursor });
+      setDocuments((prev) => (cursor ? [...prev, ...page.documents] : page.documents));
+      setNextCursor(page.next_cursor);
     } catch (error) {
       console.error("Failed to fetch documents:", error);
       message.error("获取文档列表失败");
@@ -44,7 +55,7 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
     if (open) {
       fetchDocuments();
     }
-  }, [open, refreshTrigger]);
+  }, [open, refreshTrigger, statusFilter, sort]);
 
   const handleDelete = async (id: number) => {
     setDeleteLoading(id);
@@ -60,6 +71,21 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
     }
   };
 
+  const handleBulkDelete = async () => {
+    setBulkDeleting(true);
+    try {
+      const result = await bulkDeleteDocuments(selectedIds);
+      message.success(`已删除 ${result.deleted.length} 个文档`);
+      setSelectedIds([]);
+      await fetchDocuments();
+    } catch (error) {
+      console.error("Failed to delete documents:", error);
+      message.error("批量删除失败");
+    } finally {
+      setBulkDeleting(false);
+    }
+  };
+
   const handlePreview = (record: DocumentType) => {
     setPreviewFile({
       fileId: record.id.toString(),
@@ -98,6 +124,25 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
       width: 100,
       render: (size) => formatSize(size),
     },
+    {
+      title: "分块 / Token",
+      key: "chunks",
+      width: 130,
+      render: (_, record) =>
+        record.chunk_count == null ? (
+          "-"
+        ) : (
+          <Tooltip
+            title={
+              record.embed_seconds != null
+                ? `${record.page_count ?? "-"} 页，解析 ${record.parse_seconds}s，嵌入 ${record.embed_seconds}s`
+                : undefined
+            }
+          >
+            {record.chunk_count} / {record.token_count?.toLocaleString("zh-CN")}
+          </Tooltip>
+        ),
+    },
     {
       title: "上传时间",
       dataIndex: "upload_time",
@@ -175,15 +220,54 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
           <div className="flex items-center gap-2">
             <span>文档管理</span>
             <Tag color="blue">{documents.length} 篇</Tag>
+            <Select
+              size="small"
+              allowClear
+              placeholder="全部状态"
+              value={statusFilter}
+              onChange={setStatusFilter}
+              style={{ width: 110 }}
+              options={[
+                { value: "processed", label: "已处理" },
+                { value: "processing", label: "处理中" },
+                { value: "error", label: "失败" },
+              ]}
+            />
+            <Select
+              size="small"
+              value={sort}
+              onChange={setSort}
+              style={{ width: 120 }}
+              options={[
+                { value: "upload_time", label: "按上传时间" },
+                { value: "file_size", label: "按大小" },
+                { value: "chunk_count", label: "按分块数" },
+                { value: "token_count", label: "按 Token 数" },
+              ]}
+            />
           </div>
         }
         open={open}
         onCancel={onClose}
         footer={[
+          <Popconfirm
+            key="bulk-delete"
+            title="批量删除文档"
+            description={`确定要删除选中的 ${selectedIds.length} 个文档吗？这将同时删除相关的向量索引。`}
+            onConfirm={handleBulkDelete}
+            okText="是"
+            cancelText="否"
+            okButtonProps={{ danger: true }}
+            disabled={selectedIds.length === 0}
+          >
+            <Button danger disabled={selectedIds.length === 0} loading={bulkDeleting}>
+              删除所选{selectedIds.length > 0 ? ` (${selectedIds.length})` : ""}
+            </Button>
+          </Popconfirm>,
           <Button
             key="refresh"
             icon={<ReloadOutlined />}
-            onClick={fetchDocuments}
+            onClick={() => fetchDocuments()}
             loading={loading}
           >
             刷新
@@ -192,17 +276,29 @@ export const DocumentManager: React.FC<DocumentManagerProps> = ({
             关闭
           </Button>,
         ]}
-        width={800}
+        width={900}
         className="document-manager-modal"
       >
         <Table
           columns={columns}
           dataSource={documents}
           rowKey="id"
+          rowSelection={{
+            selectedRowKeys: selectedIds,
+            onChange: (keys) => setSelectedIds(keys as number[]),
+          }}
           loading={loading}
-          pagination={{ pageSize: 5 }}
+          pagination={false}
+          scroll={{ y: 400 }}
           size="middle"
         />
+        {nextCursor && (
+          <div className="text-center mt-3">
+            <Button onClick={() => fetchDocuments(nextCursor)} loading={loading}>
+              加载更多
+            </Button>
+          </div>
+        )}
       </Modal>
 
       <DocumentPreview
@@ -1,8 +1,9 @@
-import React, { useMemo, useState } from "react";
+import React, { useEffect, useMemo, useState } from "react";
 import { motion, AnimatePresence } from "framer-motion";
 import ReactMarkdown from "react-markdown";
 import remarkGfm from "remark-gfm";
 import { X, ExternalLink, FileText, Globe, ChevronDown, ChevronUp } from "lucide-react";
+import { getChunks } from "../services/api";
 
 interface ReferenceSidebarProps {
   isOpen: boolean;
@@ -75,9 +76,23 @@ interface ParsedSource {
   relevanceScore?: number;
   fileId?: string;
   page?: number;
+  chunkId?: string;
 }
 
 const parseSource = (source: any): ParsedSource => {
+  // Compact reference: full chunk text is fetched separately by chunk_id
+  if (typeof source === "object" && source !== null && "snippet" in source) {
+    return {
+      type: source.type || "file",
+      title: source.title || "未知文档",
+      url: source.url,
+      content: source.snippet || "",
+      fileId: source.file_id ?? undefined,
+      page: source.page !== undefined && source.page !== null ? Number(source.page) + 1 : undefined,
+      chunkId: source.chunk_id ?? undefined,
+    };
+  }
+
   if (typeof source === "object" && source !== null && !Array.isArray(source)) {
     return {
       type: source.type || "file",
@@ -132,9 +147,31 @@ export const ReferenceSidebar: React.FC<ReferenceSidebarProps> = ({
 }) => {
   const [expandedIndices, setExpandedIndices] = useState<number[]>([]);
   const [showLowRelevance, setShowLowRelevance] = useState(false);
+  const [chunkTexts, setChunkTexts] = useState<Record<string, string>>({});
+
+  // Load the full text of all referenced chunks in one request when opened
+  useEffect(() => {
+    if (!isOpen) return;
+    const missing = sources
+      .map((s) => s?.chunk_id)
+      .filter((id): id is string => Boolean(id) && !(id in chunkTexts));
+    if (missing.length === 0) return;
+
+    getChunks(Array.from(new Set(missing)))
+      .then(({ chunks }) => {
+        setChunkTexts((prev) => {
+          const next = { ...prev };
+          chunks.forEach((c) => (next[c.chunk_id] = c.content));
+          return next;
+        });
+      })
+      .catch((err) => console.error("Failed to load source chunks", err));
+  }, [isOpen, sources]); // eslint-disable-line react-hooks/exhaustive-deps
 
   const { highRelevance, lowRelevance } = useMemo(() => {
-    const parsed = sources.map(parseSource);
+    const parsed = sources
+      .map(parseSource)
+      .map((s) => (s.chunkId && chunkTexts[s.chunkId] ? { ...s, content: chunkTexts[s.chunkId] } : s));
 
     if (!query || !query.trim()) {
       return { highRelevance: parsed, lowRelevance: [] };
@@ -174,7 +211,7 @@ export const ReferenceSidebar: React.FC<ReferenceSidebarProps> = ({
     }
 
     return { highRelevance: high, lowRelevance: low };
-  }, [sources, query]);
+  }, [sources, query, chunkTexts]);
 
   const toggleExpand = (index: number) => {
     setExpandedIndices((prev) =>
@@ -18,11 +18,27 @@ export const Sidebar: React.FC<SidebarProps> = ({
   refreshTrigger,
 }) => {
   const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [nextBefore, setNextBefore] = useState<string | null>(null);
 
   const fetchConversations = async () => {
     try {
-      const data = await getConversations();
-      setConversations(data);
+      const page = await getConversations();
+      setConversations(page.conversations);
+      setNextBefore(page.next_before);
+    } catch (error) {
+      console.error("Failed to fetch conversations", error);
+    }
+  };
+
+  const loadMore = async () => {
+    if (!nextBefore) return;
+    try {
+      const page = await getConversations(nextBefore);
+      setConversations((prev) => [
+        ...prev,
+        ...page.conversations.filter((c) => !prev.some((p) => p.id === c.id)),
+      ]);
+      setNextBefore(page.next_before);
     } catch (error) {
       console.error("Failed to fetch conversations", error);
     }
@@ -81,7 +97,17 @@ export const Sidebar: React.FC<SidebarProps> = ({
           )}
         >
           <MessageSquare size={18} />
-          <span className="flex-1 truncate text-sm">{conv.title}</span>
+          <div className="flex-1 min-w-0">
+            <div className="flex items-center gap-2">
+              <span className="flex-1 truncate text-sm">{conv.title}</span>
+              {conv.message_count > 0 && (
+                <span className="text-xs text-gray-500">{conv.message_count}</span>
+              )}
+            </div>
+            {conv.last_message_preview && (
+              <div className="truncate text-xs text-gray-500">{conv.last_message_preview}</div>
+            )}
+          </div>
           <button
             onClick={(e) => handleDelete(e, conv.id)}
             className="opacity-0 group-hover:opacity-100 p-1 hover:text-red-400 transition-opacity"
@@ -90,6 +116,14 @@ export const Sidebar: React.FC<SidebarProps> = ({
           </button>
         </div>
       ))}
+      {nextBefore && (
+        <button
+          onClick={loadMore}
+          className="w-full text-xs text-gray-500 hover:text-white py-2 transition-colors"
+        >
+          加载更多
+        </button>
+      )}
     </div>
   );
 };
@@ -29,10 +29,29 @@ export interface Document {
   upload_time: string;
   status: string;
   file_size: number;
+  chunk_count: number | null;
+  token_count: number | null;
+  page_count: number | null;
+  parse_seconds: number | null;
+  embed_seconds: number | null;
 }
 
-export const getDocuments = async (): Promise<Document[]> => {
-  const response = await api.get("/documents/");
+export interface DocumentPage {
+  documents: Document[];
+  has_more: boolean;
+  next_cursor: string | null;
+}
+
+export interface DocumentQuery {
+  status?: string;
+  sort?: "upload_time" | "filename" | "file_size" | "chunk_count" | "token_count";
+  order?: "asc" | "desc";
+  limit?: number;
+  cursor?: string;
+}
+
+export const getDocuments = async (query: DocumentQuery = {}): Promise<DocumentPage> => {
+  const response = await api.get("/documents/", { params: query });
   return response.data;
 };
 
@@ -41,10 +60,31 @@ export const deleteDocument = async (id: number) => {
   return response.data;
 };
 
+export const bulkDeleteDocuments = async (
+  ids: number[],
+): Promise<{ deleted: number[]; missing: number[] }> => {
+  const response = await api.post("/documents/bulk-delete", { ids });
+  return response.data;
+};
+
+export interface Chunk {
+  chunk_id: string;
+  content: string;
+  metadata: Record<string, any>;
+}
+
+// Full text of source chunks (sources only carry a short snippet)
+export const getChunks = async (
+  chunkIds: string[],
+): Promise<{ chunks: Chunk[]; missing: string[] }> => {
+  const response = await api.post("/documents/chunks", { chunk_ids: chunkIds });
+  return response.data;
+};
+
 export const chatStream = async (
   query: string,
   history: Array<{ role: string; content: string }>,
-  onChunk: (data: { answer?: string; sources?: any[]; status?: string }) => void,
+  onChunk: (data: { answer?: string; sources?: any[]; status?: string; replace?: boolean }) => void,
   onError: (error: any) => void,
   onFinish: () => void,
   signal?: AbortSignal,
@@ -112,6 +152,8 @@ export interface Conversation {
   title: string;
   created_at: string;
   updated_at: string;
+  message_count: number;
+  last_message_preview: string | null;
 }
 
 export interface Message {
@@ -123,11 +165,30 @@ export interface Message {
 }
 
 export interface ConversationDetail extends Conversation {
+  // Latest page only; older messages are loaded with getMessages
   messages: Message[];
+  has_more_messages: boolean;
 }
 
-export const getConversations = async (): Promise<Conversation[]> => {
-  const response = await api.get("/conversations/");
+export interface MessagePage {
+  messages: Message[];
+  has_more: boolean;
+  next_before: number | null;
+}
+
+export interface ConversationPage {
+  conversations: Conversation[];
+  has_more: boolean;
+  next_before: string | null;
+}
+
+export const getConversations = async (
+  before?: string,
+  limit?: number,
+): Promise<ConversationPage> => {
+  const response = await api.get("/conversations/", {
+    params: { before, limit },
+  });
   return response.data;
 };
 
@@ -141,6 +202,17 @@ export const getConversation = async (id: string): Promise<ConversationDetail> =
   return response.data;
 };
 
+export const getMessages = async (
+  conversationId: string,
+  before?: number,
+  limit?: number,
+): Promise<MessagePage> => {
+  const response = await api.get(`/conversations/${conversationId}/messages`, {
+    params: { before, limit },
+  });
+  return response.data;
+};
+
 export const deleteConversation = async (id: string) => {
   const response = await api.delete(`/conversations/${id}`);
   return response.data;
@@ -158,6 +230,13 @@ export const updateConversationTitle = async (_id: string, _title: string) => {
   // Let's stick to core features first.
 };
 
+export const cancelChatStream = async (conversationId: string, streamId: string) => {
+  const response = await api.delete(`/conversations/${conversationId}/chat/${streamId}`);
+  return response.data;
+};
+
+const MAX_STREAM_RECONNECTS = 5;
+
 export const chatStreamWithConversation = async (
   conversationId: string,
   query: string,
@@ -168,25 +247,27 @@ export const chatStreamWithConversation = async (
     message_id?: number;
     user_message_id?: number;
     status?: string;
+    replace?: boolean;
   }) => void,
   onError: (error: any) => void,
   onFinish: () => void,
   signal?: AbortSignal,
 ) => {
-  try {
-    const response = await fetch(`/api/v1/conversations/${conversationId}/chat`, {
-      method: "POST",
-      headers: {
-        "Content-Type": "application/json",
-      },
-      body: JSON.stringify({ query }),
-      signal,
-    });
-
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+  // The generation keeps running on the server; if the connection drops we
+  // reconnect with the last event id and only receive what we missed.
+  let streamId: string | null = null;
+  let lastEventId = 0;
+  let finished = false;
+
+  const onAbort = () => {
+    // Stopping the request also stops the generation (the partial answer is saved)
+    if (streamId && !finished) {
+      cancelChatStream(conversationId, streamId).catch(() => {});
     }
+  };
+  signal?.addEventListener("abort", onAbort);
 
+  const readStream = async (response: Response) => {
     const reader = response.body?.getReader();
     const decoder = new TextDecoder();
 
@@ -208,25 +289,73 @@ export const chatStreamWithConversation = async (
       // Keep the last line in the buffer as it might be incomplete
       buffer = lines.pop() || "";
 
+      let frameId: number | null = null;
       for (const line of lines) {
         const trimmedLine = line.trim();
         if (!trimmedLine) continue;
 
-        if (trimmedLine.startsWith("data: ")) {
+        if (trimmedLine.startsWith("id: ")) {
+          frameId = Number(trimmedLine.slice(4));
+        } else if (trimmedLine.startsWith("data: ")) {
           try {
             const jsonStr = trimmedLine.slice(6);
             // console.log("Received chunk:", jsonStr); // Debug log
             const data = JSON.parse(jsonStr);
-            onChunk(data);
+            if (data.stream_id) {
+              streamId = data.stream_id;
+            } else {
+              onChunk(data);
+            }
           } catch (e) {
             console.warn("Failed to parse SSE data:", trimmedLine, e);
           }
+          if (frameId !== null) {
+            lastEventId = frameId;
+            frameId = null;
+          }
+        }
+      }
+    }
+  };
+
+  try {
+    let response = await fetch(`/api/v1/conversations/${conversationId}/chat`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ query }),
+      signal,
+    });
+
+    let reconnects = 0;
+    while (true) {
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      streamId = streamId || response.headers.get("X-Stream-ID");
+
+      try {
+        await readStream(response);
+        finished = true;
+        break;
+      } catch (error: any) {
+        if (error?.name === "AbortError" || !streamId || reconnects >= MAX_STREAM_RECONNECTS) {
+          throw error;
         }
+        reconnects += 1;
+        console.warn(`Stream interrupted, resuming after event ${lastEventId}`, error);
+        await new Promise((resolve) => setTimeout(resolve, 500 * reconnects));
+        response = await fetch(
+          `/api/v1/conversations/${conversationId}/chat/${streamId}/stream`,
+          { headers: { "Last-Event-ID": String(lastEventId) }, signal },
+        );
       }
     }
   } catch (error) {
     onError(error);
   } finally {
+    signal?.removeEventListener("abort", onAbort);
     onFinish();
   }
 };